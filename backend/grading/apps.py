@@ -1,6 +1,24 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GradingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "grading"
+
+    def ready(self):
+        from .spawner import is_serving_process
+        if not is_serving_process():
+            return  # migrate, shell and other management commands do no startup work
+        
+        # Refuse to serve when student programs could not be given a process cap
+        from .tools import get_run_cgroup_dir
+        get_run_cgroup_dir()
+        
+        # Build the common precompiled header bundles once per worker, off the request path
+        grading_settings = settings.GRADING_SETTINGS
+        if grading_settings.get('PCH_ENABLED', True) and grading_settings.get('PCH_WARM_ON_STARTUP', True):
+            from .tools import warm_up_precompiled_headers
+            threading.Thread(target=warm_up_precompiled_headers, daemon=True).start()
@@ -0,0 +1,155 @@
+"""
+Async Grading Engine
+Grades many submissions at once on one event loop. The local stages (compile,
+style, tests, profiling) are CPU and process bound, so they run on a thread
+pool; the Claude reviews are awaited on the async Anthropic client, at most
+LLM_CONCURRENCY of them in flight. While one submission waits for its review
+the next ones compile and run, so a batch takes about its total work divided
+by the concurrency instead of the sum of every review's latency.
+
+All database work happens on worker threads, since the ORM may not be used
+from the event loop itself. Results are saved on a thread of their own, so a
+finished review is stored right away instead of queueing behind local stages.
+"""
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Any
+from django.conf import settings
+from django.db import close_old_connections
+
+from submissions.models import StudentSubmission
+from .models import GradingResult
+from .llm import get_llm_provider
+from .llm_scheduler import get_llm_scheduler
+from .response_cache import get_response_cache
+
+
+class AsyncGradingEngine:
+    """
+    on_graded(submission, grading_result) and on_failed(submission, error) are called
+    on the saving thread, one at a time, as each submission finishes (they may use the ORM)
+    """
+
+    def __init__(self, grading_service=None, concurrency: int = None, local_workers: int = None):
+        from .services import GradingService
+
+        config = settings.GRADING_SETTINGS
+        self.grading_service = grading_service or GradingService()
+        self.concurrency = max(1, concurrency or config.get('LLM_CONCURRENCY', 8))
+        self.local_workers = max(1, local_workers or config.get('GRADING_LOCAL_WORKERS', 0) or os.cpu_count() or 1)
+        self._stats_lock = threading.Lock()
+
+    def run(self, submissions: Iterable[StudentSubmission],
+            on_graded: Callable[[StudentSubmission, GradingResult], None] = None,
+            on_failed: Callable[[StudentSubmission, Exception], None] = None) -> Dict[str, Any]:
+        """Grade the submissions (blocking until all are done); returns timing statistics"""
+        return asyncio.run(self._run(list(submissions), on_graded, on_failed))
+
+    async def _run(self, submissions, on_graded, on_failed) -> Dict[str, Any]:
+        stats = {
+            "submissions": len(submissions),
+            "graded": 0,
+            "failed": 0,
+            "reviews": 0,
+            "review_time": 0.0,
+            "peak_reviews_in_flight": 0,
+            "in_flight": 0,
+        }
+        semaphore = asyncio.Semaphore(self.concurrency)
+        client = get_llm_provider().create_async_client()
+        local = ThreadPoolExecutor(max_workers=self.local_workers, thread_name_prefix="grading-local")
+        saving = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grading-save")
+        start = time.monotonic()
+        try:
+            await asyncio.gather(*(
+                self._grade(submission, client, semaphore, local, saving, stats, on_graded, on_failed)
+                for submission in submissions
+            ))
+        finally:
+            await client.close()
+            local.shutdown(wait=True)
+            saving.shutdown(wait=True)
+
+        del stats["in_flight"]
+        stats["wall_time"] = round(time.monotonic() - start, 3)
+        stats["review_time"] = round(stats["review_time"], 3)
+        return stats
+
+    async def _grade(self, submission, client, semaphore, local, saving, stats, on_graded, on_failed) -> None:
+        service = self.grading_service
+        try:
+            prepared = await self._in_thread(local, self._prepare, submission)
+
+            grading_data, llm_usage, llm_time = None, None, 0.0
+            if prepared["prompt"] is not None:
+                grading_data, llm_usage, llm_time = await self._review(prepared, client, semaphore, saving, stats)
+
+            grading_result = await self._in_thread(saving, service.finalize_grading, prepared, grading_data, llm_usage, llm_time)
+        except Exception as e:
+            with self._stats_lock:
+                stats["failed"] += 1
+            if on_failed:
+                await self._in_thread(saving, on_failed, submission, e)
+            return
+
+        with self._stats_lock:
+            stats["graded"] += 1
+        if on_graded:
+            await self._in_thread(saving, on_graded, submission, grading_result)
+
+    async def _review(self, prepared: dict, client, semaphore, saving, stats) -> tuple:
+        """The Claude review of a prepared submission: (grading data, llm_usage, seconds spent)"""
+        service = self.grading_service
+        params = service.review_request(prepared)
+        cache = get_response_cache()
+        if cache is not None and prepared["fresh"]:
+            cache.count_bypass()
+        elif cache is not None:
+            response = await self._in_thread(saving, cache.lookup, params)
+            if response is not None:
+                print(f"\n💾 Cached Claude review for {prepared['student_name']}")
+                grading_data, _ = service.parse_review(prepared, response)
+                return grading_data, service.response_cache_usage(), 0.0
+
+        async with semaphore:
+            with self._stats_lock:
+                stats["in_flight"] += 1
+                stats["peak_reviews_in_flight"] = max(stats["peak_reviews_in_flight"], stats["in_flight"])
+            review_start = time.monotonic()
+            try:
+                response = await get_llm_scheduler().acreate(client, params)
+            finally:
+                llm_time = time.monotonic() - review_start
+                with self._stats_lock:
+                    stats["in_flight"] -= 1
+                    stats["review_time"] += llm_time
+        print(f"\n🧠 Claude review for {prepared['student_name']} ({llm_time:.1f}s)")
+        if cache is not None:
+            await self._in_thread(saving, cache.store, params, response)
+        grading_data, llm_usage = service.parse_review(prepared, response)
+        with self._stats_lock:
+            stats["reviews"] += 1
+        return grading_data, llm_usage, llm_time
+
+    def _prepare(self, submission: StudentSubmission) -> dict:
+        print(f"\n⚡ Preparing {submission.legacy_student_name}")
+        submission.status = 'grading'
+        submission.save()
+        return self.grading_service.prepare_grading(submission)
+
+    async def _in_thread(self, executor: ThreadPoolExecutor, func: Callable, *args):
+        """Run blocking (CPU, subprocess or ORM) work on one of the engine's threads"""
+        return await asyncio.get_running_loop().run_in_executor(executor, run_with_db, func, *args)
+
+
+def run_with_db(func: Callable, *args):
+    """Call func on a worker thread that may use the ORM"""
+    # Threads are reused like request threads: drop stale or expired connections around each task
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
@@ -7,21 +7,33 @@ import time
 import re
 from typing import List
 from django.utils import timezone
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
 from submissions.models import StudentSubmission, Assignment
 from .models import BatchGradingJob, GradingResult
 from .services import GradingService
+from .fingerprints import STAGES, changed_stages
+from .llm import llm_connection_stats
+from .llm_scheduler import get_llm_scheduler
+from .test_suites import prepare_test_suite
+from .message_batches import get_batch_backend
+from .async_engine import AsyncGradingEngine
+from .response_cache import get_response_cache
 
 
 class BatchGradingService:
     def __init__(self):
         self.grading_service = GradingService()
     
-    def create_batch_job(self, assignment_id: str, files: List, course_id: str = None) -> BatchGradingJob:
+    def create_batch_job(self, assignment_id: str, files: List, course_id: str = None, mode: str = 'sync') -> BatchGradingJob:
         """
         Create a new batch grading job and associated submissions
+        
+        mode 'message_batches' sends all Claude reviews through the Message Batches
+        interface once every local stage has run (cheaper, higher throughput, slower);
+        mode 'async' overlaps local stages and up to LLM_CONCURRENCY reviews at a time
         """
         assignment = Assignment.objects.get(id=assignment_id)
         
@@ -30,7 +42,8 @@ class BatchGradingService:
             assignment=assignment,
             assignment_name=assignment.name,  # Explicitly set for easier querying
             total_files=len(files),
-            status='pending'
+            status='pending',
+            mode=mode
         )
         
         print(f"📦 Created batch job {batch_job.id} for {len(files)} files")
@@ -67,72 +80,53 @@ class BatchGradingService:
         thread.start()
         print(f"🚀 Started background processing for batch job {batch_job_id}")
     
-    def _process_batch_job(self, batch_job_id: str) -> None:
+    def resume_batch_job(self, batch_job_id: str) -> None:
+        """
+        Finish a message_batches job whose process stopped while it was running (e.g. a
+        restart): reviews are read back from the batches saved in llm_batch_ids instead of
+        being paid for again. Runs in the calling thread.
+        """
+        batch_job = BatchGradingJob.objects.get(id=batch_job_id)
+        if batch_job.mode != 'message_batches' or batch_job.status != 'processing':
+            raise ValueError(f"Batch job {batch_job_id} is not an unfinished message_batches job")
+        self._process_batch_job(batch_job_id, resume=True)
+    
+    def resumable_batch_jobs(self):
+        """message_batches jobs left in processing, e.g. by a restart"""
+        return BatchGradingJob.objects.filter(mode='message_batches', status='processing')
+    
+    def _process_batch_job(self, batch_job_id: str, resume: bool = False) -> None:
         """
         Process all submissions in a batch job
         """
         try:
             batch_job = BatchGradingJob.objects.get(id=batch_job_id)
-            batch_job.status = 'processing'
-            batch_job.started_at = timezone.now()
-            batch_job.save()
+            if not resume:
+                batch_job.status = 'processing'
+                batch_job.started_at = timezone.now()
+                batch_job.save()
             
-            print(f"\n🤖 BATCH GRADING STARTED")
+            print(f"\n🤖 BATCH GRADING {'RESUMED' if resume else 'STARTED'}")
             print(f"   📦 Batch Job: {batch_job.id}")
             print(f"   📝 Assignment: {batch_job.assignment.name}")
             print(f"   📊 Total Files: {batch_job.total_files}")
             print("=" * 70)
             
-            submissions = batch_job.submissions.all()
+            # Generate the test suite and expected outputs once, before the first submission
+            try:
+                prepared = prepare_test_suite(batch_job.assignment)
+                print(f"   🧪 Test suite: {len(prepared['suite'].test_cases)} cases ({prepared['suite'].source}), "
+                      f"{prepared['reference_runs']} reference runs")
+            except Exception as e:
+                print(f"   ⚠️ Test suite preparation failed: {str(e)} - it will be prepared on first use")
             
-            successful_count = 0
-            failed_count = 0
-            
-            for i, submission in enumerate(submissions, 1):
-                try:
-                    print(f"\n⚡ Processing {i}/{batch_job.total_files}: {submission.legacy_student_name}")
-                    
-                    # Update submission status
-                    submission.status = 'grading'
-                    submission.save()
-                    
-                    # Refresh batch_job from database to avoid stale data
-                    batch_job.refresh_from_db()
-                    
-                    # Perform AI grading
-                    grading_result = self.grading_service.grade_submission(submission)
-                    
-                    # Update submission status
-                    submission.status = 'graded'
-                    submission.total_score = grading_result.total_score
-                    submission.percentage = grading_result.percentage
-                    submission.graded_at = grading_result.graded_at
-                    submission.save()
-                    
-                    successful_count += 1
-                    print(f"   ✅ Completed: {grading_result.percentage}%")
-                    
-                except Exception as e:
-                    print(f"   ❌ Failed: {str(e)}")
-                    
-                    # Store error details
-                    error_message = f"Grading failed: {str(e)}"
-                    submission.status = 'error'
-                    if hasattr(submission, 'error_details'):
-                        submission.error_details = error_message
-                    submission.save()
-                    
-                    failed_count += 1
-                
-                # Update batch job progress atomically
-                BatchGradingJob.objects.filter(id=batch_job.id).update(
-                    processed_files=i,
-                    successful_grades=successful_count,
-                    failed_grades=failed_count
-                )
-                
-                # Refresh our local instance
-                batch_job.refresh_from_db()
+            if batch_job.mode == 'message_batches':
+                self._grade_with_message_batches(batch_job, resume=resume)
+            elif batch_job.mode == 'async':
+                self._grade_concurrently(batch_job)
+            else:
+                self._grade_one_by_one(batch_job)
+            batch_job.refresh_from_db()  # Progress counters were saved with queryset updates
             
             # Complete the batch job
             batch_job.status = 'completed'
@@ -145,6 +139,30 @@ class BatchGradingService:
             print(f"     • Successful: {batch_job.successful_grades}")
             print(f"     • Failed: {batch_job.failed_grades}")
             print(f"     • Average Score: {batch_job.average_score:.1f}%")
+            usages = [
+                r.llm_usage for r in GradingResult.objects.filter(submission__batch_job=batch_job)
+                if r.llm_usage
+            ]
+            if usages:
+                print(f"   🪙 Prompt cache: {sum(u['cache_hit'] for u in usages)}/{len(usages)} calls hit, "
+                      f"{sum(u['cache_read_input_tokens'] for u in usages)} tokens read from cache, "
+                      f"{sum(u['input_tokens'] for u in usages)} uncached input tokens")
+                prompt_sizes = [sum(u["prompt_sections"].values()) for u in usages if u.get("prompt_sections")]
+                if prompt_sizes:
+                    print(f"   📏 Prompt size: ~{sum(prompt_sizes) // len(prompt_sizes)} tokens on average, "
+                          f"~{max(prompt_sizes)} at most (budget {settings.GRADING_SETTINGS.get('PROMPT_TOKEN_BUDGET', 12000)})")
+            llm_stats = llm_connection_stats()
+            print(f"   🔌 Claude API: {llm_stats['requests']} requests over {llm_stats['connections_opened']} connections "
+                  f"(reuse rate {llm_stats['reuse_rate'] if llm_stats['reuse_rate'] is not None else 'n/a'})")
+            cache = get_response_cache()
+            if cache is not None:
+                cache_stats = cache.stats()
+                print(f"   💾 Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                      f"(hit rate {cache_stats['hit_rate']:.0%}), {cache_stats['bypassed']} bypassed")
+            scheduler_stats = get_llm_scheduler().stats()
+            print(f"   🚥 Rate limits: {scheduler_stats['retries']} retries ({scheduler_stats['rate_limited']} throttled, "
+                  f"{scheduler_stats['overloaded']} overloaded), {scheduler_stats['total_wait_seconds']:.1f}s queued "
+                  f"(max {scheduler_stats['max_wait_seconds']:.1f}s, peak queue {scheduler_stats['peak_queue_depth']})")
             print("=" * 70)
             
         except Exception as e:
@@ -154,6 +172,297 @@ class BatchGradingService:
             batch_job.completed_at = timezone.now()
             batch_job.save()
     
+    def _grade_one_by_one(self, batch_job: BatchGradingJob) -> None:
+        """Grade each submission in turn, one synchronous Claude request each"""
+        submissions = batch_job.submissions.all()
+        counts = {'processed': 0, 'successful': 0, 'failed': 0}
+        
+        for i, submission in enumerate(submissions, 1):
+            try:
+                print(f"\n⚡ Processing {i}/{batch_job.total_files}: {submission.legacy_student_name}")
+                
+                # Update submission status
+                submission.status = 'grading'
+                submission.save()
+                
+                # Perform AI grading
+                grading_result = self.grading_service.grade_submission(submission)
+                self._mark_graded(submission, grading_result, counts)
+                
+            except Exception as e:
+                self._mark_failed(submission, e, counts)
+            
+            self._save_counts(batch_job, counts)
+    
+    def _grade_concurrently(self, batch_job: BatchGradingJob) -> None:
+        """
+        Grade all submissions on the async engine: local stages on a thread pool while
+        up to LLM_CONCURRENCY Claude reviews are in flight (see grading/async_engine.py)
+        """
+        engine = AsyncGradingEngine(self.grading_service)
+        counts = {'processed': 0, 'successful': 0, 'failed': 0}
+        
+        def on_graded(submission, grading_result):
+            self._mark_graded(submission, grading_result, counts)
+            self._save_counts(batch_job, counts)
+        
+        def on_failed(submission, error):
+            self._mark_failed(submission, error, counts)
+            self._save_counts(batch_job, counts)
+        
+        print(f"\n🚦 Grading {batch_job.total_files} submissions concurrently "
+              f"({engine.concurrency} reviews in flight, {engine.local_workers} local workers)")
+        stats = engine.run(batch_job.submissions.all(), on_graded, on_failed)
+        print(f"\n   ⏱️ {stats['reviews']} reviews took {stats['review_time']:.1f}s of API time "
+              f"in {stats['wall_time']:.1f}s wall time (peak {stats['peak_reviews_in_flight']} in flight)")
+    
+    def _grade_with_message_batches(self, batch_job: BatchGradingJob, resume: bool = False) -> None:
+        """
+        Run the local stages of every submission first, then send all Claude reviews as
+        Message Batches, wait for them to end and save each result as it is read back.
+        Reviews the batch could not deliver are retried synchronously.
+        
+        With resume, submissions already graded or failed are left alone; the others are
+        prepared again and, when llm_batch_ids were saved, their reviews are read back from
+        those batches rather than submitted anew.
+        """
+        config = settings.GRADING_SETTINGS
+        backend = get_batch_backend()
+        submissions = list(batch_job.submissions.all())
+        counts = {'processed': 0, 'successful': 0, 'failed': 0}
+        if resume:
+            submissions = [submission for submission in submissions if submission.status not in ('graded', 'error')]
+            counts = {
+                'processed': batch_job.processed_files,
+                'successful': batch_job.successful_grades,
+                'failed': batch_job.failed_grades
+            }
+        pending = {}  # custom_id -> prepare_grading() state
+        
+        print(f"\n🧰 Running local grading stages for {len(submissions)} submissions...")
+        for i, submission in enumerate(submissions, 1):
+            try:
+                print(f"\n⚡ Preparing {i}/{len(submissions)}: {submission.legacy_student_name}")
+                submission.status = 'grading'
+                submission.save()
+                
+                prepared = self.grading_service.prepare_grading(submission)
+                if prepared["prompt"] is None:
+                    # Decided without a review (e.g. syntax errors)
+                    self._mark_graded(submission, self.grading_service.finalize_grading(prepared), counts)
+                    self._save_counts(batch_job, counts)
+                else:
+                    pending[str(submission.id)] = prepared
+            except Exception as e:
+                self._mark_failed(submission, e, counts)
+                self._save_counts(batch_job, counts)
+        
+        # Reviews already answered for an identical prompt need no batch request
+        cache = get_response_cache()
+        if cache is not None:
+            for custom_id, prepared in list(pending.items()):
+                message = cache.lookup(self.grading_service.review_request(prepared))
+                if message is None:
+                    continue
+                del pending[custom_id]
+                submission = prepared["submission"]
+                try:
+                    grading_data, _ = self.grading_service.parse_review(prepared, message)
+                    grading_result = self.grading_service.finalize_grading(
+                        prepared, grading_data, self.grading_service.response_cache_usage()
+                    )
+                    self._mark_graded(submission, grading_result, counts)
+                except Exception as e:
+                    self._mark_failed(submission, e, counts)
+                self._save_counts(batch_job, counts)
+        
+        batch_ids = list(batch_job.llm_batch_ids or []) if resume else []
+        if batch_ids:
+            print(f"\n📬 Resuming {len(pending)} reviews from message batch(es): {', '.join(batch_ids)}")
+        else:
+            requests = [
+                {"custom_id": custom_id, "params": self.grading_service.review_request(prepared)}
+                for custom_id, prepared in pending.items()
+            ]
+            chunk_size = config.get('LLM_BATCH_MAX_REQUESTS', 10000)
+            for offset in range(0, len(requests), chunk_size):
+                batch_ids.append(backend.submit(requests[offset:offset + chunk_size]))
+            batch_job.llm_batch_ids = batch_ids
+            BatchGradingJob.objects.filter(id=batch_job.id).update(llm_batch_ids=batch_ids)
+            print(f"\n📬 Submitted {len(requests)} reviews in {len(batch_ids)} message batch(es): {', '.join(batch_ids) or 'none'}")
+        
+        # Wait for every batch to end (the service gives up on a batch after 24 hours)
+        poll_seconds = config.get('LLM_BATCH_POLL_SECONDS', 30)
+        waiting = self._wait_for_batches(
+            backend, batch_ids, time.monotonic() + config.get('LLM_BATCH_MAX_WAIT_HOURS', 24) * 3600, poll_seconds
+        )
+        if waiting:
+            # Cancel before retrying synchronously so no review is paid for twice; requests the
+            # batch finished meanwhile are billed anyway and read back once it has ended
+            for batch_id in waiting:
+                print(f"   ⚠️ Message batch {batch_id} did not end in time - canceling it")
+                try:
+                    backend.cancel(batch_id)
+                except Exception as e:
+                    print(f"   ⚠️ Canceling message batch {batch_id} failed: {str(e)}")
+            waiting = self._wait_for_batches(
+                backend, waiting, time.monotonic() + config.get('LLM_BATCH_CANCEL_WAIT_SECONDS', 600), poll_seconds
+            )
+        
+        for batch_id in batch_ids:
+            if batch_id in waiting:
+                print(f"   ⚠️ Message batch {batch_id} did not end after canceling - its reviews run synchronously")
+                continue
+            for custom_id, message, error in backend.results(batch_id):
+                prepared = pending.pop(custom_id, None)
+                if prepared is None:
+                    continue
+                submission = prepared["submission"]
+                try:
+                    if message is None:
+                        raise Exception(f"Batched review {error}")
+                    if cache is not None and not backend.is_stub:
+                        cache.store(self.grading_service.review_request(prepared), message)
+                    grading_data, llm_usage = self.grading_service.parse_review(prepared, message)
+                    llm_usage["message_batch"] = batch_id
+                    if backend.is_stub:
+                        # A placeholder, not a review: labelled as such, and a regrade asks Claude again
+                        grading_data["fallback"] = True
+                        llm_usage["stub"] = True
+                        prepared = {**prepared, "model_used": f"stub ({prepared['model_used']})"}
+                    grading_result = self.grading_service.finalize_grading(prepared, grading_data, llm_usage)
+                    self._mark_graded(submission, grading_result, counts)
+                except Exception as e:
+                    print(f"   ⚠️ {submission.legacy_student_name}: {str(e)} - retrying synchronously")
+                    pending[custom_id] = prepared
+                    continue
+                self._save_counts(batch_job, counts)
+        
+        # Anything the batches did not deliver gets a regular request
+        for prepared in pending.values():
+            submission = prepared["submission"]
+            try:
+                grading_data, llm_usage = self.grading_service._grade_with_claude(prepared)
+                grading_result = self.grading_service.finalize_grading(prepared, grading_data, llm_usage)
+                self._mark_graded(submission, grading_result, counts)
+            except Exception as e:
+                self._mark_failed(submission, e, counts)
+            self._save_counts(batch_job, counts)
+    
+    def _wait_for_batches(self, backend, batch_ids: List[str], deadline: float, poll_seconds: float) -> List[str]:
+        """Poll until every batch has ended or the deadline passes; returns the ones still running"""
+        waiting = list(batch_ids)
+        while waiting:
+            for batch_id in list(waiting):
+                batch_status = backend.status(batch_id)
+                if batch_status["ended"]:
+                    waiting.remove(batch_id)
+                    print(f"   ✅ Message batch {batch_id} ended: {batch_status['counts']}")
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(poll_seconds)
+        return waiting
+    
+    def _mark_graded(self, submission: StudentSubmission, grading_result: GradingResult, counts: dict) -> None:
+        submission.status = 'graded'
+        submission.total_score = grading_result.total_score
+        submission.percentage = grading_result.percentage
+        submission.graded_at = grading_result.graded_at
+        submission.save()
+        
+        counts['processed'] += 1
+        counts['successful'] += 1
+        print(f"   ✅ Completed: {grading_result.percentage}%")
+    
+    def _mark_failed(self, submission: StudentSubmission, error: Exception, counts: dict) -> None:
+        print(f"   ❌ Failed: {str(error)}")
+        
+        # Store error details
+        error_message = f"Grading failed: {str(error)}"
+        submission.status = 'error'
+        if hasattr(submission, 'error_details'):
+            submission.error_details = error_message
+        submission.save()
+        
+        counts['processed'] += 1
+        counts['failed'] += 1
+    
+    def _save_counts(self, batch_job: BatchGradingJob, counts: dict) -> None:
+        # Update batch job progress atomically
+        BatchGradingJob.objects.filter(id=batch_job.id).update(
+            processed_files=counts['processed'],
+            successful_grades=counts['successful'],
+            failed_grades=counts['failed']
+        )
+    
+    def start_assignment_regrade(self, assignment_id: str, fresh: bool = False) -> int:
+        """
+        Regrade every graded submission of an assignment in background;
+        returns the number of submissions queued
+        """
+        count = self._regradable(assignment_id).count()
+        thread = threading.Thread(
+            target=self.regrade_assignment,
+            args=(assignment_id, fresh),
+            daemon=True
+        )
+        thread.start()
+        print(f"🚀 Started background regrade of {count} submissions for assignment {assignment_id}")
+        return count
+    
+    def regrade_assignment(self, assignment_id: str, fresh: bool = False) -> dict:
+        """
+        Regrade every graded submission of an assignment, rerunning only the stages
+        whose inputs changed (e.g. only the AI review after a rubric or prompt edit);
+        fresh asks Claude for a new review of every submission
+        """
+        submissions = list(self._regradable(assignment_id))
+        summary = {
+            'assignment_id': str(assignment_id),
+            'total': len(submissions),
+            'regraded': 0,
+            'failed': 0,
+            'stages_rerun': {stage: 0 for stage in STAGES},
+        }
+        
+        print(f"\n🔁 ASSIGNMENT REGRADE STARTED")
+        print(f"   📊 Submissions: {len(submissions)}")
+        print("=" * 70)
+        
+        for i, submission in enumerate(submissions, 1):
+            student_name = submission.student.full_name if submission.student else submission.legacy_student_name
+            print(f"\n⚡ Regrading {i}/{len(submissions)}: {student_name}")
+            previous_fingerprints = dict(submission.grading_result.stage_fingerprints or {})
+            try:
+                grading_result = self.grading_service.regrade_submission(submission, fresh=fresh)
+            except Exception as e:
+                print(f"   ❌ Failed: {str(e)}")
+                summary['failed'] += 1
+                continue
+            
+            for stage in changed_stages(previous_fingerprints, grading_result.stage_fingerprints):
+                summary['stages_rerun'][stage] += 1
+            
+            submission.status = 'graded'
+            submission.total_score = grading_result.total_score
+            submission.percentage = grading_result.percentage
+            submission.graded_at = timezone.now()
+            submission.save()
+            summary['regraded'] += 1
+        
+        print(f"\n🎯 ASSIGNMENT REGRADE COMPLETED")
+        print(f"   ✅ Regraded: {summary['regraded']}/{summary['total']} (failed: {summary['failed']})")
+        print(f"   🔁 Stages rerun: " + ", ".join(f"{stage} {count}" for stage, count in summary['stages_rerun'].items()))
+        print("=" * 70)
+        
+        return summary
+    
+    def _regradable(self, assignment_id: str):
+        return StudentSubmission.objects.filter(
+            assignment_id=assignment_id,
+            grading_result__isnull=False
+        ).select_related('grading_result', 'student', 'assignment')
+    
     def _extract_student_name(self, filename: str) -> str:
         """
         Extract student name from filename
@@ -199,6 +508,8 @@ class BatchGradingService:
             return {
                 'id': str(batch_job.id),
                 'status': batch_job.status,
+                'mode': batch_job.mode,
+                'llm_batch_ids': batch_job.llm_batch_ids or [],
                 'assignment_name': batch_job.assignment_name or batch_job.assignment.name,
                 'total_files': batch_job.total_files,
                 'processed_files': batch_job.processed_files,
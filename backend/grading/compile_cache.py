@@ -0,0 +1,194 @@
+"""
+Compile Cache
+Content-addressed on-disk cache of C++ build artifacts, so regrades and
+byte-identical submissions skip the compiler entirely
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List, Any, Optional
+from django.conf import settings
+
+
+class CompileCache:
+    """Persistent artifact cache keyed by cleaned source, compiler version and flags"""
+
+    EXECUTABLE_NAME = "program"
+    META_NAME = "meta.json"
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size_bytes = None  # Computed lazily on the first store
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(source_sha256: str, compiler_version: str, flags: List[str], filename: str = "") -> str:
+        """Hash everything that can change the compiler's output (the source by its content hash)"""
+        digest = hashlib.sha256()
+        for part in (source_sha256, compiler_version, "\0".join(flags), filename):
+            digest.update(part.encode('utf-8', errors='replace'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, key: str, executable_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached compile outcome for key, or None on a miss.
+        On a successful build the cached executable is placed at executable_path.
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, self.META_NAME)
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["returncode"] == 0:
+                self._materialize(os.path.join(entry_dir, self.EXECUTABLE_NAME), executable_path)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return meta
+
+    def store(self, key: str, returncode: int, stderr: str, executable_path: Optional[str], stage: str = "build") -> None:
+        """Record a compile outcome (and its executable, if one was produced) and the stage that decided it"""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+
+        try:
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            staging_dir = tempfile.mkdtemp(prefix='.staging_', dir=os.path.dirname(entry_dir))
+
+            if returncode == 0 and executable_path and os.path.exists(executable_path):
+                shutil.copy2(executable_path, os.path.join(staging_dir, self.EXECUTABLE_NAME))
+
+            with open(os.path.join(staging_dir, self.META_NAME), 'w', encoding='utf-8') as f:
+                json.dump({"returncode": returncode, "stderr": stderr, "stage": stage}, f)
+
+            try:
+                # Atomic publish: concurrent workers either see the whole entry or nothing
+                os.rename(staging_dir, entry_dir)
+            except OSError:
+                # Another worker published the same key first
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return
+        except OSError as e:
+            print(f"   ⚠️ Compile cache store failed: {str(e)}")
+            return
+
+        entry_size = self._dir_size(entry_dir)
+        with self._lock:
+            self.stores += 1
+            if self._size_bytes is not None:
+                self._size_bytes += entry_size
+            needs_eviction = self._size_bytes is None or self._size_bytes > self.max_bytes
+
+        if needs_eviction:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits its size budget"""
+        entries = []
+        total = 0
+        for entry_dir in self._iter_entries():
+            try:
+                last_used = os.path.getmtime(os.path.join(entry_dir, self.META_NAME))
+            except OSError:
+                last_used = 0
+            size = self._dir_size(entry_dir)
+            entries.append((last_used, size, entry_dir))
+            total += size
+
+        evicted = 0
+        for last_used, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._size_bytes = total
+            self.evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.startswith('.'):
+                    yield os.path.join(shard_dir, name)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        try:
+            for name in os.listdir(path):
+                total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+        return total
+
+    @staticmethod
+    def _materialize(cached_path: str, executable_path: str) -> None:
+        """Hard-link the cached executable into the workspace, copying across filesystems"""
+        if os.path.lexists(executable_path):
+            os.remove(executable_path)
+        try:
+            os.link(cached_path, executable_path)
+        except OSError:
+            shutil.copy2(cached_path, executable_path)
+
+
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+
+
+def get_compile_cache() -> Optional[CompileCache]:
+    """Process-wide compile cache, or None when disabled in settings"""
+    global _compile_cache
+
+    grading_settings = settings.GRADING_SETTINGS
+    if not grading_settings.get('COMPILE_CACHE_ENABLED', True):
+        return None
+
+    with _compile_cache_lock:
+        if _compile_cache is None:
+            _compile_cache = CompileCache(
+                root=grading_settings['COMPILE_CACHE_DIR'],
+                max_bytes=grading_settings['COMPILE_CACHE_MAX_MB'] * 1024 * 1024
+            )
+        return _compile_cache
@@ -0,0 +1,289 @@
+"""
+Executor Service
+Local daemon that runs compile and program jobs on behalf of web and batch
+workers, so the large Django process never forks compilers or student binaries.
+
+Wire protocol: newline-delimited JSON over a Unix socket. Each request is
+{"id": ..., "job": {...}}. It gets an {"id": ..., "accepted": true} line once
+a worker slot picks the job up, then exactly one {"id": ..., "result": {...}}
+or {"id": ..., "error": "..."} line as soon as the job finishes. Clients time
+the job from its acceptance, so time spent queued is never charged to it.
+
+This module deliberately avoids importing Django at module level so it stays
+cheap to load in small helper processes.
+"""
+import os
+import json
+import socket
+import threading
+import subprocess
+import socketserver
+from typing import Callable, Dict, Any, Optional
+
+from .runner import ResourceLimits, run_program
+
+
+class ExecutorUnavailable(ConnectionError):
+    """The executor daemon could not be reached or dropped the connection"""
+
+
+class ExecutorTimeout(TimeoutError):
+    """The executor daemon took the job but did not answer in time (it may still run it)"""
+
+
+# Infrastructure failures: they say nothing about the program, so callers must not grade them
+EXECUTOR_ERRORS = (ExecutorUnavailable, ExecutorTimeout)
+
+
+def execute_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one job in this process and return its result dict"""
+    job_type = job.get("type")
+
+    if job_type == "compile":
+        try:
+            completed = subprocess.run(
+                job["args"],
+                capture_output=True,
+                text=True,
+                timeout=job.get("timeout", 30),
+                cwd=job.get("cwd")
+            )
+        except subprocess.TimeoutExpired:
+            return {"returncode": None, "stdout": "", "stderr": "", "timed_out": True}
+        return {
+            "returncode": completed.returncode,
+            "stdout": completed.stdout,
+            "stderr": completed.stderr,
+            "timed_out": False,
+        }
+
+    if job_type == "run":
+        limits = ResourceLimits.from_dict(job["limits"]) if job.get("limits") else None
+        return run_program(
+            job["args"],
+            job.get("input", ""),
+            timeout=job.get("timeout", 10),
+            limits=limits,
+            cwd=job.get("cwd"),
+            max_output_bytes=job.get("max_output_bytes", 1024 * 1024),
+            excerpt_bytes=job.get("excerpt_bytes", 4096)
+        )
+
+    raise ValueError(f"Unknown job type: {job_type!r}")
+
+
+class ExecutorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running at most `workers` jobs at a time across all clients"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, workers: int = None):
+        self.socket_path = socket_path
+        self.workers = workers or os.cpu_count() or 1
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._stats_lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+
+        # A socket left behind by a previous (crashed) daemon would block bind()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+        old_umask = os.umask(0o077)  # Only the owning user may submit jobs
+        try:
+            super().__init__(socket_path, ExecutorRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def handle_job(self, job: Dict[str, Any], on_accept: Callable[[], None] = None) -> Dict[str, Any]:
+        """Run a job once a worker slot is free; on_accept is called when it gets one"""
+        if job.get("type") == "ping":
+            if on_accept:
+                on_accept()
+            return {"pong": True, "pid": os.getpid(), **self.stats()}
+
+        with self._stats_lock:
+            self.waiting += 1
+        with self._slots:
+            with self._stats_lock:
+                self.waiting -= 1
+                self.active += 1
+            if on_accept:
+                on_accept()
+            try:
+                result = execute_job(job)
+            except Exception:
+                with self._stats_lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+        with self._stats_lock:
+            self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+
+class ExecutorRequestHandler(socketserver.StreamRequestHandler):
+    """One client connection; requests on it are answered in order"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                response = {"id": request_id, "result": self.server.handle_job(
+                    request["job"], on_accept=lambda: self._send({"id": request_id, "accepted": True})
+                )}
+            except Exception as e:
+                response = {"id": request_id, "error": str(e)}
+
+            try:
+                self._send(response)
+            except OSError:
+                # Client went away; its job result is simply dropped
+                return
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message).encode('utf-8') + b"\n")
+        self.wfile.flush()
+
+
+class ExecutorClient:
+    """Submits jobs to an executor daemon; each calling thread keeps its own connection"""
+
+    CONNECT_TIMEOUT = 5
+    QUEUE_TIMEOUT = 3600  # Seconds a job may wait for a worker slot before the daemon counts as stuck
+    RESPONSE_MARGIN = 30  # Seconds allowed beyond the job's own timeout, counted from acceptance
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._local = threading.local()
+        self._id_lock = threading.Lock()
+        self._next_id = 0
+
+    def submit(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a job on the daemon and return its result
+
+        Raises ExecutorUnavailable when the daemon cannot be reached or drops the connection,
+        and ExecutorTimeout when it accepted the job but did not answer in time. A timed-out
+        job is never resent: the daemon may still be queueing or running it.
+        """
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+        payload = json.dumps({"id": request_id, "job": job}).encode('utf-8') + b"\n"
+
+        response_timeout = job.get("timeout", 30) + self.RESPONSE_MARGIN
+
+        # A pooled connection may have been closed by a daemon restart: reconnect once
+        for attempt in range(2):
+            connection = self._connection()
+            accepted = False
+            try:
+                connection["socket"].settimeout(self.QUEUE_TIMEOUT)
+                connection["socket"].sendall(payload)
+                line = connection["reader"].readline()
+                if line and json.loads(line).get("accepted"):
+                    accepted = True
+                    connection["socket"].settimeout(response_timeout)
+                    line = connection["reader"].readline()
+            except socket.timeout as e:
+                self._disconnect()
+                if accepted:
+                    raise ExecutorTimeout(f"Executor did not answer within {response_timeout}s of starting the job") from e
+                raise ExecutorTimeout(f"Executor did not start the job within {self.QUEUE_TIMEOUT}s") from e
+            except OSError as e:
+                self._disconnect()
+                if attempt:
+                    raise ExecutorUnavailable(f"Executor connection failed: {str(e)}") from e
+                continue
+            if not line:
+                self._disconnect()
+                if attempt:
+                    raise ExecutorUnavailable("Executor closed the connection")
+                continue
+            break
+
+        response = json.loads(line)
+        if response.get("id") != request_id:
+            self._disconnect()
+            raise ExecutorUnavailable("Executor response out of sequence")
+        if "error" in response:
+            raise RuntimeError(f"Executor job failed: {response['error']}")
+        return response["result"]
+
+    def ping(self) -> Dict[str, Any]:
+        return self.submit({"type": "ping", "timeout": 0})
+
+    def _connection(self) -> Dict[str, Any]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.CONNECT_TIMEOUT)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ExecutorUnavailable(f"Executor not reachable at {self.socket_path}: {str(e)}") from e
+            connection = {"socket": sock, "reader": sock.makefile('rb')}
+            self._local.connection = connection
+        return connection
+
+    def _disconnect(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            try:
+                connection["reader"].close()
+                connection["socket"].close()
+            except OSError:
+                pass
+            self._local.connection = None
+
+
+_executor_client = None
+_executor_client_lock = threading.Lock()
+
+
+def get_executor_client() -> Optional[ExecutorClient]:
+    """
+    Process-wide executor client: the shared daemon at EXECUTOR_SOCKET if configured,
+    else this worker's spawn helper (see grading/spawner.py), else None (jobs run in-process)
+    """
+    global _executor_client
+    from django.conf import settings
+    from .spawner import spawn_helper_socket
+
+    socket_path = settings.GRADING_SETTINGS.get('EXECUTOR_SOCKET') or spawn_helper_socket()
+    if not socket_path:
+        return None
+
+    with _executor_client_lock:
+        if _executor_client is None or _executor_client.socket_path != str(socket_path):
+            _executor_client = ExecutorClient(str(socket_path))
+        return _executor_client
@@ -0,0 +1,143 @@
+"""
+Expected Output Store
+Memoizes the reference program's output for each test input, so the reference
+runs once per assignment instead of once per submission
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional
+from django.conf import settings
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExpectedOutputStore:
+    """Reference run results keyed by reference artifact hash and test input"""
+
+    MEMORY_ENTRIES = 4096
+    LOCK_STRIPES = 64  # Fixed pool of per-key locks, so long-lived workers do not grow one per input
+
+    def __init__(self, root: str):
+        self.root = str(root)
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(artifact_hash: str, test_input: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(artifact_hash.encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(test_input.encode('utf-8', errors='replace'))
+        return digest.hexdigest()
+
+    def get(self, artifact_hash: str, test_input: str) -> Optional[Dict[str, Any]]:
+        """Stored reference result for this input, or None"""
+        key = self.make_key(artifact_hash, test_input)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            with open(self._path(artifact_hash, key), 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, result)
+        return result
+
+    def put(self, artifact_hash: str, test_input: str, result: Dict[str, Any]) -> None:
+        """Store a reference result; only successful runs are kept"""
+        if not result.get("success"):
+            return
+
+        key = self.make_key(artifact_hash, test_input)
+        self._remember(key, result)
+
+        path = self._path(artifact_hash, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(staging_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(staging_path, path)
+        except OSError as e:
+            print(f"   ⚠️ Expected output store write failed: {str(e)}")
+
+    def get_or_run(self, artifact_hash: str, test_input: str, run: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the stored result, running the reference (once, even under concurrency) on a miss"""
+        key = self.make_key(artifact_hash, test_input)
+
+        with self._key_lock(key):
+            result = self.get(artifact_hash, test_input)
+            if result is not None:
+                with self._lock:
+                    self.hits += 1
+                return result
+
+            with self._lock:
+                self.misses += 1
+            result = run()
+            self.put(artifact_hash, test_input, result)
+            return result
+
+    def prime(self, artifact_hash: str, test_inputs: List[str], run: Callable[[str], Dict[str, Any]]) -> int:
+        """Eagerly fill the store for a set of inputs; returns how many reference runs were needed"""
+        runs_needed = 0
+        for test_input in test_inputs:
+            if self.get(artifact_hash, test_input) is None:
+                self.put(artifact_hash, test_input, run(test_input))
+                runs_needed += 1
+        return runs_needed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _path(self, artifact_hash: str, key: str) -> str:
+        return os.path.join(self.root, artifact_hash, f"{key}.json")
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        # Keys are hex digests: their leading bits pick the stripe
+        return self._key_locks[int(key[:8], 16) % self.LOCK_STRIPES]
+
+
+_expected_output_store = None
+_expected_output_store_lock = threading.Lock()
+
+
+def get_expected_output_store() -> ExpectedOutputStore:
+    """Process-wide expected output store"""
+    global _expected_output_store
+
+    with _expected_output_store_lock:
+        if _expected_output_store is None:
+            _expected_output_store = ExpectedOutputStore(settings.GRADING_SETTINGS['EXPECTED_OUTPUTS_DIR'])
+        return _expected_output_store
@@ -0,0 +1,27 @@
+"""
+Stage Fingerprints
+Every grading stage records a hash of its inputs next to its result, so a
+regrade can tell which stored results are still valid and rerun only the
+stages whose inputs changed (and everything downstream of them)
+"""
+import json
+import hashlib
+from typing import Any
+
+# Grading stages in pipeline order, as stored in GradingResult.stage_fingerprints
+STAGES = ("rubric", "compile", "style", "tests", "profile", "llm")
+
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 over the canonical JSON form of the given input parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8", errors="replace")).hexdigest()
+
+
+def changed_stages(previous: dict, current: dict) -> list:
+    """Stages whose fingerprint differs between two runs (missing counts as changed)"""
+    previous = previous or {}
+    return [
+        stage for stage in STAGES
+        if stage in current and (current[stage] is None or previous.get(stage) != current[stage])
+    ]
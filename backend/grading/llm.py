@@ -0,0 +1,172 @@
+"""
+LLM Client Provider
+One Anthropic client per process, on a tuned HTTP connection pool, shared by
+every grading service, tool and view. Keeping connections alive between
+requests saves a TCP and TLS handshake on each call; the provider counts how
+many requests actually reused a pooled connection.
+"""
+import os
+import asyncio
+import weakref
+import threading
+from typing import Dict, Any
+from django.conf import settings
+import anthropic
+import httpx
+
+
+class ConnectionStats:
+    """
+    Request and connection counters fed by httpcore's trace hook: a request that
+    did not open a connection was served on a pooled keep-alive connection
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.connect_failures = 0
+
+    def trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name in ("http11.send_request_headers.started", "http2.send_request_headers.started"):
+            counter = "requests"
+        elif event_name == "connection.connect_tcp.complete":
+            counter = "connections"
+        elif event_name == "connection.start_tls.complete":
+            counter = "tls_handshakes"
+        elif event_name == "connection.connect_tcp.failed":
+            counter = "connect_failures"
+        else:
+            return
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def atrace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """The same hook for async clients (httpcore awaits it there)"""
+        self.trace(event_name, info)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "connect_failures": self.connect_failures,
+                "reused_requests": reused,
+                "reuse_rate": round(reused / self.requests, 3) if self.requests else None,
+            }
+
+
+class LLMClientProvider:
+    """Builds the shared Anthropic client (and its HTTP pool) from GRADING_SETTINGS"""
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+        self.stats = ConnectionStats()
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._async_clients = weakref.WeakKeyDictionary()  # Event loop -> AsyncAnthropic
+
+    def get_client(self) -> anthropic.Anthropic:
+        with self._lock:
+            # A pool inherited across fork() shares sockets with the parent: start a fresh one
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._create_client()
+                self._pid = os.getpid()
+            return self._client
+
+    def close(self) -> None:
+        """Close the pooled connections (the next get_client() opens a new pool)"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def get_async_client(self) -> anthropic.AsyncAnthropic:
+        """The AsyncAnthropic client of the running event loop (e.g. the ASGI server's), shared by its requests"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = self.create_async_client()
+            return client
+
+    def create_async_client(self) -> anthropic.AsyncAnthropic:
+        """
+        A new AsyncAnthropic client on the same pool settings. Async connections belong to
+        one event loop, so each loop (e.g. each AsyncGradingEngine run) creates and closes its own
+        """
+        http_client = anthropic.DefaultAsyncHttpxClient(
+            limits=self.limits(),
+            timeout=self.timeout(),
+            event_hooks={"request": [self._attach_async_trace]},
+        )
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key or settings.CLAUDE_API_KEY,
+            http_client=http_client,
+            timeout=self.timeout(),
+            max_retries=settings.GRADING_SETTINGS.get('LLM_MAX_RETRIES', 2),
+        )
+
+    def _create_client(self) -> anthropic.Anthropic:
+        http_client = anthropic.DefaultHttpxClient(
+            limits=self.limits(),
+            timeout=self.timeout(),
+            event_hooks={"request": [self._attach_trace]},
+        )
+        return anthropic.Anthropic(
+            api_key=self.api_key or settings.CLAUDE_API_KEY,
+            http_client=http_client,
+            timeout=self.timeout(),
+            max_retries=settings.GRADING_SETTINGS.get('LLM_MAX_RETRIES', 2),
+        )
+
+    @staticmethod
+    def limits() -> httpx.Limits:
+        config = settings.GRADING_SETTINGS
+        return httpx.Limits(
+            max_connections=config.get('LLM_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=config.get('LLM_KEEPALIVE_CONNECTIONS', 10),
+            keepalive_expiry=config.get('LLM_KEEPALIVE_EXPIRY_SECONDS', 60),
+        )
+
+    @staticmethod
+    def timeout() -> httpx.Timeout:
+        config = settings.GRADING_SETTINGS
+        return httpx.Timeout(
+            config.get('LLM_TIMEOUT_SECONDS', 120),
+            connect=config.get('LLM_CONNECT_TIMEOUT_SECONDS', 10),
+        )
+
+    def _attach_trace(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self.stats.trace
+
+    async def _attach_async_trace(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self.stats.atrace
+
+
+_llm_provider = None
+_llm_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> LLMClientProvider:
+    """Process-wide LLM client provider"""
+    global _llm_provider
+
+    with _llm_provider_lock:
+        if _llm_provider is None:
+            _llm_provider = LLMClientProvider()
+        return _llm_provider
+
+
+def get_llm_client() -> anthropic.Anthropic:
+    """The process-wide Anthropic client (thread-safe; share it, never close it per request)"""
+    return get_llm_provider().get_client()
+
+
+def llm_connection_stats() -> Dict[str, Any]:
+    """Connection reuse counters of this process's LLM client"""
+    return get_llm_provider().stats.snapshot()
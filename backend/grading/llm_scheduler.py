@@ -0,0 +1,335 @@
+"""
+LLM Scheduler
+Every Claude call of this process goes through one scheduler that keeps it
+under the API's rate limits instead of finding them by failing. Token buckets
+pace requests, input tokens and output tokens per minute; the limits and the
+remaining budget reported in each response's rate-limit headers replace the
+configured ones as soon as they are known. Throttled (429), overloaded (529)
+and transient failures are retried with jittered exponential backoff, and a
+429 holds back every caller until its retry-after has passed.
+
+Output tokens are charged up front at output_reserve per call, not max_tokens:
+reserving max_tokens=4000 against the default 8,000 output tokens per minute
+would admit only two reviews at a time, however high LLM_CONCURRENCY is set.
+A grading review uses far fewer tokens; the difference to the real usage is
+settled when the response arrives, and a call that used more than its
+reservation leaves the bucket in debt, which slows the calls after it.
+"""
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Callable, Dict, Any, Optional
+from django.conf import settings
+import anthropic
+
+from .prompt_budget import estimate_tokens
+
+# Status codes worth another attempt: timeouts, conflicts, rate limits, server errors, overloaded
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Rate-limit response headers per bucket (anthropic-ratelimit-<name>-limit / -remaining)
+RATE_LIMIT_HEADERS = {
+    "requests": "anthropic-ratelimit-requests",
+    "input_tokens": "anthropic-ratelimit-input-tokens",
+    "output_tokens": "anthropic-ratelimit-output-tokens",
+}
+
+
+class TokenBucket:
+    """limit units per minute, refilled continuously (a limit of 0 means unlimited)"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.level = float(limit)
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available (amounts over the limit wait for a full bucket)"""
+        if not self.limit:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.limit)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.limit
+
+    def adjust(self, amount: float, now: float) -> None:
+        """Add (refund) or remove (charge) units; charges may leave the bucket in debt"""
+        if self.limit:
+            self._refill(now)
+            self.level = min(float(self.limit), self.level + amount)
+
+    def observe(self, limit: Optional[int], remaining: Optional[int], now: float) -> None:
+        """Adopt the limit and remaining budget the API reported"""
+        self._refill(now)
+        if limit and limit != self.limit:
+            self.level = self.level * limit / self.limit if self.limit else float(limit)
+            self.limit = limit
+        if remaining is not None and self.limit:
+            self.level = min(self.level, float(remaining))
+
+    def _refill(self, now: float) -> None:
+        if self.limit:
+            self.level = min(float(self.limit), self.level + (now - self.updated) * self.limit / 60.0)
+        self.updated = now
+
+
+class LLMScheduler:
+    """
+    Admits Messages API calls at the sustainable rate and retries the ones the API turns away.
+    create() is for threads, acreate() for coroutines; both share the same buckets.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, input_tokens_per_minute: int = 0,
+                 output_tokens_per_minute: int = 0, output_reserve: int = 0, max_attempts: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute),
+            "input_tokens": TokenBucket(input_tokens_per_minute),
+            "output_tokens": TokenBucket(output_tokens_per_minute),
+        }
+        self.output_reserve = output_reserve  # 0 = reserve max_tokens
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stats = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "overloaded": 0,
+            "queue_depth": 0,
+            "peak_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def create(self, client: anthropic.Anthropic, params: Dict[str, Any]) -> anthropic.types.Message:
+        """client.messages.create(**params), paced by the rate limits and retried when throttled"""
+        cost = self._cost(params)
+        client = client.with_options(max_retries=0)  # Retries are scheduled here
+        for attempt in range(self.max_attempts):
+            self._wait(cost)
+            try:
+                raw = client.messages.with_raw_response.create(**params)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, cost, attempt))
+                continue
+            return self._completed(raw, cost)
+
+    async def acreate(self, client: anthropic.AsyncAnthropic, params: Dict[str, Any]) -> anthropic.types.Message:
+        """The coroutine form of create() for AsyncAnthropic clients"""
+        cost = self._cost(params)
+        client = client.with_options(max_retries=0)
+        for attempt in range(self.max_attempts):
+            await self._async_wait(cost)
+            try:
+                raw = await client.messages.with_raw_response.create(**params)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, cost, attempt))
+                continue
+            return self._completed(raw, cost)
+
+    async def astream(self, client: anthropic.AsyncAnthropic, params: Dict[str, Any],
+                      on_text: Callable[[str], None]) -> anthropic.types.Message:
+        """
+        acreate() as a streamed response: on_text receives the text as it is generated.
+        Only failures before the first text are retried (a partial answer cannot be resumed).
+        """
+        cost = self._cost(params)
+        client = client.with_options(max_retries=0)
+        for attempt in range(self.max_attempts):
+            await self._async_wait(cost)
+            streamed = False
+            try:
+                async with client.messages.stream(**params) as stream:
+                    async for text in stream.text_stream:
+                        streamed = True
+                        on_text(text)
+                    message = await stream.get_final_message()
+                    headers = stream.response.headers
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, cost, attempt, resumable=not streamed))
+                continue
+            return self._settle(message, headers, cost)
+
+    def stats(self) -> Dict[str, Any]:
+        """Call, retry and queueing counters, and the limits currently in force"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            now = time.monotonic()
+            snapshot["limits"] = {name: bucket.limit for name, bucket in self.buckets.items()}
+            snapshot["paused_for_seconds"] = round(max(self._paused_until - now, 0.0), 3)
+        admitted = snapshot["calls"] + snapshot["retries"]
+        snapshot["average_wait_seconds"] = round(snapshot["total_wait_seconds"] / admitted, 3) if admitted else 0.0
+        snapshot["total_wait_seconds"] = round(snapshot["total_wait_seconds"], 3)
+        snapshot["max_wait_seconds"] = round(snapshot["max_wait_seconds"], 3)
+        return snapshot
+
+    def _cost(self, params: Dict[str, Any]) -> Dict[str, float]:
+        # Input is estimated as the prompt budget does; output is reserved at output_reserve
+        # (at most max_tokens) and settled against the real usage once it is known
+        prompt = json.dumps([params.get("system", ""), params.get("messages", [])])
+        max_tokens = params.get("max_tokens", 0)
+        with self._lock:
+            self._stats["calls"] += 1  # Once per call, however many attempts it takes
+        return {
+            "requests": 1,
+            "input_tokens": estimate_tokens(prompt),
+            "output_tokens": min(self.output_reserve, max_tokens) if self.output_reserve else max_tokens,
+        }
+
+    def _admit(self, cost: Dict[str, float]) -> float:
+        """Take cost from every bucket if all have it; otherwise the seconds to wait before asking again"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                [self._paused_until - now] +
+                [bucket.wait_time(cost[name], now) for name, bucket in self.buckets.items()]
+            )
+            if wait > 0:
+                return wait
+            for name, bucket in self.buckets.items():
+                bucket.adjust(-cost[name], now)
+            return 0.0
+
+    def _wait(self, cost: Dict[str, float]) -> None:
+        start = self._enqueue()
+        try:
+            while True:
+                delay = self._admit(cost)
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+        finally:
+            self._dequeue(start)
+
+    async def _async_wait(self, cost: Dict[str, float]) -> None:
+        start = self._enqueue()
+        try:
+            while True:
+                delay = self._admit(cost)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self._dequeue(start)
+
+    def _enqueue(self) -> float:
+        with self._lock:
+            self._stats["queue_depth"] += 1
+            self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], self._stats["queue_depth"])
+        return time.monotonic()
+
+    def _dequeue(self, start: float) -> None:
+        waited = time.monotonic() - start
+        with self._lock:
+            self._stats["queue_depth"] -= 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def _completed(self, raw, cost: Dict[str, float]) -> anthropic.types.Message:
+        return self._settle(raw.parse(), raw.headers, cost)
+
+    def _settle(self, message: anthropic.types.Message, headers, cost: Dict[str, float]) -> anthropic.types.Message:
+        usage = message.usage
+        used_input = usage.input_tokens + (usage.cache_creation_input_tokens or 0)
+        with self._lock:
+            now = time.monotonic()
+            self.buckets["input_tokens"].adjust(cost["input_tokens"] - used_input, now)
+            self.buckets["output_tokens"].adjust(cost["output_tokens"] - usage.output_tokens, now)
+            self._observe_headers(headers, now)
+            self._stats["succeeded"] += 1
+        return message
+
+    def _retry_delay(self, error: Exception, cost: Dict[str, float], attempt: int, resumable: bool = True) -> float:
+        """Seconds to back off before the next attempt; re-raises errors that are final"""
+        status = getattr(error, "status_code", None)
+        response = getattr(error, "response", None)
+        headers = response.headers if response is not None else {}
+        retryable = (
+            isinstance(error, anthropic.APIConnectionError) or
+            status in RETRYABLE_STATUS or
+            headers.get("x-should-retry") == "true"
+        ) and headers.get("x-should-retry") != "false" and resumable
+
+        with self._lock:
+            now = time.monotonic()
+            # A turned-away request consumed no tokens
+            self.buckets["input_tokens"].adjust(cost["input_tokens"], now)
+            self.buckets["output_tokens"].adjust(cost["output_tokens"], now)
+            self._observe_headers(headers, now)
+            if status == 429:
+                self._stats["rate_limited"] += 1
+            elif status == 529:
+                self._stats["overloaded"] += 1
+            if not retryable or attempt + 1 >= self.max_attempts:
+                self._stats["failed"] += 1
+                raise error
+
+            # Full jitter spreads retries out; a retry-after from the API is a floor
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            retry_after = _retry_after(headers)
+            if retry_after is not None:
+                delay = min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+            if status == 429:
+                # The limit is shared by every caller: hold them all back, not just this one
+                self._paused_until = max(self._paused_until, now + delay)
+            self._stats["retries"] += 1
+
+        print(f"   ⏳ Claude API {status or type(error).__name__} - retrying in {delay:.1f}s "
+              f"(attempt {attempt + 2}/{self.max_attempts})")
+        return delay
+
+    def _observe_headers(self, headers, now: float) -> None:
+        for name, prefix in RATE_LIMIT_HEADERS.items():
+            limit = _int_header(headers, f"{prefix}-limit")
+            remaining = _int_header(headers, f"{prefix}-remaining")
+            if limit is not None or remaining is not None:
+                self.buckets[name].observe(limit, remaining, now)
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide LLM scheduler configured from GRADING_SETTINGS"""
+    global _llm_scheduler
+
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            config = settings.GRADING_SETTINGS
+            _llm_scheduler = LLMScheduler(
+                requests_per_minute=config.get('LLM_REQUESTS_PER_MINUTE', 50),
+                input_tokens_per_minute=config.get('LLM_INPUT_TOKENS_PER_MINUTE', 30000),
+                output_tokens_per_minute=config.get('LLM_OUTPUT_TOKENS_PER_MINUTE', 8000),
+                output_reserve=config.get('LLM_OUTPUT_RESERVE_TOKENS', 1000),
+                max_attempts=config.get('LLM_RETRY_ATTEMPTS', 6),
+                base_delay=config.get('LLM_RETRY_BASE_SECONDS', 1.0),
+                max_delay=config.get('LLM_RETRY_MAX_SECONDS', 60.0),
+            )
+        return _llm_scheduler
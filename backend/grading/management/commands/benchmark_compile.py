@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import os
+import time
+import statistics
+
+from grading.tools import CPPAnalysisTools
+from grading.ingest import ingest_file
+
+
+class Command(BaseCommand):
+    help = 'Benchmark compile latency with and without precompiled headers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', type=str,
+            default=os.path.join(settings.GRADING_SETTINGS['REFERENCE_ANSWERS_PATH'], 'assignment1_answer.cpp'),
+            help='C++ source file to compile'
+        )
+        parser.add_argument('--runs', type=int, default=5, help='Number of timed compiles per mode')
+
+    def handle(self, *args, **options):
+        file_path = options['file']
+        runs = options['runs']
+
+        if not os.path.exists(file_path):
+            self.stdout.write(self.style.ERROR(f'File not found: {file_path}'))
+            return
+
+        code = ingest_file(file_path)
+
+        tools = CPPAnalysisTools()
+        try:
+            # Build the bundle up front so its one-time cost is not charged to the first run
+            tools.compile_code(code, "warmup.cpp", use_cache=False, use_pch=True)
+
+            timings = {}
+            for mode, use_pch in (('without PCH', False), ('with PCH', True)):
+                samples = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    result = tools.compile_code(code, "benchmark.cpp", use_cache=False, use_pch=use_pch)
+                    samples.append(time.perf_counter() - start)
+                    if not result['success']:
+                        self.stdout.write(self.style.ERROR(f'Compilation failed: {result["errors"][:500]}'))
+                        return
+                timings[mode] = samples
+
+            self.stdout.write(f'Compile latency for {file_path} ({runs} runs each):')
+            for mode, samples in timings.items():
+                self.stdout.write(
+                    f'  {mode:<12} mean {statistics.mean(samples) * 1000:8.1f} ms   '
+                    f'median {statistics.median(samples) * 1000:8.1f} ms   '
+                    f'min {min(samples) * 1000:8.1f} ms'
+                )
+
+            speedup = statistics.median(timings['without PCH']) / statistics.median(timings['with PCH'])
+            self.stdout.write(self.style.SUCCESS(f'Median speedup with PCH: {speedup:.2f}x'))
+        finally:
+            tools.cleanup()
@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import os
+import random
+import tempfile
+import time
+import statistics
+
+from grading.ingest import ingest_file
+
+
+def legacy_read(file_path: str) -> str:
+    """The previous reader: one open() per encoding attempt"""
+    for encoding in ['utf-8', 'latin-1', 'cp1252', 'ascii', 'utf-16']:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                content = f.read()
+                if content.strip():
+                    return content
+        except UnicodeDecodeError:
+            continue
+    raise Exception(f"Could not read file {file_path}")
+
+
+def legacy_clean(code: str) -> str:
+    """The previous per-character normalizer"""
+    if code.startswith('\ufeff'):
+        code = code[1:]
+    code = code.replace('\r\n', '\n').replace('\r', '\n')
+    cleaned = ''
+    for char in code:
+        if ord(char) < 32:
+            cleaned += char if char in ['\n', '\t'] else ' '
+        elif ord(char) > 126:
+            cleaned += char if ord(char) < 256 else ' '
+        else:
+            cleaned += char
+    if not cleaned.endswith('\n'):
+        cleaned += '\n'
+    return cleaned
+
+
+class Command(BaseCommand):
+    help = 'Benchmark source ingestion (read, decode, normalize, hash) on inputs up to MAX_CODE_SIZE_KB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size-kb', type=int, default=settings.GRADING_SETTINGS['MAX_CODE_SIZE_KB'],
+            help='Size of the generated source file'
+        )
+        parser.add_argument('--runs', type=int, default=5, help='Number of timed runs per pipeline')
+
+    def handle(self, *args, **options):
+        size = options['size_kb'] * 1024
+        runs = options['runs']
+
+        # Windows line endings, tabs, a stray control character and non-ASCII comments,
+        # so every normalization step has work to do
+        rng = random.Random(0)
+        lines = [
+            '#include <iostream>\r\n',
+            '\tint value = 42; // compteur de boucle été\r\n',
+            '\tstd::cout << "résultat: " << value << std::endl;\r\n',
+            '\t// ‘smart quotes’ pasted from a handout\x0c\r\n',
+        ]
+        chunks = []
+        total = 0
+        while total < size:
+            line = rng.choice(lines)
+            chunks.append(line)
+            total += len(line.encode('utf-8'))
+        data = ''.join(chunks).encode('utf-8')[:size]
+
+        handle, file_path = tempfile.mkstemp(suffix='.cpp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+
+            pipelines = (
+                ('legacy', lambda: legacy_clean(legacy_read(file_path))),
+                ('ingest', lambda: ingest_file(file_path)),
+            )
+            timings = {}
+            outputs = {}
+            for name, pipeline in pipelines:
+                samples = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    outputs[name] = pipeline()
+                    samples.append(time.perf_counter() - start)
+                timings[name] = samples
+
+            self.stdout.write(f'Ingestion of a {len(data) / 1024:.0f} KB source ({runs} runs each):')
+            for name, samples in timings.items():
+                self.stdout.write(
+                    f'  {name:<8} median {statistics.median(samples) * 1000:9.2f} ms   '
+                    f'min {min(samples) * 1000:9.2f} ms'
+                )
+
+            if outputs['legacy'] != outputs['ingest']:
+                self.stdout.write(self.style.WARNING('Normalized text differs from the legacy pipeline'))
+
+            speedup = statistics.median(timings['legacy']) / statistics.median(timings['ingest'])
+            self.stdout.write(self.style.SUCCESS(f'Median speedup: {speedup:.1f}x'))
+        finally:
+            os.remove(file_path)
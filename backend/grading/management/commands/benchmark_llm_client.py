@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+import time
+import statistics
+
+import anthropic
+
+from grading.llm import LLMClientProvider
+from grading.services import GradingService
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Claude API call latency: a new client per call vs. the shared pooled client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Number of timed calls per path')
+
+    def handle(self, *args, **options):
+        runs = options['requests']
+        model = GradingService().model
+        provider = LLMClientProvider()
+
+        # Token counting is free and needs no output, so the timing is mostly connection setup
+        def call(client: anthropic.Anthropic):
+            client.messages.count_tokens(model=model, messages=[{"role": "user", "content": "ping"}])
+
+        def fresh_client():
+            client = LLMClientProvider().get_client()
+            try:
+                call(client)
+            finally:
+                client.close()
+
+        paths = (
+            ('new client', fresh_client),
+            ('shared', lambda: call(provider.get_client())),
+        )
+        timings = {}
+        for name, path in paths:
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                path()
+                samples.append(time.perf_counter() - start)
+            timings[name] = samples
+
+        self.stdout.write(f'Claude API call latency ({runs} calls each):')
+        for name, samples in timings.items():
+            self.stdout.write(
+                f'  {name:<10} median {statistics.median(samples) * 1000:8.2f} ms   '
+                f'min {min(samples) * 1000:8.2f} ms'
+            )
+
+        stats = provider.stats.snapshot()
+        self.stdout.write(
+            f'Shared client: {stats["requests"]} requests over {stats["connections_opened"]} connections '
+            f'({stats["tls_handshakes"]} TLS handshakes, reuse rate {stats["reuse_rate"]})'
+        )
+        provider.close()
+
+        speedup = statistics.median(timings['new client']) / statistics.median(timings['shared'])
+        self.stdout.write(self.style.SUCCESS(f'Median speedup with the shared client: {speedup:.2f}x'))
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import os
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+
+from grading.executor import ExecutorClient, execute_job
+from grading.runner import ResourceLimits
+
+
+class Command(BaseCommand):
+    help = 'Benchmark program spawn latency: forking from this process vs. through a spawn helper'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=50, help='Number of timed spawns per path')
+        parser.add_argument(
+            '--ballast-mb', type=int, default=256,
+            help='Memory to touch in this process first, to stand in for a loaded grading worker'
+        )
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+
+        # Resident pages make every fork copy a bigger page table, as in a real worker
+        ballast = bytearray(options['ballast_mb'] * 1024 * 1024)
+        for offset in range(0, len(ballast), 4096):
+            ballast[offset] = 1
+
+        job = {
+            "type": "run",
+            "args": ["/bin/true"],
+            "input": "",
+            "timeout": 10,
+            "limits": ResourceLimits().to_dict(),
+        }
+
+        socket_path = os.path.join(tempfile.gettempdir(), f'gradingai-spawn-benchmark-{os.getpid()}.sock')
+        helper = subprocess.Popen(
+            [sys.executable, '-m', 'grading.spawner', socket_path],
+            cwd=str(settings.BASE_DIR)
+        )
+        try:
+            deadline = time.monotonic() + 10
+            while not os.path.exists(socket_path):
+                if time.monotonic() > deadline or helper.poll() is not None:
+                    self.stdout.write(self.style.ERROR('Spawn helper did not start'))
+                    return
+                time.sleep(0.01)
+
+            client = ExecutorClient(socket_path)
+            client.ping()
+
+            paths = (
+                ('in-process', lambda: execute_job(job)),
+                ('helper', lambda: client.submit(job)),
+            )
+            timings = {}
+            for name, spawn in paths:
+                spawn()  # Warm-up
+                samples = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    spawn()
+                    samples.append(time.perf_counter() - start)
+                timings[name] = samples
+
+            self.stdout.write(
+                f'Spawn latency of /bin/true with a {options["ballast_mb"]} MB worker image ({runs} runs each):'
+            )
+            for name, samples in timings.items():
+                self.stdout.write(
+                    f'  {name:<11} median {statistics.median(samples) * 1000:7.2f} ms   '
+                    f'p95 {sorted(samples)[int(len(samples) * 0.95) - 1] * 1000:7.2f} ms   '
+                    f'min {min(samples) * 1000:7.2f} ms'
+                )
+
+            speedup = statistics.median(timings['in-process']) / statistics.median(timings['helper'])
+            self.stdout.write(self.style.SUCCESS(f'Median speedup through the helper: {speedup:.2f}x'))
+        finally:
+            helper.terminate()
+            helper.wait(timeout=5)
+            del ballast
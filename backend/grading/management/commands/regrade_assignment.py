@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions.models import Assignment
+from grading.batch_service import BatchGradingService
+
+
+class Command(BaseCommand):
+    help = 'Regrade the graded submissions of an assignment, rerunning only stages whose inputs changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_id', type=str, help='Assignment UUID')
+        parser.add_argument(
+            '--fresh', action='store_true',
+            help='Ask Claude for a new review of every submission (bypass stored reviews and the response cache)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            assignment = Assignment.objects.get(id=options['assignment_id'])
+        except (Assignment.DoesNotExist, ValueError):
+            raise CommandError(f'Assignment {options["assignment_id"]} not found')
+
+        summary = BatchGradingService().regrade_assignment(str(assignment.id), fresh=options['fresh'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Regraded {summary["regraded"]}/{summary["total"]} submissions of {assignment.name} '
+            f'({summary["failed"]} failed)'
+        ))
+        for stage, count in summary['stages_rerun'].items():
+            self.stdout.write(f'  {stage:<8} rerun for {count}')
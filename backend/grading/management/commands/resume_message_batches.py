@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from grading.models import BatchGradingJob
+from grading.batch_service import BatchGradingService
+
+
+class Command(BaseCommand):
+    help = 'Finish message_batches jobs interrupted by a restart, reading reviews back from their saved batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'batch_job_id', type=str, nargs='?',
+            help='Batch job UUID (default: every message_batches job still processing)'
+        )
+
+    def handle(self, *args, **options):
+        service = BatchGradingService()
+
+        if options['batch_job_id']:
+            try:
+                batch_jobs = [BatchGradingJob.objects.get(id=options['batch_job_id'])]
+            except (BatchGradingJob.DoesNotExist, ValueError):
+                raise CommandError(f'Batch job {options["batch_job_id"]} not found')
+        else:
+            batch_jobs = list(service.resumable_batch_jobs())
+            if not batch_jobs:
+                self.stdout.write('No interrupted message_batches jobs')
+                return
+
+        for batch_job in batch_jobs:
+            try:
+                service.resume_batch_job(str(batch_job.id))
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            batch_job.refresh_from_db()
+            self.stdout.write(self.style.SUCCESS(
+                f'Batch job {batch_job.id}: {batch_job.status}, '
+                f'{batch_job.successful_grades}/{batch_job.total_files} graded ({batch_job.failed_grades} failed)'
+            ))
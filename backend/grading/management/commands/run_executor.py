@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import signal
+import threading
+
+from grading.executor import ExecutorServer
+
+
+class Command(BaseCommand):
+    help = 'Run the local executor daemon that compiles and runs programs for grading workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket', type=str, default=settings.GRADING_SETTINGS.get('EXECUTOR_SOCKET', ''),
+            help='Unix socket path to listen on (defaults to EXECUTOR_SOCKET)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.GRADING_SETTINGS.get('EXECUTOR_WORKERS', 0),
+            help='Maximum concurrent compile/run jobs (0 = one per CPU core)'
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError('No socket path: pass --socket or set EXECUTOR_SOCKET')
+
+        server = ExecutorServer(str(socket_path), workers=options['workers'] or None)
+
+        # serve_forever() must be stopped from another thread
+        def shutdown(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'🛠️ Executor listening on {socket_path} with {server.workers} workers'
+        ))
+        try:
+            server.serve_forever()
+        finally:
+            stats = server.stats()
+            server.server_close()
+            self.stdout.write(f'Executor stopped: {stats["completed"]} jobs completed, {stats["failed"]} failed')
@@ -0,0 +1,163 @@
+"""
+Message Batches Backends
+Submit many grading reviews at once through the asynchronous Message Batches
+interface and collect the results when the batch has ended. Batched requests
+are billed at a discount and do not count against the per-minute rate limits,
+at the cost of latency (a batch may take up to 24 hours).
+
+AnthropicBatchBackend talks to the API; StubBatchBackend answers locally and
+stands in for the service in development and tests (LLM_BATCH_BACKEND=stub).
+"""
+import json
+import uuid
+import threading
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+from django.conf import settings
+import anthropic
+
+from .llm import get_llm_client
+
+# (custom_id, message or None, error description or None)
+BatchResult = Tuple[str, Optional[anthropic.types.Message], Optional[str]]
+
+
+class AnthropicBatchBackend:
+    """Message Batches on the Anthropic API"""
+
+    is_stub = False
+
+    def __init__(self, client: anthropic.Anthropic = None):
+        self._client = client
+
+    @property
+    def client(self) -> anthropic.Anthropic:
+        return self._client or get_llm_client()
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """Create a batch of {"custom_id", "params"} requests; returns the batch id"""
+        batch = self.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return {
+            "ended": batch.processing_status == "ended",
+            "processing_status": batch.processing_status,
+            "counts": batch.request_counts.model_dump(),
+        }
+
+    def cancel(self, batch_id: str) -> None:
+        """Ask the service to stop a batch; it ends once in-flight requests finish"""
+        self.client.messages.batches.cancel(batch_id)
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                yield entry.custom_id, result.message, None
+            elif result.type == "errored":
+                yield entry.custom_id, None, f"errored: {result.error.error.message}"
+            else:
+                yield entry.custom_id, None, result.type  # canceled or expired
+
+
+class StubBatchBackend:
+    """
+    In-process stand-in for the Message Batches service. Each request is answered by
+    responder(params) -> response text (an exception makes it an errored result);
+    a batch reports "ended" after polls_until_ended status checks. Its batches live in
+    memory only: after a restart an unknown batch id reads as ended with no results.
+    Stub answers are not reviews and must never be cached or kept as one.
+    """
+
+    is_stub = True
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], str] = None, polls_until_ended: int = 1):
+        self.responder = responder or default_stub_response
+        self.polls_until_ended = polls_until_ended
+        self._lock = threading.Lock()
+        self._batches = {}
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"msgbatch_stub_{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self._batches[batch_id] = {"requests": list(requests), "polls": 0}
+        return batch_id
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        with self._lock:
+            batch = self._batches.get(batch_id, {"requests": [], "polls": self.polls_until_ended})
+            batch["polls"] += 1
+            ended = batch["polls"] >= self.polls_until_ended or batch.get("canceled", False)
+            pending = 0 if ended else len(batch["requests"])
+        return {
+            "ended": ended,
+            "processing_status": "ended" if ended else "in_progress",
+            "counts": {"processing": pending, "succeeded": len(batch["requests"]) - pending},
+        }
+
+    def cancel(self, batch_id: str) -> None:
+        with self._lock:
+            if batch_id in self._batches:
+                self._batches[batch_id]["canceled"] = True
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        with self._lock:
+            batch = self._batches.pop(batch_id, {"requests": []})
+        for request in batch["requests"]:
+            if batch.get("canceled"):
+                yield request["custom_id"], None, "canceled"
+                continue
+            params = request["params"]
+            try:
+                text = self.responder(params)
+            except Exception as e:
+                yield request["custom_id"], None, f"errored: {str(e)}"
+                continue
+            yield request["custom_id"], anthropic.types.Message.model_validate({
+                "id": f"msg_stub_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": params["model"],
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {
+                    "input_tokens": len(json.dumps(params["messages"])) // 4,
+                    "output_tokens": len(text) // 4,
+                    "cache_creation_input_tokens": 0,
+                    "cache_read_input_tokens": 0,
+                },
+            }), None
+
+
+def default_stub_response(params: Dict[str, Any]) -> str:
+    """A neutral default-rubric grading, good enough to exercise the full pipeline"""
+    return json.dumps({
+        "total_score": 70,
+        "max_score": 100,
+        "percentage": 70.0,
+        "correctness": {"score": 28, "max_score": 40, "feedback": "Stub review: correctness not assessed."},
+        "code_style": {"score": 18, "max_score": 25, "feedback": "Stub review: style not assessed."},
+        "efficiency": {"score": 14, "max_score": 20, "feedback": "Stub review: efficiency not assessed."},
+        "documentation": {"score": 10, "max_score": 15, "feedback": "Stub review: documentation not assessed."},
+        "overall_feedback": "Graded by the local Message Batches stub.",
+        "suggestions": "None - stub review."
+    })
+
+
+_batch_backend = None
+_batch_backend_lock = threading.Lock()
+
+
+def get_batch_backend():
+    """Process-wide Message Batches backend selected by LLM_BATCH_BACKEND ('anthropic' or 'stub')"""
+    global _batch_backend
+
+    with _batch_backend_lock:
+        if _batch_backend is None:
+            if settings.GRADING_SETTINGS.get('LLM_BATCH_BACKEND', 'anthropic') == 'stub':
+                _batch_backend = StubBatchBackend()
+            else:
+                _batch_backend = AnthropicBatchBackend()
+        return _batch_backend
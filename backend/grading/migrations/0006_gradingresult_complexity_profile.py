@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0005_batchgradingjob_assignment_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gradingresult",
+            name="complexity_profile",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
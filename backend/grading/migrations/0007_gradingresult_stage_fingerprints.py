@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0006_gradingresult_complexity_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gradingresult",
+            name="stage_fingerprints",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
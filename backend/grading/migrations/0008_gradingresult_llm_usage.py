@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0007_gradingresult_stage_fingerprints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gradingresult",
+            name="llm_usage",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
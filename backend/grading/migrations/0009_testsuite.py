@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:25
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0008_gradingresult_llm_usage"),
+        ("submissions", "0007_assignment_input_generators"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TestSuite",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("test_cases", models.JSONField(default=list)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("generated", "Generated by AI"),
+                            ("fallback", "Built-in fallback"),
+                            ("edited", "Edited by instructor"),
+                        ],
+                        default="generated",
+                        max_length=20,
+                    ),
+                ),
+                ("reference_version", models.CharField(blank=True, max_length=64)),
+                ("generated_by", models.CharField(blank=True, max_length=50)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "assignment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="test_suite",
+                        to="submissions.assignment",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0009_testsuite"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchgradingjob",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("sync", "One request per submission"),
+                    ("message_batches", "Message Batches"),
+                ],
+                default="sync",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="batchgradingjob",
+            name="llm_batch_ids",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0010_batchgradingjob_mode"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="batchgradingjob",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("sync", "One request per submission"),
+                    ("message_batches", "Message Batches"),
+                    ("async", "Concurrent reviews"),
+                ],
+                default="sync",
+                max_length=20,
+            ),
+        ),
+    ]
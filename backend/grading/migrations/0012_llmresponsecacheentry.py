@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grading", "0011_alter_batchgradingjob_mode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMResponseCacheEntry",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("response", models.JSONField()),
+                ("hits", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -40,8 +40,11 @@ class GradingResult(models.Model):
     # Tool analysis results (JSON fields to store tool outputs)
     compilation_result = models.JSONField(null=True, blank=True)  # Compilation results
     test_results = models.JSONField(null=True, blank=True)       # Test execution results
+    complexity_profile = models.JSONField(null=True, blank=True) # Measured time/memory growth vs reference
     style_analysis = models.JSONField(null=True, blank=True)     # Style analysis results
     custom_rubric = models.JSONField(null=True, blank=True)      # Custom rubric extracted from reference code
+    stage_fingerprints = models.JSONField(null=True, blank=True) # Input hash of each stage, for partial regrades
+    llm_usage = models.JSONField(null=True, blank=True)          # Token counts of the grading call, incl. prompt cache reads/writes
     
     def __str__(self):
         return f"Grade for {self.submission.student_name} - {self.submission.assignment.name}"
@@ -57,10 +60,18 @@ class BatchGradingJob(models.Model):
         ('failed', 'Failed'),
     ]
     
+    MODE_CHOICES = [
+        ('sync', 'One request per submission'),
+        ('message_batches', 'Message Batches'),
+        ('async', 'Concurrent reviews'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     assignment = models.ForeignKey('submissions.Assignment', on_delete=models.CASCADE)
     assignment_name = models.CharField(max_length=255, blank=True)  # Cache assignment name for easier queries
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default='sync')  # How the Claude reviews are sent
+    llm_batch_ids = models.JSONField(null=True, blank=True)  # Message Batches ids (message_batches mode)
     
     # Progress tracking
     total_files = models.IntegerField(default=0)
@@ -109,4 +120,38 @@ class BatchGradingJob(models.Model):
         self.save()
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+
+class TestSuite(models.Model):
+    """Test cases of one assignment, generated once from its reference solution and editable by instructors"""
+    SOURCE_CHOICES = [
+        ('generated', 'Generated by AI'),
+        ('fallback', 'Built-in fallback'),
+        ('edited', 'Edited by instructor'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    assignment = models.OneToOneField('submissions.Assignment', on_delete=models.CASCADE, related_name='test_suite')
+    test_cases = models.JSONField(default=list)  # [{"name", "input", "description"}, ...]
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='generated')
+    reference_version = models.CharField(max_length=64, blank=True) # Reference artifact hash (or source sha256) the cases came from
+    generated_by = models.CharField(max_length=50, blank=True)      # Model that generated the cases
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Test suite for {self.assignment.name} ({len(self.test_cases)} cases, {self.source})"
+
+
+class LLMResponseCacheEntry(models.Model):
+    """A stored Claude response for the database backend of the LLM response cache (grading/response_cache.py)"""
+    key = models.CharField(max_length=64, primary_key=True)  # Hash of model, max_tokens and prompt
+    model = models.CharField(max_length=100)
+    response = models.JSONField()                            # Message as returned by the API
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.model} response {self.key[:12]} ({self.hits} hits)"
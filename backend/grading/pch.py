@@ -0,0 +1,152 @@
+"""
+Precompiled Headers
+Keeps precompiled bundles of the standard headers CS1 submissions use, so
+g++ does not re-parse <iostream> and friends for every 50-line program.
+A bundle holds exactly the headers one submission includes, so force-including
+it never makes a name visible that the student's own includes would not
+"""
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional
+from django.conf import settings
+
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+PRELUDE_LINE_PATTERN = re.compile(r'^\s*(#\s*include\b.*|//.*)?$')
+
+
+def pch_headers(code: str, allowed: List[str]) -> Optional[tuple]:
+    """
+    The standard headers a precompiled bundle for this code must hold, or None
+
+    None when the code has quoted includes, includes a header outside allowed,
+    or puts anything but includes and line comments before its last include
+    (a macro or declaration there could see, or change, the headers differently
+    than -include does).
+    """
+    includes = INCLUDE_PATTERN.findall(code)
+    if not includes or any(delimiter == '"' for delimiter, _ in includes):
+        return None
+
+    headers = tuple(sorted({header.strip() for _, header in includes}))
+    if not set(headers) <= set(allowed):
+        return None
+
+    last_include = list(INCLUDE_PATTERN.finditer(code))[-1]
+    if not all(PRELUDE_LINE_PATTERN.match(line) for line in code[:last_include.start()].splitlines()):
+        return None
+    return headers
+
+
+class PrecompiledHeaderBundle:
+    """A precompiled header for one compiler, compiler version, flag set and include set"""
+
+    HEADER_NAME = "grading_pch.h"
+
+    def __init__(self, root: str, headers: List[str], compiler: str, compiler_version: str, flags: List[str]):
+        self.headers = list(headers)
+        self.compiler = compiler
+        self.flags = list(flags)
+        self._lock = threading.Lock()
+        self._ready = None  # None until the first build attempt
+
+        digest = hashlib.sha256()
+        for part in (compiler, compiler_version, "\0".join(flags), "\0".join(self.headers)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        self.directory = os.path.join(str(root), digest.hexdigest())
+        self.header_path = os.path.join(self.directory, self.HEADER_NAME)
+
+    def build(self) -> bool:
+        """Build the .gch once; returns whether the bundle can be used"""
+        with self._lock:
+            if self._ready is not None:
+                return self._ready
+
+            if os.path.exists(self.header_path + ".gch"):
+                self._ready = True
+                return True
+
+            print(f"   🧱 Precompiling headers: {', '.join(self.headers)}")
+            parent = os.path.dirname(self.directory)
+            os.makedirs(parent, exist_ok=True)
+            staging_dir = tempfile.mkdtemp(prefix='.staging_', dir=parent)
+            try:
+                with open(os.path.join(staging_dir, self.HEADER_NAME), 'w', encoding='utf-8') as f:
+                    f.writelines(f"#include <{header}>\n" for header in self.headers)
+
+                result = subprocess.run(
+                    [self.compiler] + self.flags + ['-x', 'c++-header', self.HEADER_NAME, '-o', self.HEADER_NAME + '.gch'],
+                    capture_output=True,
+                    text=True,
+                    timeout=120,
+                    cwd=staging_dir
+                )
+                if result.returncode != 0:
+                    print(f"   ⚠️ Precompiled header build failed, using normal builds: {result.stderr[:200]}")
+                    self._ready = False
+                    return False
+
+                try:
+                    os.rename(staging_dir, self.directory)
+                except OSError:
+                    # Another worker published the same bundle first
+                    pass
+                self._ready = os.path.exists(self.header_path + ".gch")
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"   ⚠️ Precompiled header build failed, using normal builds: {str(e)}")
+                self._ready = False
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+            return self._ready
+
+    def compile_args(self) -> List[str]:
+        """Extra compiler arguments that pull in the precompiled bundle"""
+        return ['-include', self.header_path]
+
+
+_bundles: Dict[tuple, PrecompiledHeaderBundle] = {}
+_bundles_lock = threading.Lock()
+
+
+def get_pch_bundle(compiler: str, compiler_version: str, flags: List[str], code: str = None,
+                   headers: List[str] = None) -> Optional[PrecompiledHeaderBundle]:
+    """
+    Process-wide bundle for a compiler, flag set and include set, or None when PCH is disabled
+
+    With code, the bundle holds exactly that code's standard includes (None when pch_headers
+    rules the code out); with headers, that include set (for warm-up; None unless every
+    header is in PCH_HEADERS); with neither, every header in PCH_HEADERS.
+    """
+    grading_settings = settings.GRADING_SETTINGS
+    if not grading_settings.get('PCH_ENABLED', True):
+        return None
+
+    allowed = [header.strip() for header in grading_settings['PCH_HEADERS'] if header.strip()]
+    if code is not None:
+        headers = pch_headers(code, allowed)
+    elif headers is not None:
+        headers = tuple(sorted({header.strip() for header in headers if header.strip()}))
+        if not set(headers) <= set(allowed):
+            return None
+    else:
+        headers = tuple(sorted(set(allowed)))
+    if not headers:
+        return None
+
+    key = (compiler, compiler_version, tuple(flags), headers)
+    with _bundles_lock:
+        if key not in _bundles:
+            _bundles[key] = PrecompiledHeaderBundle(
+                root=grading_settings['PCH_DIR'],
+                headers=list(headers),
+                compiler=compiler,
+                compiler_version=compiler_version,
+                flags=flags
+            )
+        return _bundles[key]
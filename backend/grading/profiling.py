@@ -0,0 +1,363 @@
+"""
+Complexity Profiling
+Runs the student and reference programs on a series of generated inputs of
+growing size, measures CPU time and memory at each size and fits the growth
+order, so efficiency grading rests on measurements instead of a guess.
+
+Input generators are declared per assignment (Assignment.input_generators) as a
+list of JSON specs, for example:
+
+    [{"name": "numbers", "kind": "integers", "terminator": -999,
+      "sizes": [1000, 2000, 4000, 8000, 16000, 32000]}]
+
+Kinds:
+    number    the input is the size itself ("n")
+    integers  n random integers (options: min, max, count_prefix, terminator)
+    words     n random lowercase words, one per line (options: count_prefix)
+Every kind also accepts prefix/suffix text and a seed.
+"""
+import json
+import math
+import random
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional
+
+from .executor import EXECUTOR_ERRORS
+
+GENERATOR_KINDS = ['number', 'integers', 'words']
+
+DEFAULT_SIZES = [1000, 2000, 4000, 8000, 16000, 32000]
+MAX_SIZES = 12
+MAX_SIZE = 10 ** 7
+
+# Candidate growth orders, simplest first
+GROWTH_MODELS = [
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log2(n)),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n^2)', lambda n: float(n) ** 2),
+    ('O(n^3)', lambda n: float(n) ** 3),
+]
+
+# A simpler model wins unless a more complex one fits clearly better
+SIMPLER_MODEL_TOLERANCE = 1.15
+
+# CPU times below this are dominated by process start-up and say nothing about growth
+MIN_MEASURABLE_SECONDS = 0.005
+
+# Growth orders only count as different when the measured cost differs by this factor too
+SIGNIFICANT_CPU_RATIO = 2.0
+
+
+def validate_generators(generators: Any) -> List[Dict[str, Any]]:
+    """Check a list of generator specs; raises ValueError describing the first problem"""
+    if not isinstance(generators, list):
+        raise ValueError("Input generators must be a list of generator specs")
+
+    names = set()
+    for index, spec in enumerate(generators):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Generator {index + 1} must be an object")
+        kind = spec.get('kind')
+        if kind not in GENERATOR_KINDS:
+            raise ValueError(f"Generator {index + 1}: kind must be one of {', '.join(GENERATOR_KINDS)}")
+        name = spec.get('name', kind)
+        if name in names:
+            raise ValueError(f"Generator {index + 1}: duplicate name '{name}'")
+        names.add(name)
+
+        sizes = spec.get('sizes', DEFAULT_SIZES)
+        if (not isinstance(sizes, list) or not 3 <= len(sizes) <= MAX_SIZES
+                or not all(isinstance(n, int) and 1 <= n <= MAX_SIZE for n in sizes)):
+            raise ValueError(
+                f"Generator {index + 1}: sizes must be 3 to {MAX_SIZES} integers between 1 and {MAX_SIZE}"
+            )
+        for option in ('min', 'max', 'terminator', 'seed'):
+            if option in spec and spec[option] is not None and not isinstance(spec[option], int):
+                raise ValueError(f"Generator {index + 1}: {option} must be an integer")
+        if spec.get('min', 0) > spec.get('max', 1000):
+            raise ValueError(f"Generator {index + 1}: min must not exceed max")
+    return generators
+
+
+def generate_input(spec: Dict[str, Any], n: int) -> str:
+    """Deterministic program input of size n for a generator spec"""
+    rng = random.Random(f"{spec.get('seed', 0)}:{n}")
+    kind = spec['kind']
+
+    if kind == 'number':
+        body = str(n)
+    elif kind == 'integers':
+        low, high = spec.get('min', 0), spec.get('max', 1000)
+        terminator = spec.get('terminator')
+        values = []
+        while len(values) < n:
+            value = rng.randint(low, high)
+            if value != terminator:
+                values.append(value)
+        parts = [str(n)] if spec.get('count_prefix') else []
+        parts.append(' '.join(map(str, values)))
+        if terminator is not None:
+            parts.append(str(terminator))
+        body = '\n'.join(parts)
+    elif kind == 'words':
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(n)]
+        body = '\n'.join(([str(n)] if spec.get('count_prefix') else []) + words)
+    else:
+        raise ValueError(f"Unknown generator kind: {kind}")
+
+    return f"{spec.get('prefix', '')}{body}{spec.get('suffix', '')}\n"
+
+
+def fit_growth_order(sizes: List[int], values: List[float]) -> Optional[Dict[str, Any]]:
+    """
+    Least-squares fit of values = a * f(n) + b for each candidate growth order.
+    Returns the best order (preferring simpler ones on near ties) and the fit residuals,
+    or None when there are too few points to tell.
+    """
+    points = [(n, v) for n, v in zip(sizes, values) if v is not None]
+    if len(points) < 3:
+        return None
+
+    ys = [v for _, v in points]
+    mean_y = sum(ys) / len(ys)
+    scale = mean_y or 1.0
+
+    fits = []
+    for order, model in GROWTH_MODELS:
+        xs = [model(n) for n, _ in points]
+        mean_x = sum(xs) / len(xs)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x == 0:
+            slope, intercept = 0.0, mean_y
+        else:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+            intercept = mean_y - slope * mean_x
+        if slope < 0:
+            # Shrinking cost is noise around a constant
+            slope, intercept = 0.0, mean_y
+        residual = math.sqrt(sum((slope * x + intercept - y) ** 2 for x, y in zip(xs, ys)) / len(xs)) / scale
+        fits.append({"order": order, "relative_error": round(residual, 4)})
+
+    best_error = min(fit["relative_error"] for fit in fits)
+    best = next(fit for fit in fits if fit["relative_error"] <= best_error * SIMPLER_MODEL_TOLERANCE + 1e-9)
+
+    # log-log slope between the smallest and largest measured size, for a model-free view
+    (n0, y0), (n1, y1) = points[0], points[-1]
+    exponent = math.log(y1 / y0) / math.log(n1 / n0) if y0 > 0 and y1 > 0 and n1 > n0 else None
+
+    return {
+        "order": best["order"],
+        "empirical_exponent": round(exponent, 2) if exponent is not None else None,
+        "fits": fits,
+    }
+
+
+class ComplexityProfiler:
+    """Profiles one student build against the reference build over an assignment's generators"""
+
+    REFERENCE_CACHE_ENTRIES = 256
+    _reference_cache = OrderedDict()
+    _reference_cache_lock = threading.Lock()
+
+    def __init__(self, run: Callable[[str, str, int], Dict[str, Any]], executor, timeout: int = 5):
+        """
+        run(executable_path, input, timeout) runs one program and returns a run_with_input
+        result; executor is the pool the runs are submitted to
+        """
+        self.run = run
+        self.executor = executor
+        self.timeout = timeout
+
+    def profile(self, student_executable: str, reference_executable: str, reference_hash: str,
+                generators: List[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+
+        # Submit every size of every generator for both programs at once
+        pending = []
+        for spec in generators:
+            sizes = sorted(spec.get('sizes', DEFAULT_SIZES))
+            reference_key = (reference_hash, json.dumps(spec, sort_keys=True))
+            reference_series = self._cached_reference(reference_key)
+            student_runs = self._submit_series(student_executable, spec, sizes)
+            reference_runs = None if reference_series else self._submit_series(reference_executable, spec, sizes)
+            pending.append((spec, sizes, reference_key, student_runs, reference_runs, reference_series))
+
+        profiles = []
+        for spec, sizes, reference_key, student_runs, reference_runs, reference_series in pending:
+            student_series = self._series(sizes, [self._result(future) for future in student_runs])
+            if reference_series is None:
+                reference_series = self._series(sizes, [self._result(future) for future in reference_runs])
+                if all(point["success"] for point in reference_series["points"]):
+                    self._remember_reference(reference_key, reference_series)
+
+            profiles.append({
+                "generator": spec.get('name', spec['kind']),
+                "sizes": sizes,
+                "student": student_series,
+                "reference": reference_series,
+                "comparison": self._compare(student_series, reference_series),
+            })
+
+        return {
+            "profiles": profiles,
+            "profiling_time": round(time.perf_counter() - started, 3),
+        }
+
+    def _submit_series(self, executable: str, spec: Dict[str, Any], sizes: List[int]) -> list:
+        """Submit one run per size; once a size times out, larger sizes that have not started are cancelled"""
+        futures = [self.executor.submit(self.run, executable, generate_input(spec, n), self.timeout) for n in sizes]
+
+        def cancel_larger(index):
+            def on_done(future):
+                if future.cancelled() or future.exception() is not None:
+                    return
+                if (future.result().get("metrics") or {}).get("timed_out"):
+                    for larger in futures[index + 1:]:
+                        larger.cancel()
+            return on_done
+
+        for index, future in enumerate(futures):
+            future.add_done_callback(cancel_larger(index))
+        return futures
+
+    def _result(self, future) -> Dict[str, Any]:
+        if future.cancelled():
+            return {"success": False, "skipped": True}
+        try:
+            return future.result()
+        except EXECUTOR_ERRORS:
+            raise
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _series(self, sizes: List[int], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        points = []
+        for n, result in zip(sizes, results):
+            metrics = result.get("metrics") or {}
+            points.append({
+                "n": n,
+                "success": bool(result.get("success")),
+                "timed_out": bool(metrics.get("timed_out")),
+                "skipped": bool(result.get("skipped")),
+                "cpu_time": metrics.get("cpu_time"),
+                "wall_time": metrics.get("wall_time"),
+                "peak_rss_kb": metrics.get("peak_rss_kb"),
+            })
+
+        # Only completed runs with measurable cost enter the fits
+        completed = [p for p in points if p["success"]]
+        timed = [p for p in completed if (p["cpu_time"] or 0) >= MIN_MEASURABLE_SECONDS]
+        return {
+            "points": points,
+            "time": fit_growth_order([p["n"] for p in timed], [p["cpu_time"] for p in timed]),
+            "memory": fit_growth_order([p["n"] for p in completed], [p["peak_rss_kb"] for p in completed]),
+        }
+
+    def _compare(self, student: Dict[str, Any], reference: Dict[str, Any]) -> Dict[str, Any]:
+        comparison = {"student_failed_sizes": [p["n"] for p in student["points"] if not p["success"]]}
+
+        # CPU-time ratio at the largest size both programs completed
+        reference_points = {p["n"]: p for p in reference["points"] if p["success"]}
+        for point in reversed(student["points"]):
+            reference_point = reference_points.get(point["n"])
+            if point["success"] and reference_point and reference_point["cpu_time"]:
+                comparison["largest_common_size"] = point["n"]
+                comparison["cpu_time_ratio"] = round(point["cpu_time"] / reference_point["cpu_time"], 2)
+                break
+
+        # Fitted orders of near-identical curves can differ by noise (O(n) vs O(n log n));
+        # only call growth worse or better when the measured cost agrees
+        ratio = comparison.get("cpu_time_ratio")
+        reference_completed = set(reference_points)
+        student_gave_up = any(n in reference_completed for n in comparison["student_failed_sizes"])
+        orders = [order for order, _ in GROWTH_MODELS]
+        if student["time"] and reference["time"]:
+            difference = orders.index(student["time"]["order"]) - orders.index(reference["time"]["order"])
+            if difference > 0 and (student_gave_up or (ratio or 0) >= SIGNIFICANT_CPU_RATIO):
+                comparison["time_growth"] = "worse"
+            elif difference < 0 and ratio is not None and ratio <= 1 / SIGNIFICANT_CPU_RATIO:
+                comparison["time_growth"] = "better"
+            else:
+                comparison["time_growth"] = "same"
+        elif student_gave_up:
+            comparison["time_growth"] = "worse"
+        return comparison
+
+    @classmethod
+    def _cached_reference(cls, key):
+        with cls._reference_cache_lock:
+            if key in cls._reference_cache:
+                cls._reference_cache.move_to_end(key)
+                return cls._reference_cache[key]
+        return None
+
+    @classmethod
+    def _remember_reference(cls, key, series: Dict[str, Any]) -> None:
+        with cls._reference_cache_lock:
+            cls._reference_cache[key] = series
+            while len(cls._reference_cache) > cls.REFERENCE_CACHE_ENTRIES:
+                cls._reference_cache.popitem(last=False)
+
+
+def relative_to_reference(student: float, reference: float) -> str:
+    """A student measurement as a power-of-two multiple of the reference's (rounded towards 1x)"""
+    if reference <= 0 or student <= 0:
+        return "not comparable to the reference"
+    exponent = int(math.log2(student / reference))
+    if exponent == 0:
+        return "about the same as the reference"
+    if exponent > 0:
+        return f"about {2 ** exponent}x the reference"
+    return f"about 1/{2 ** -exponent} of the reference"
+
+
+def magnitude(value: float, unit: str) -> str:
+    """A measurement as the power-of-two range it falls in ("8-16 ms"), stable under run-to-run noise"""
+    if value < 1:
+        return f"under 1 {unit}"
+    low = 2 ** int(math.log2(value))
+    return f"{low}-{low * 2} {unit}"
+
+
+def format_profile(profile: Optional[Dict[str, Any]]) -> str:
+    """
+    Human readable summary of a complexity profile for the grading prompt. Only fitted
+    growth classes and power-of-two buckets go in, never raw timings, so run-to-run noise
+    does not change the prompt and identical submissions hit the LLM response cache.
+    """
+    if not profile or not profile.get("profiles"):
+        return (profile or {}).get("skipped", "No complexity profile available.")
+
+    lines = []
+    for entry in profile["profiles"]:
+        student, reference, comparison = entry["student"], entry["reference"], entry["comparison"]
+        lines.append(f"Input series '{entry['generator']}' (sizes {', '.join(map(str, entry['sizes']))}):")
+        for label, series in (("Student", student), ("Reference", reference)):
+            time_fit = series["time"]
+            memory_fit = series["memory"]
+            time_order = time_fit["order"] if time_fit else "too fast to measure"
+            memory_order = memory_fit["order"] if memory_fit else "unknown"
+            lines.append(f"- {label}: time {time_order}; memory {memory_order}")
+
+        reference_points = {p["n"]: p for p in reference["points"] if p["success"]}
+        curve = []
+        for point in student["points"]:
+            reference_point = reference_points.get(point["n"])
+            if not point["success"]:
+                curve.append(f"n={point['n']}: {'timeout' if point['timed_out'] else 'skipped' if point['skipped'] else 'failed'}")
+            elif reference_point and (point["cpu_time"] or 0) >= MIN_MEASURABLE_SECONDS \
+                    and (reference_point["cpu_time"] or 0) >= MIN_MEASURABLE_SECONDS:
+                curve.append(f"n={point['n']}: {relative_to_reference(point['cpu_time'], reference_point['cpu_time'])}")
+            else:
+                curve.append(f"n={point['n']}: too fast to compare")
+        lines.append(f"- Student CPU time per size: {'; '.join(curve)}")
+        if comparison.get("time_growth"):
+            lines.append(f"- Student time growth vs reference: {comparison['time_growth']}")
+        if comparison["student_failed_sizes"]:
+            lines.append(f"- Student failed, timed out or was skipped at n = {', '.join(map(str, comparison['student_failed_sizes']))}")
+    return "\n".join(lines)
@@ -0,0 +1,256 @@
+"""
+Prompt Budget
+Keeps the grading prompt within PROMPT_TOKEN_BUDGET estimated input tokens, so
+the latency and cost of a review stay predictable however large a submission
+or its compiler output is.
+
+Each section is compacted, losing as little as possible:
+  - compiler diagnostics: notes, "required from" context and source excerpts
+    are dropped, repeated messages merged and the first PROMPT_MAX_DIAGNOSTICS
+    unique errors (then warnings) kept
+  - reference solution: comments and blank-line runs stripped (the rubric has
+    been extracted from it already), then cut to its share of the budget
+  - student code: trailing whitespace and blank-line runs removed; only when
+    it does not fit are its comments stripped, then its middle cut
+Tokens are estimated from the text length, so building a prompt needs no API call.
+"""
+import os
+import re
+import math
+from typing import Dict, List, Tuple
+
+CHARS_PER_TOKEN = 3.5  # C++ and compiler output run a little denser than English prose
+
+REFERENCE_SHARE = 0.35      # Most of the budget the reference solution may use
+STUDENT_MIN_SHARE = 0.25    # Least the student's code gets, however long the tool results are
+MAX_DIAGNOSTIC_CHARS = 300  # Template instantiations make single messages kilobytes long
+
+# "file:line[:column]: " before a diagnostic, and the diagnostic itself
+DIAGNOSTIC_LOCATION = re.compile(r'^(?P<file>[^\s:][^:]*):(?P<line>\d+)(?::(?P<column>\d+))?:\s')
+DIAGNOSTIC = re.compile(r'(?:^|:\s)(?P<severity>fatal error|error|warning):\s*(?P<message>.*)$')
+LINKER_ERROR = re.compile(r'(?P<message>undefined reference to .*|multiple definition of .*)$')
+WARNING_FLAG = re.compile(r'\s*\[-W[\w=+-]+\]$')
+RAW_STRING = re.compile(r'(?<!\w)(?:u8|[uUL])?R"(?P<delimiter>[^\s()\\]{0,16})\(')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated token count of a text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def collapse_blank_lines(code: str) -> str:
+    """Trailing whitespace removed and runs of blank lines reduced to one"""
+    lines = []
+    for line in code.split('\n'):
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip('\n')
+
+
+def strip_comments(code: str) -> Tuple[str, int]:
+    """
+    C++ source without its // and /* */ comments (string, character and raw
+    string literals are left alone). Returns (code, number of comments removed).
+    """
+    out = []
+    removed = 0
+    i, length = 0, len(code)
+    while i < length:
+        char = code[i]
+        pair = code[i:i + 2]
+        if pair == '//':
+            end = code.find('\n', i)
+            i = length if end < 0 else end
+            removed += 1
+        elif pair == '/*':
+            end = code.find('*/', i + 2)
+            end = length if end < 0 else end + 2
+            # Keep the line breaks so the code on either side stays on its own lines
+            out.append('\n' * code.count('\n', i, end) or ' ')
+            i = end
+            removed += 1
+        elif char in 'uULR' and RAW_STRING.match(code, i):
+            raw = RAW_STRING.match(code, i)
+            close = code.find(')' + raw.group("delimiter") + '"', raw.end())
+            end = length if close < 0 else close + len(raw.group("delimiter")) + 2
+            out.append(code[i:end])
+            i = end
+        elif char in '"\'':
+            end = i + 1
+            while end < length and code[end] != char and code[end] != '\n':
+                end += 2 if code[end] == '\\' else 1
+            end = min(length, end + 1)
+            out.append(code[i:end])
+            i = end
+        else:
+            out.append(char)
+            i += 1
+    return ''.join(out), removed
+
+
+def truncate_middle(text: str, max_tokens: int, marker: str = "// ... {lines} lines omitted to fit the prompt budget ...") -> Tuple[str, int]:
+    """
+    The text cut to about max_tokens by dropping whole lines from its middle
+    (the head keeps twice as much as the tail). Returns (text, lines omitted).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, 0
+
+    lines = text.split('\n')
+    available = max(0, int(max_tokens * CHARS_PER_TOKEN) - len(marker) - 8)
+    head, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > available * 2 // 3:
+            break
+        head.append(line)
+        used += len(line) + 1
+    tail = []
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > available:
+            break
+        tail.append(line)
+        used += len(line) + 1
+    tail.reverse()
+
+    omitted = len(lines) - len(head) - len(tail)
+    return '\n'.join(head + [marker.format(lines=omitted)] + tail), omitted
+
+
+def compact_diagnostics(output: str, max_diagnostics: int) -> str:
+    """
+    Compiler output reduced to its first max_diagnostics unique errors, then
+    warnings, one line each, with a count of what was left out. Output that
+    holds no recognizable diagnostic (a timeout message, say) is cut to length.
+    """
+    if not output or not output.strip():
+        return ""
+
+    unique: Dict[Tuple[str, str], dict] = {}
+    context_lines = 0
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        match = DIAGNOSTIC.search(line)
+        linker = None if match else LINKER_ERROR.search(line)
+        if not match and not linker:
+            context_lines += 1  # Notes, "In instantiation of", source excerpts and carets
+            continue
+
+        severity = "error" if linker else match.group("severity").replace("fatal ", "")
+        message = (linker or match).group("message").strip()
+        if severity == "warning":
+            message = WARNING_FLAG.sub('', message)
+        key = (severity, ' '.join(message.split()))
+        if key in unique:
+            unique[key]["count"] += 1
+            continue
+
+        location = DIAGNOSTIC_LOCATION.match(line)
+        unique[key] = {
+            "severity": severity,
+            "message": message,
+            "location": (
+                f"{os.path.basename(location.group('file'))}:{location.group('line')}"
+                f"{':' + location.group('column') if location.group('column') else ''}"
+            ) if location else "",
+            "count": 1,
+        }
+
+    if not unique:
+        text, _ = truncate_middle(output.strip(), int(max_diagnostics * MAX_DIAGNOSTIC_CHARS / CHARS_PER_TOKEN),
+                                  marker="... {lines} lines omitted ...")
+        return text
+
+    ordered = [d for d in unique.values() if d["severity"] == "error"] + [d for d in unique.values() if d["severity"] == "warning"]
+    lines = []
+    for diagnostic in ordered[:max_diagnostics]:
+        message = diagnostic["message"]
+        if len(message) > MAX_DIAGNOSTIC_CHARS:
+            message = message[:MAX_DIAGNOSTIC_CHARS] + " ..."
+        location = f"{diagnostic['location']}: " if diagnostic["location"] else ""
+        repeated = f" (x{diagnostic['count']})" if diagnostic["count"] > 1 else ""
+        lines.append(f"{location}{diagnostic['severity']}: {message}{repeated}")
+
+    left_out = []
+    if len(ordered) > max_diagnostics:
+        left_out.append(f"{len(ordered) - max_diagnostics} more unique diagnostics")
+    repeats = sum(d["count"] - 1 for d in ordered)
+    if repeats:
+        left_out.append(f"{repeats} repeats merged")
+    if context_lines:
+        left_out.append(f"{context_lines} note/context lines")
+    if left_out:
+        lines.append(f"[omitted: {', '.join(left_out)}]")
+    return '\n'.join(lines)
+
+
+def excerpt(text: str, max_chars: int) -> str:
+    """A program input or output on one line, cut to max_chars"""
+    flat = ' / '.join(line.strip() for line in text.strip().splitlines() if line.strip())
+    if len(flat) > max_chars:
+        flat = flat[:max_chars] + " ..."
+    return repr(flat)
+
+
+def first_difference(expected: str, actual: str) -> str:
+    """Where an actual program output first departs from the expected one"""
+    expected_lines = expected.strip().splitlines()
+    actual_lines = actual.strip().splitlines()
+    for number, (want, got) in enumerate(zip(expected_lines, actual_lines), 1):
+        if want.strip() != got.strip():
+            return f"line {number}: expected {excerpt(want, 80)}, got {excerpt(got, 80)}"
+    if len(actual_lines) < len(expected_lines):
+        return f"stops after {len(actual_lines)} of {len(expected_lines)} lines"
+    if len(actual_lines) > len(expected_lines):
+        return f"{len(actual_lines) - len(expected_lines)} lines more than the expected {len(expected_lines)}"
+    return "whitespace differs"
+
+
+class PromptBudget:
+    """Estimated tokens of each section of one prompt, against the total budget"""
+
+    def __init__(self, budget_tokens: int):
+        self.budget_tokens = budget_tokens
+        self.sections: Dict[str, int] = {}
+
+    @property
+    def used(self) -> int:
+        return sum(self.sections.values())
+
+    def available(self, minimum: int = 0) -> int:
+        """Tokens left in the budget (at least minimum)"""
+        return max(self.budget_tokens - self.used, minimum)
+
+    def count(self, section: str, text: str, excluding: List[str] = ()) -> str:
+        """
+        Add text's tokens to a section and return the text; the tokens of the
+        excluding sections, already counted and contained in text, are not counted again
+        """
+        tokens = estimate_tokens(text) - sum(self.sections.get(name, 0) for name in excluding)
+        self.sections[section] = self.sections.get(section, 0) + max(tokens, 0)
+        return text
+
+    def compact_code(self, section: str, code: str, max_tokens: int, strip: bool) -> Tuple[str, List[str]]:
+        """
+        Source code for the prompt within max_tokens: blank-line noise removed,
+        comments stripped (when strip is set, or to make it fit) and finally its middle cut.
+        Returns (code, notes on what was removed).
+        """
+        notes = []
+        code = collapse_blank_lines(code)
+        if strip or estimate_tokens(code) > max_tokens:
+            stripped, comments = strip_comments(code)
+            if comments:
+                code = collapse_blank_lines(stripped)
+                notes.append(f"{comments} comments removed")
+        code, omitted = truncate_middle(code, max_tokens)
+        if omitted:
+            notes.append(f"{omitted} lines omitted from the middle")
+        self.count(section, code)
+        return code, notes
+
+    def summary(self) -> str:
+        """One line for the logs: total against the budget and the largest sections"""
+        parts = ', '.join(f"{name} {tokens}" for name, tokens in sorted(self.sections.items(), key=lambda item: -item[1]))
+        return f"~{self.used}/{self.budget_tokens} tokens ({parts})"
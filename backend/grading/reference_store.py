@@ -0,0 +1,185 @@
+"""
+Reference Artifact Store
+Builds each assignment's reference solution once per reference version and
+shares the resulting executable with every grading worker
+"""
+import os
+import json
+import fcntl
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any
+from django.conf import settings
+
+from .expected_outputs import hash_file
+from .ingest import as_source
+
+
+class ReferenceArtifactStore:
+    """On-disk store of reference executables, keyed by assignment and reference version"""
+
+    EXECUTABLE_NAME = "reference"
+    META_NAME = "meta.json"
+    SUPERSEDED_NAME = ".superseded"  # Marks a version a newer build replaced; its mtime says when
+
+    def __init__(self, root: str, prune_grace_seconds: float = 24 * 3600):
+        self.root = str(root)
+        self.prune_grace_seconds = prune_grace_seconds
+        self._lock = threading.Lock()
+        self._assignment_locks = {}
+        self._builds = {}  # assignment id -> (fingerprint, compile result)
+
+    def fingerprint(self, assignment, reference_code: str) -> str:
+        """Version of the reference solution: changes whenever the reference file changes"""
+        digest = hashlib.sha256()
+        for part in (
+            str(assignment.id),
+            assignment.toolchain,
+            assignment.compile_profile,
+            assignment.reference_file.name or "",
+            assignment.updated_at.isoformat() if assignment.updated_at else "",
+            as_source(reference_code).sha256,
+        ):
+            digest.update(part.encode('utf-8', errors='replace'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_build(self, assignment, reference_code: str, tools) -> Dict[str, Any]:
+        """
+        Return the compile result for the assignment's current reference solution,
+        building it with tools only if no worker has built this version yet
+        """
+        fingerprint = self.fingerprint(assignment, reference_code)
+        assignment_id = str(assignment.id)
+
+        with self._assignment_lock(assignment_id):
+            cached = self._builds.get(assignment_id)
+            if cached and cached[0] == fingerprint and self._is_usable(cached[1]):
+                return cached[1]
+
+            assignment_dir = os.path.join(self.root, assignment_id)
+            os.makedirs(assignment_dir, exist_ok=True)
+
+            # Serialise builds across worker processes as well as threads
+            with open(os.path.join(assignment_dir, '.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    build = self._load(assignment_dir, fingerprint)
+                    if build is None:
+                        print(f"   🏗️ Building reference solution for {assignment.name}")
+                        build = self._build(assignment_dir, fingerprint, reference_code, tools, assignment)
+                    else:
+                        print(f"   ♻️ Reusing reference build for {assignment.name}")
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            if "compiled_successfully" in build:
+                self._builds[assignment_id] = (fingerprint, build)
+            return build
+
+    def invalidate(self, assignment) -> None:
+        """Drop every stored reference build for an assignment"""
+        assignment_id = str(assignment.id)
+        with self._assignment_lock(assignment_id):
+            self._builds.pop(assignment_id, None)
+            shutil.rmtree(os.path.join(self.root, assignment_id), ignore_errors=True)
+
+    def _load(self, assignment_dir: str, fingerprint: str):
+        version_dir = os.path.join(assignment_dir, fingerprint)
+        try:
+            with open(os.path.join(version_dir, self.META_NAME), 'r', encoding='utf-8') as f:
+                build = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._is_usable(build):
+            return None
+        try:
+            os.remove(os.path.join(version_dir, self.SUPERSEDED_NAME))  # Current again (a reverted reference)
+        except OSError:
+            pass
+        return build
+
+    def _build(self, assignment_dir: str, fingerprint: str, reference_code: str, tools, assignment) -> Dict[str, Any]:
+        # The reference is expected to compile, so skip the syntax-only tier
+        build = tools.compile_code(
+            reference_code, "reference.cpp",
+            toolchain=assignment.toolchain, profile=assignment.compile_profile, syntax_check=False
+        )
+        if "compiled_successfully" not in build:
+            # Timeouts and missing compilers say nothing about this reference version
+            return build
+
+        staging_dir = tempfile.mkdtemp(prefix='.staging_', dir=assignment_dir)
+        if build.get("success") and build.get("executable_path"):
+            staged_executable = os.path.join(staging_dir, self.EXECUTABLE_NAME)
+            shutil.copy2(build["executable_path"], staged_executable)
+            build = dict(
+                build,
+                executable_path=os.path.join(assignment_dir, fingerprint, self.EXECUTABLE_NAME),
+                artifact_hash=hash_file(staged_executable)  # Keys the expected output store
+            )
+
+        with open(os.path.join(staging_dir, self.META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(build, f)
+
+        self._prune(assignment_dir, fingerprint)
+
+        version_dir = os.path.join(assignment_dir, fingerprint)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.rename(staging_dir, version_dir)
+        return build
+
+    def _prune(self, assignment_dir: str, fingerprint: str) -> None:
+        """
+        Remove older versions of this assignment's reference once they have been superseded
+        for prune_grace_seconds; gradings that loaded an older build may still be running it
+        """
+        now = time.time()
+        for name in os.listdir(assignment_dir):
+            if name.startswith('.') or name == fingerprint:
+                continue
+            version_dir = os.path.join(assignment_dir, name)
+            marker = os.path.join(version_dir, self.SUPERSEDED_NAME)
+            try:
+                superseded_at = os.path.getmtime(marker)
+            except OSError:
+                try:
+                    open(marker, 'w').close()
+                except OSError:
+                    pass
+                continue
+            if now - superseded_at >= self.prune_grace_seconds:
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    def _is_usable(self, build: Dict[str, Any]) -> bool:
+        # A failed reference build is still a valid (cached) outcome
+        if not build.get("success"):
+            return True
+        return bool(build.get("executable_path")) and os.path.exists(build["executable_path"])
+
+    def _assignment_lock(self, assignment_id: str) -> threading.Lock:
+        with self._lock:
+            if assignment_id not in self._assignment_locks:
+                self._assignment_locks[assignment_id] = threading.Lock()
+            return self._assignment_locks[assignment_id]
+
+
+_reference_store = None
+_reference_store_lock = threading.Lock()
+
+
+def get_reference_store() -> ReferenceArtifactStore:
+    """Process-wide reference artifact store"""
+    global _reference_store
+
+    with _reference_store_lock:
+        if _reference_store is None:
+            grading_settings = settings.GRADING_SETTINGS
+            _reference_store = ReferenceArtifactStore(
+                grading_settings['REFERENCE_ARTIFACTS_DIR'],
+                prune_grace_seconds=grading_settings.get('REFERENCE_PRUNE_GRACE_HOURS', 24) * 3600
+            )
+        return _reference_store
@@ -0,0 +1,255 @@
+"""
+LLM Response Cache
+Claude responses stored by a hash of the model, max_tokens and the exact
+prompt, so asking the same question twice (a regrade of an unchanged
+submission, byte-identical submissions, regenerating tests for an unchanged
+reference) is answered without an API call. A filled cache also lets the
+grading pipeline run offline.
+
+Entries expire after LLM_RESPONSE_CACHE_TTL_HOURS and the least recently used
+ones are evicted beyond LLM_RESPONSE_CACHE_MAX_ENTRIES. Backends: 'disk'
+(JSON files under LLM_RESPONSE_CACHE_DIR) or 'db' (the LLMResponseCacheEntry
+table, shared by every worker using the database).
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from typing import Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+import anthropic
+
+from .fingerprints import fingerprint
+from .llm_scheduler import get_llm_scheduler
+
+
+def response_key(params: Dict[str, Any]) -> str:
+    """Cache key of a Messages API request: model, max_tokens and a hash of everything else"""
+    prompt = {name: value for name, value in params.items() if name not in ("model", "max_tokens")}
+    return fingerprint("llm-response", params["model"], params.get("max_tokens"), fingerprint(_without_cache_control(prompt)))
+
+
+def _without_cache_control(value):
+    # Prompt cache breakpoints and their TTL change billing, not the answer
+    if isinstance(value, dict):
+        return {name: _without_cache_control(item) for name, item in value.items() if name != "cache_control"}
+    if isinstance(value, list):
+        return [_without_cache_control(item) for item in value]
+    return value
+
+
+class DiskResponseBackend:
+    """One JSON file per response; a file's mtime is its last use"""
+
+    def __init__(self, root: str, max_entries: int):
+        self.root = str(root)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None  # Counted lazily on the first store
+        self.evictions = 0
+
+    def get(self, key: str, max_age: Optional[float]) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if max_age and time.time() - entry["created_at"] > max_age:
+                os.remove(path)
+                return None
+            os.utime(path)
+            return entry["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key: str, model: str, response: Dict[str, Any]) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, staging_path = tempfile.mkstemp(prefix='.staging_', dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"model": model, "created_at": time.time(), "response": response}, f)
+            existed = os.path.exists(path)
+            os.replace(staging_path, path)  # Atomic publish
+        except OSError as e:
+            print(f"   ⚠️ LLM response cache store failed: {str(e)}")
+            return
+
+        with self._lock:
+            if self._entries is not None and not existed:
+                self._entries += 1
+            needs_eviction = self._entries is None or self._entries > self.max_entries
+        if needs_eviction:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used responses until at most max_entries remain"""
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                if not os.path.isdir(shard_dir):
+                    continue
+                for name in os.listdir(shard_dir):
+                    if name.startswith('.'):
+                        continue
+                    path = os.path.join(shard_dir, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+
+        excess = sorted(entries)[:max(len(entries) - self.max_entries, 0)]
+        for _, path in excess:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._entries = len(entries) - len(excess)
+            self.evictions += len(excess)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+
+class DatabaseResponseBackend:
+    """Responses in the LLMResponseCacheEntry table"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    def get(self, key: str, max_age: Optional[float]) -> Optional[Dict[str, Any]]:
+        from .models import LLMResponseCacheEntry
+
+        entries = LLMResponseCacheEntry.objects.filter(key=key)
+        if max_age:
+            entries.filter(created_at__lt=timezone.now() - timedelta(seconds=max_age)).delete()
+        entry = entries.only("response").first()
+        if entry is None:
+            return None
+        entries.update(hits=F("hits") + 1, last_used_at=timezone.now())
+        return entry.response
+
+    def set(self, key: str, model: str, response: Dict[str, Any]) -> None:
+        from .models import LLMResponseCacheEntry
+
+        # created_at is auto_now_add, so an overwrite has to restart the TTL explicitly
+        LLMResponseCacheEntry.objects.update_or_create(
+            key=key, defaults={"model": model, "response": response, "created_at": timezone.now()}
+        )
+        excess = LLMResponseCacheEntry.objects.count() - self.max_entries
+        if excess > 0:
+            oldest = LLMResponseCacheEntry.objects.order_by("last_used_at").values_list("key", flat=True)[:excess]
+            deleted, _ = LLMResponseCacheEntry.objects.filter(key__in=list(oldest)).delete()
+            self.evictions += deleted
+
+
+class LLMResponseCache:
+    """Response lookups and stores on a backend, with this process's hit/miss counters"""
+
+    def __init__(self, backend, ttl_seconds: float = 0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bypassed = 0
+
+    def lookup(self, params: Dict[str, Any]) -> Optional[anthropic.types.Message]:
+        """The stored response to this request, or None"""
+        try:
+            response = self.backend.get(response_key(params), self.ttl_seconds)
+            message = anthropic.types.Message.model_validate(response) if response is not None else None
+        except Exception as e:
+            print(f"   ⚠️ LLM response cache lookup failed: {str(e)}")
+            message = None
+        with self._lock:
+            if message is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return message
+
+    def store(self, params: Dict[str, Any], message: anthropic.types.Message) -> None:
+        """Remember a complete response (truncated or refused ones are asked again)"""
+        if message.stop_reason != "end_turn":
+            return
+        try:
+            self.backend.set(response_key(params), params["model"], message.model_dump(mode="json"))
+        except Exception as e:
+            print(f"   ⚠️ LLM response cache store failed: {str(e)}")
+            return
+        with self._lock:
+            self.stores += 1
+
+    def count_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "stores": self.stores,
+                "bypassed": self.bypassed,
+                "evictions": self.backend.evictions,
+            }
+
+
+def create_message(client: anthropic.Anthropic, params: Dict[str, Any], fresh: bool = False) -> Tuple[anthropic.types.Message, bool]:
+    """
+    client.messages.create(**params) through the response cache and the LLM scheduler;
+    fresh skips the lookup (the new response still replaces the stored one).
+    Returns (message, whether it came from the cache).
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        if fresh:
+            cache.count_bypass()
+        else:
+            message = cache.lookup(params)
+            if message is not None:
+                print(f"   💾 Using cached Claude response")
+                return message, True
+
+    message = get_llm_scheduler().create(client, params)
+    if cache is not None:
+        cache.store(params, message)
+    return message, False
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Process-wide LLM response cache, or None when disabled in settings"""
+    global _response_cache
+
+    grading_settings = settings.GRADING_SETTINGS
+    if not grading_settings.get('LLM_RESPONSE_CACHE_ENABLED', True):
+        return None
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            max_entries = grading_settings.get('LLM_RESPONSE_CACHE_MAX_ENTRIES', 10000)
+            if grading_settings.get('LLM_RESPONSE_CACHE_BACKEND', 'disk') == 'db':
+                backend = DatabaseResponseBackend(max_entries)
+            else:
+                backend = DiskResponseBackend(grading_settings['LLM_RESPONSE_CACHE_DIR'], max_entries)
+            _response_cache = LLMResponseCache(
+                backend,
+                ttl_seconds=grading_settings.get('LLM_RESPONSE_CACHE_TTL_HOURS', 720) * 3600
+            )
+        return _response_cache
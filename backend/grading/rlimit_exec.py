@@ -0,0 +1,38 @@
+"""
+Resource Limit Exec Wrapper
+Stand-in for util-linux prlimit on hosts without it: applies rlimits to its own
+process and then execs the program, so no Python code runs between fork and exec
+in a multi-threaded parent. Accepts the prlimit options runner.py uses:
+
+    python -I -S rlimit_exec.py --cpu=SOFT:HARD --as=SOFT:HARD --fsize=SOFT:HARD -- PROGRAM [ARGS...]
+
+Runs as a plain script; it must not import anything outside the standard library.
+"""
+import os
+import sys
+import resource
+
+LIMITS = {
+    '--cpu': resource.RLIMIT_CPU,
+    '--as': resource.RLIMIT_AS,
+    '--fsize': resource.RLIMIT_FSIZE,
+}
+
+
+def main(argv):
+    separator = argv.index('--')
+    for option in argv[:separator]:
+        name, _, value = option.partition('=')
+        soft, _, hard = value.partition(':')
+        resource.setrlimit(LIMITS[name], (int(soft), int(hard or soft)))
+
+    program = argv[separator + 1:]
+    try:
+        os.execvp(program[0], program)
+    except OSError as e:
+        sys.stderr.write(f"rlimit_exec: {program[0]}: {e.strerror}\n")
+        os._exit(127)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,395 @@
+"""
+Program Runner
+Runs student and reference programs under resource limits and measures the
+wall time, CPU time and memory each run actually used
+"""
+import os
+import sys
+import uuid
+import shutil
+import signal
+import hashlib
+import resource
+import threading
+import subprocess
+import time
+from typing import Callable, Dict, List, Any, Optional
+
+WHITESPACE = b' \t\n\r\x0b\x0c'
+
+RLIMIT_EXEC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rlimit_exec.py')
+_prlimit_path = shutil.which('prlimit')
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+AUTO_CGROUP_DIR = os.path.join(CGROUP_ROOT, 'gradingai-runs')  # RUN_CGROUP_DIR=auto
+
+
+def prepare_cgroup_dir(path: str) -> Optional[str]:
+    """
+    Create path if needed and enable the pids controller for its children; returns
+    path, or None when it cannot hold pids-limited run cgroups (no cgroup v2, no
+    write access, or pids not delegated to it)
+    """
+    if not os.path.exists(os.path.join(os.path.dirname(path), 'cgroup.controllers')):
+        return None  # The parent is not a cgroup v2 directory
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'cgroup.controllers'), 'r') as f:
+            available = f.read().split()
+        if 'pids' not in available:
+            # Only possible when we may enable it in the parent (e.g. root on the cgroup root)
+            with open(os.path.join(os.path.dirname(path), 'cgroup.subtree_control'), 'w') as f:
+                f.write('+pids')
+        with open(os.path.join(path, 'cgroup.subtree_control'), 'w') as f:
+            f.write('+pids')
+    except OSError:
+        return None
+    return path
+
+
+class ResourceLimits:
+    """
+    Limits applied to every program run. CPU time, address space and file size are
+    rlimits, set by an exec wrapper (util-linux prlimit, else rlimit_exec.py) rather
+    than in the forked child. max_processes caps the tasks - processes and threads -
+    of one run through a pids cgroup, created under cgroup_dir (see prepare_cgroup_dir;
+    RLIMIT_NPROC counts every task of the grading user, so it would make results
+    depend on server load). Callers must supply a cgroup_dir whenever max_processes is
+    set - tools.get_run_cgroup_dir refuses to run programs uncapped unless allowed.
+    """
+
+    def __init__(self, cpu_seconds: int = 10, memory_mb: int = 512, file_size_mb: int = 16, max_processes: int = 64,
+                 cgroup_dir: str = None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.file_size_mb = file_size_mb
+        self.max_processes = max_processes
+        self.cgroup_dir = cgroup_dir or None
+
+    def wrap(self, args: List[str], cgroup: 'PidsCgroup' = None) -> List[str]:
+        """Command line that joins the run's cgroup, applies the rlimits and then execs args"""
+        options = []
+        if self.cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL one second later
+            options.append(f"--cpu={self.cpu_seconds}:{self.cpu_seconds + 1}")
+        if self.memory_mb:
+            memory_bytes = self.memory_mb * 1024 * 1024
+            options.append(f"--as={memory_bytes}:{memory_bytes}")
+        if self.file_size_mb:
+            file_bytes = self.file_size_mb * 1024 * 1024
+            options.append(f"--fsize={file_bytes}:{file_bytes}")
+
+        command = list(args)
+        if options:
+            limiter = [_prlimit_path] if _prlimit_path else [sys.executable, '-I', '-S', RLIMIT_EXEC_SCRIPT]
+            command = limiter + options + ['--'] + command
+        if cgroup is not None:
+            # The shell moves itself into the cgroup before exec, so every descendant is counted
+            command = ['/bin/sh', '-c', 'echo $$ > "$0/cgroup.procs" && exec "$@"', cgroup.path] + command
+        return command
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "memory_mb": self.memory_mb,
+            "file_size_mb": self.file_size_mb,
+            "max_processes": self.max_processes,
+            "cgroup_dir": self.cgroup_dir,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> 'ResourceLimits':
+        return cls(**data)
+
+
+class PidsCgroup:
+    """A cgroup v2 child of parent_dir for one run, holding at most max_pids tasks"""
+
+    def __init__(self, parent_dir: str, max_pids: int):
+        self.path = os.path.join(str(parent_dir), f"run-{os.getpid()}-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        try:
+            with open(os.path.join(self.path, 'pids.max'), 'w') as f:
+                f.write(str(max_pids))
+        except OSError:
+            self.remove()
+            raise
+
+    def kill(self) -> None:
+        """SIGKILL every task still in the cgroup, including ones that left the process group"""
+        try:
+            with open(os.path.join(self.path, 'cgroup.kill'), 'w') as f:
+                f.write('1')
+            return
+        except OSError:
+            pass  # Kernels before 5.14 have no cgroup.kill
+        try:
+            with open(os.path.join(self.path, 'cgroup.procs'), 'r') as f:
+                pids = [int(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def remove(self) -> None:
+        """Delete the cgroup once its killed tasks are gone"""
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+
+
+class BoundedCapture:
+    """
+    Streaming capture of one output pipe. Keeps only a head/tail excerpt, hashes the
+    whitespace-stripped stream incrementally, and reports when the byte cap is passed.
+    """
+
+    def __init__(self, max_bytes: int, excerpt_bytes: int, on_overflow: Callable[[], None] = None):
+        self.max_bytes = max_bytes
+        self.head_limit = excerpt_bytes // 2
+        self.tail_limit = excerpt_bytes - self.head_limit
+        self.on_overflow = on_overflow
+        self.total_bytes = 0
+        self.overflowed = False
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._digest = hashlib.sha256()
+        self._started = False
+        self._pending_whitespace = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        if self.overflowed:
+            return
+
+        if self.max_bytes and self.total_bytes + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.total_bytes]
+            self.overflowed = True
+
+        self.total_bytes += len(chunk)
+        self._keep_excerpt(chunk)
+        self._hash_stripped(chunk)
+
+        if self.overflowed and self.on_overflow:
+            self.on_overflow()
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self._head) + len(self._tail)
+
+    def sha256(self) -> str:
+        """Digest of the output with leading and trailing whitespace removed"""
+        return self._digest.hexdigest()
+
+    def excerpt(self) -> str:
+        """The whole output when it is small, otherwise its head and tail"""
+        head = self._head.decode('utf-8', errors='replace')
+        if not self.truncated:
+            return head + self._tail.decode('utf-8', errors='replace')
+        omitted = self.total_bytes - len(self._head) - len(self._tail)
+        return f"{head}\n... [{omitted} bytes omitted] ...\n{self._tail.decode('utf-8', errors='replace')}"
+
+    def _keep_excerpt(self, chunk: bytes) -> None:
+        room = self.head_limit - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self._tail += chunk
+            if len(self._tail) > self.tail_limit:
+                del self._tail[:len(self._tail) - self.tail_limit]
+
+    def _hash_stripped(self, chunk: bytes) -> None:
+        if not self._started:
+            chunk = chunk.lstrip(WHITESPACE)
+            if not chunk:
+                return
+            self._started = True
+
+        # Trailing whitespace is only hashed once more non-whitespace output follows it
+        content = chunk.rstrip(WHITESPACE)
+        if content:
+            if self._pending_whitespace:
+                self._digest.update(self._pending_whitespace)
+                self._pending_whitespace.clear()
+            self._digest.update(content)
+        self._pending_whitespace += chunk[len(content):]
+
+
+def stripped_sha256(text: str) -> str:
+    """The digest BoundedCapture would compute for this text"""
+    return hashlib.sha256(text.encode('utf-8', errors='replace').strip(WHITESPACE)).hexdigest()
+
+
+def run_program(args: List[str], input_text: str, timeout: float, limits: ResourceLimits = None, cwd: str = None,
+                max_output_bytes: int = 1024 * 1024, excerpt_bytes: int = 4096) -> Dict[str, Any]:
+    """
+    Run a program to completion (or until timeout) and report its output and resource usage.
+    The program gets its own process group, so a timeout - or output beyond max_output_bytes
+    on either stream - also kills anything it spawned (and, with a pids cgroup, anything that
+    left the group). Only an excerpt of each stream is kept.
+    """
+    cgroup = None
+    if limits and limits.cgroup_dir and limits.max_processes:
+        cgroup = PidsCgroup(limits.cgroup_dir, limits.max_processes)
+    try:
+        return _run_limited(limits.wrap(args, cgroup) if limits else list(args), input_text, timeout, cgroup, cwd,
+                            max_output_bytes, excerpt_bytes)
+    finally:
+        if cgroup is not None:
+            cgroup.kill()
+            cgroup.remove()
+
+
+def _run_limited(args: List[str], input_text: str, timeout: float, cgroup: Optional[PidsCgroup], cwd: Optional[str],
+                 max_output_bytes: int, excerpt_bytes: int) -> Dict[str, Any]:
+    parent_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=True
+    )
+
+    state_lock = threading.Lock()
+    state = {"exited": False, "timed_out": False, "output_limit_exceeded": False}
+
+    def kill_group(reason: str):
+        with state_lock:
+            if state["exited"]:
+                return
+            state[reason] = True
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            if cgroup is not None:
+                cgroup.kill()
+
+    stdout = BoundedCapture(max_output_bytes, excerpt_bytes, on_overflow=lambda: kill_group("output_limit_exceeded"))
+    stderr = BoundedCapture(max_output_bytes, excerpt_bytes, on_overflow=lambda: kill_group("output_limit_exceeded"))
+    io_threads = [
+        threading.Thread(target=_feed, args=(process.stdin, (input_text or "").encode('utf-8')), daemon=True),
+        threading.Thread(target=_drain, args=(process.stdout, stdout), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, stderr), daemon=True),
+    ]
+    for thread in io_threads:
+        thread.start()
+
+    timer = threading.Timer(timeout, kill_group, args=("timed_out",))
+    timer.daemon = True
+    timer.start()
+
+    # Wait without reaping first, so the timer can never signal a recycled pid.
+    # While waiting, sample the program's own high-water RSS: the rusage maxrss of a
+    # child forked from this (large) process never drops below our own footprint.
+    sampled_peak_kb = 0
+    poll_interval = 0.001
+    while True:
+        sampled_peak_kb = max(sampled_peak_kb, _read_peak_rss_kb(process.pid))
+        if os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT | os.WNOHANG) is not None:
+            break
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, 0.02)
+    with state_lock:
+        state["exited"] = True
+    timer.cancel()
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+
+    # We reaped the child ourselves; tell Popen so it never waits on it again
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # Grandchildren could keep the pipes open; clean up the whole group (and cgroup)
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if cgroup is not None:
+        cgroup.kill()
+    for thread in io_threads:
+        thread.join(timeout=5)
+
+    # None when the program finished before its memory could be observed
+    peak_rss_kb = usage.ru_maxrss if usage.ru_maxrss > parent_peak_kb else (sampled_peak_kb or None)
+
+    exit_signal = None
+    if process.returncode < 0:
+        try:
+            exit_signal = signal.Signals(-process.returncode).name
+        except ValueError:
+            exit_signal = str(-process.returncode)
+
+    return {
+        "returncode": process.returncode,
+        "stdout": stdout.excerpt(),
+        "stdout_sha256": stdout.sha256(),
+        "stdout_bytes": stdout.total_bytes,
+        "stdout_truncated": stdout.truncated,
+        "stderr": stderr.excerpt(),
+        "timed_out": state["timed_out"],
+        "output_limit_exceeded": state["output_limit_exceeded"],
+        "wall_time": round(wall_time, 6),
+        "cpu_time": round(usage.ru_utime + usage.ru_stime, 6),
+        "peak_rss_kb": peak_rss_kb,  # Kilobytes
+        "signal": exit_signal,
+    }
+
+
+def describe_signal(exit_signal: str) -> str:
+    """Human readable reason for a program killed by a signal"""
+    reasons = {
+        "SIGXCPU": "CPU time limit exceeded",
+        "SIGXFSZ": "Output file size limit exceeded",
+        "SIGSEGV": "Segmentation fault",
+        "SIGABRT": "Program aborted (possibly out of memory)",
+        "SIGFPE": "Arithmetic error (e.g. division by zero)",
+        "SIGKILL": "Program was killed (resource limit exceeded)",
+    }
+    return reasons.get(exit_signal, f"Program terminated by {exit_signal}")
+
+
+def _read_peak_rss_kb(pid: int) -> int:
+    """VmHWM of a running process, in kilobytes (0 once it has exited)"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _feed(pipe, data: bytes) -> None:
+    try:
+        if data:
+            pipe.write(data)
+    except (BrokenPipeError, OSError):
+        # The program exited without reading all of its input
+        pass
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _drain(pipe, capture: BoundedCapture) -> None:
+    try:
+        for chunk in iter(lambda: pipe.read1(65536), b''):
+            capture.feed(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        pipe.close()
@@ -1,30 +1,84 @@
 import os
 import time
 import json
-from django.conf import settings
+from typing import Callable
 from django.utils import timezone
 from decimal import Decimal
+from django.conf import settings
 import anthropic
 
 from submissions.models import StudentSubmission
 from .models import GradingResult
-from .tools import CPPAnalysisTools
+from .session import GradingSession
+from .ingest import SourceText, ingest_file
+from .profiling import format_profile, magnitude, relative_to_reference
+from .prompt_budget import PromptBudget, compact_diagnostics, excerpt, first_difference, REFERENCE_SHARE, STUDENT_MIN_SHARE
+from .fingerprints import fingerprint
+from .executor import EXECUTOR_ERRORS
+from .llm import get_llm_client
+from .response_cache import create_message
 
 class GradingService:
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY)
         self.model = "claude-3-5-sonnet-20241022"  # Use latest stable model
     
-    def grade_submission(self, submission: StudentSubmission) -> GradingResult:
+    @property
+    def client(self) -> anthropic.Anthropic:
+        """Process-wide Anthropic client (see grading/llm.py)"""
+        return get_llm_client()
+    
+    def grade_submission(self, submission: StudentSubmission, previous: GradingResult = None, fresh: bool = False) -> GradingResult:
         """
         Grade a student submission using Claude AI with development tools
+        
+        With previous (the submission's existing GradingResult) this is a regrade: every stage
+        whose input fingerprint matches the one stored on previous reuses its stored result,
+        and previous is updated in place instead of a new GradingResult being created.
+        
+        fresh always asks Claude for a new review, bypassing stored reviews and cached responses.
+        """
+        prepared = self.prepare_grading(submission, previous, fresh)
+        try:
+            grading_data, llm_usage = None, None
+            review_start = time.time()
+            if prepared["prompt"] is not None:
+                grading_data, llm_usage = self._grade_with_claude(prepared)
+            return self.finalize_grading(prepared, grading_data, llm_usage, llm_time=time.time() - review_start)
+        except Exception as e:
+            raise Exception(f"Grading failed: {str(e)}")
+    
+    def prepare_grading(self, submission: StudentSubmission, previous: GradingResult = None, fresh: bool = False,
+                        on_stage: Callable[[str, dict], None] = None) -> dict:
+        """
+        Run every local grading stage (rubric, compile, style, tests, profiling) and build the
+        Claude prompt. The returned state goes to finalize_grading() together with the review;
+        its "prompt" is None when no review is needed (syntax failure, or an unchanged
+        prompt on a regrade).
+        
+        on_stage(stage, {"result", "reused"}) is called as each stage finishes (progress streaming).
         """
         start_time = time.time()
-        tools = None
+        session = None
+        stored = (previous.stage_fingerprints or {}) if previous else {}
+        fingerprints = {}
+        rerun = []
+        
+        def reusable(stage: str, fingerprint: str, value):
+            """The stored stage result if its inputs are unchanged, else None (and the stage reruns)"""
+            fingerprints[stage] = fingerprint
+            if value is not None and fingerprint and stored.get(stage) == fingerprint:
+                print(f"   ♻️ Inputs unchanged - reusing stored result")
+                return value
+            rerun.append(stage)
+            return None
+        
+        def finished(stage: str, result) -> None:
+            if on_stage is not None:
+                on_stage(stage, {"result": result, "reused": stage in fingerprints and stage not in rerun})
         
         try:
             student_name = submission.student.full_name if submission.student else submission.legacy_student_name
-            print(f"\n🤖 AI AGENT GRADING STARTED for {student_name}")
+            print(f"\n🤖 AI AGENT {'REGRADING' if previous else 'GRADING'} STARTED for {student_name}")
             print(f"   📝 Assignment: {submission.assignment.name}")
             print("=" * 70)
             
@@ -36,237 +90,398 @@ class GradingService:
             reference_code = self._read_file_content(submission.assignment.reference_file.path)
             print(f"📂 Reference Code Loaded: {len(reference_code)} characters")
             
-            # Initialize AI agent tools
+            # Initialize AI agent tools (the session owns the workspace and every build in it)
             print(f"\n🔧 Initializing AI Agent Tools...")
-            tools = CPPAnalysisTools()
+            session = GradingSession(submission, student_code, reference_code)
+            tools = session.tools
             print(f"✅ Tools Initialized Successfully")
             
             # TOOL 1: Extract custom grading rubric from reference code
             print(f"\n📋 TOOL 1: Extracting Custom Grading Rubric...")
-            try:
-                rubric_data = tools.extract_rubric_from_code(reference_code)
-                print(f"   ✅ Rubric extraction completed")
-            except Exception as e:
-                print(f"   ❌ Rubric extraction failed: {str(e)}")
-                rubric_data = {"has_custom_rubric": False, "criteria": []}
+            rubric_data = reusable("rubric", session.rubric_fingerprint(), previous and previous.custom_rubric)
+            if rubric_data is None:
+                try:
+                    rubric_data = tools.extract_rubric_from_code(reference_code)
+                    print(f"   ✅ Rubric extraction completed")
+                except Exception as e:
+                    print(f"   ❌ Rubric extraction failed: {str(e)}")
+                    rubric_data = {"has_custom_rubric": False, "criteria": []}
+                    fingerprints["rubric"] = None  # Never reuse a failed stage
+            finished("rubric", rubric_data)
             
             # TOOL 2: Compile student code with error handling
             print(f"\n🔨 TOOL 2: Compiling Student Code...")
-            try:
-                compilation_result = tools.compile_code(student_code)
-                print(f"   {'✅' if compilation_result['success'] else '❌'} Compilation {'successful' if compilation_result['success'] else 'failed'}")
-            except Exception as e:
-                print(f"   ❌ Compilation tool failed: {str(e)}")
-                compilation_result = {
-                    "success": False,
-                    "errors": f"Compilation tool error: {str(e)}",
-                    "compiler_output": str(e)
-                }
+            compilation_result = reusable("compile", session.compile_fingerprint(), previous and previous.compilation_result)
+            if compilation_result is None:
+                try:
+                    compilation_result = session.compile_student()
+                    print(f"   {'✅' if compilation_result['success'] else '❌'} Compilation {'successful' if compilation_result['success'] else 'failed'}")
+                except EXECUTOR_ERRORS:
+                    raise  # Busy or broken infrastructure fails the grading rather than the student
+                except Exception as e:
+                    print(f"   ❌ Compilation tool failed: {str(e)}")
+                    compilation_result = {
+                        "success": False,
+                        "errors": f"Compilation tool error: {str(e)}",
+                        "compiler_output": str(e)
+                    }
+                if "compiled_successfully" not in compilation_result:
+                    fingerprints["compile"] = None  # Tool errors and timeouts say nothing about the code
+            finished("compile", compilation_result)
+            
+            # Code that does not even parse gets no test generation, test runs or AI review
+            syntax_failed = compilation_result.get("stage") == "syntax" and not compilation_result["success"]
+            if syntax_failed:
+                print(f"   ⏭️ Syntax check failed - skipping tests and AI review")
             
             # TOOL 3: Analyze code style with error handling
             print(f"\n🎨 TOOL 3: Analyzing Code Style...")
-            try:
-                style_analysis = tools.analyze_style(student_code)
-                print(f"   ✅ Style analysis completed - Score: {style_analysis.get('style_score', 'N/A')}/25")
-            except Exception as e:
-                print(f"   ❌ Style analysis failed: {str(e)}")
-                style_analysis = {
-                    "style_score": 15,  # Default neutral score
-                    "issues": [f"Style analysis failed: {str(e)}"],
-                    "suggestions": ["Could not perform style analysis"],
-                    "score_breakdown": {"basic": 15}
-                }
+            style_analysis = reusable("style", session.style_fingerprint(), previous and previous.style_analysis)
+            if style_analysis is None:
+                try:
+                    style_analysis = tools.analyze_style(student_code)
+                    print(f"   ✅ Style analysis completed - Score: {style_analysis.get('style_score', 'N/A')}/25")
+                except Exception as e:
+                    print(f"   ❌ Style analysis failed: {str(e)}")
+                    style_analysis = {
+                        "style_score": 15,  # Default neutral score
+                        "issues": [f"Style analysis failed: {str(e)}"],
+                        "suggestions": ["Could not perform style analysis"],
+                        "score_breakdown": {"basic": 15}
+                    }
+                    fingerprints["style"] = None
+            finished("style", style_analysis)
             
             # TOOL 4: Run comprehensive tests with error handling
             print(f"\n🧪 TOOL 4: Running Automated Tests...")
-            try:
-                test_results = tools.run_comprehensive_tests(
-                    student_code, 
-                    reference_code, 
-                    submission.assignment.description
-                )
-                tests_passed = test_results.get('tests_passed', 0)
-                total_tests = test_results.get('total_tests', 0)
-                print(f"   ✅ Testing completed - {tests_passed}/{total_tests} tests passed")
-            except Exception as e:
-                print(f"   ❌ Testing failed: {str(e)}")
+            if syntax_failed:
                 test_results = {
-                    "compilation": {"success": compilation_result["success"]},
+                    "compilation": {"success": False},
                     "test_results": [],
                     "tests_passed": 0,
                     "total_tests": 0,
-                    "overall_correctness": 50,  # Default neutral score
-                    "detailed_feedback": [f"Testing failed: {str(e)}"]
+                    "overall_correctness": 0,
+                    "detailed_feedback": ["Tests skipped: the code has syntax errors"],
+                    "skipped": True
                 }
-            
-            print(f"\n🤖 TOOL 5: Creating Enhanced AI Prompt...")
-            # Create enhanced grading prompt with tool results AND custom rubric
-            prompt = self._create_enhanced_grading_prompt_with_rubric(
-                student_code, 
-                reference_code, 
-                submission.assignment.name,
-                compilation_result,
-                style_analysis,
-                test_results,
-                rubric_data
-            )
-            print(f"   📝 Enhanced prompt length: {len(prompt)} characters")
-            if rubric_data["has_custom_rubric"]:
-                print(f"   📋 Using CUSTOM rubric with {len(rubric_data['criteria'])} criteria")
+                print(f"   ⏭️ Testing skipped")
             else:
-                print(f"   📋 Using DEFAULT rubric (no custom rubric found)")
-            print(f"   🧠 Prompt includes tool analysis data from all 4 tools")
-            
-            print(f"\n🧠 SENDING TO CLAUDE AI...")
-            print(f"   🤖 Model: {self.model}")
-            print(f"   📨 Sending enhanced prompt with tool data...")
-            
-            # Call Claude API
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+                test_results = reusable("tests", session.tests_fingerprint(), previous and previous.test_results)
+                if test_results is None:
+                    try:
+                        # Reuses the TOOL 2 build and the shared reference build - nothing is recompiled
+                        test_results = session.run_tests()
+                        tests_passed = test_results.get('tests_passed', 0)
+                        total_tests = test_results.get('total_tests', 0)
+                        print(f"   ✅ Testing completed - {tests_passed}/{total_tests} tests passed")
+                    except EXECUTOR_ERRORS:
+                        raise  # No test result (or tests fingerprint) is kept for an executor failure
+                    except Exception as e:
+                        print(f"   ❌ Testing failed: {str(e)}")
+                        test_results = {
+                            "compilation": {"success": compilation_result["success"]},
+                            "test_results": [],
+                            "tests_passed": 0,
+                            "total_tests": 0,
+                            "overall_correctness": 50,  # Default neutral score
+                            "detailed_feedback": [f"Testing failed: {str(e)}"]
+                        }
+                        fingerprints["tests"] = None
+            finished("tests", test_results)
             
-            print(f"   ✅ Claude AI Response received")
-            print(f"   📄 Response length: {len(response.content[0].text)} characters")
+            # TOOL 4b: Empirical complexity profile over the assignment's input generators
+            complexity_profile = None
+            if not syntax_failed and settings.GRADING_SETTINGS.get('PROFILE_ENABLED', True):
+                print(f"\n📈 TOOL 4b: Profiling Time and Memory Growth...")
+                complexity_profile = reusable("profile", session.profile_fingerprint(), previous and previous.complexity_profile)
+                if complexity_profile is None:
+                    try:
+                        complexity_profile = session.profile_complexity()
+                        if complexity_profile.get("skipped"):
+                            print(f"   ⏭️ Profiling skipped: {complexity_profile['skipped']}")
+                        else:
+                            orders = [
+                                f"{p['generator']}: {p['student']['time']['order'] if p['student']['time'] else 'n/a'}"
+                                for p in complexity_profile["profiles"]
+                            ]
+                            print(f"   ✅ Profiling completed in {complexity_profile['profiling_time']:.2f}s - {', '.join(orders)}")
+                    except EXECUTOR_ERRORS:
+                        raise
+                    except Exception as e:
+                        print(f"   ❌ Profiling failed: {str(e)}")
+                        complexity_profile = {"profiles": [], "skipped": f"Profiling failed: {str(e)}"}
+                        fingerprints["profile"] = None
+                finished("profile", complexity_profile)
             
-            # Parse Claude's response (with custom rubric support) with error handling
-            try:
-                grading_data = self._parse_claude_response_with_rubric(response.content[0].text, rubric_data)
-                print(f"   ✅ Response parsed successfully")
-                print(f"   🔍 Parsed grading data keys: {list(grading_data.keys())}")
-            except json.JSONDecodeError as e:
-                print(f"   ❌ JSON parsing failed: {str(e)}")
-                print(f"   🔧 Attempting response cleanup and retry...")
+            grading_data = None
+            prompt = None
+            if syntax_failed:
+                grading_data = self._create_syntax_failure_grading(compilation_result, style_analysis, rubric_data)
+                model_used = "none (syntax check)"
+            else:
+                print(f"\n🤖 TOOL 5: Creating Enhanced AI Prompt...")
+                # Create enhanced grading prompt with tool results AND custom rubric
+                prompt = self._create_enhanced_grading_prompt_with_rubric(
+                    student_code,
+                    reference_code,
+                    submission.assignment.name,
+                    compilation_result,
+                    style_analysis,
+                    test_results,
+                    rubric_data,
+                    complexity_profile
+                )
+                print(f"   📝 Enhanced prompt length: {len(prompt['prefix'])} characters shared by the assignment + {len(prompt['suffix'])} for this student")
+                print(f"   🪙 Prompt budget: {prompt['budget']}")
                 
-                # Try to clean and parse the response
-                cleaned_response = self._clean_claude_response(response.content[0].text)
-                try:
-                    grading_data = self._parse_claude_response_with_rubric(cleaned_response, rubric_data)
-                    print(f"   ✅ Response parsed after cleanup")
-                    print(f"   🔍 Parsed grading data keys: {list(grading_data.keys())}")
-                except Exception as cleanup_error:
-                    print(f"   ❌ Cleanup failed: {str(cleanup_error)}")
-                    # Create a fallback grading result
-                    grading_data = self._create_fallback_grading(compilation_result, style_analysis, test_results)
-                    print(f"   🔄 Using fallback grading result")
-            except Exception as e:
-                print(f"   ❌ Response parsing error: {str(e)}")
-                grading_data = self._create_fallback_grading(compilation_result, style_analysis, test_results)
-                print(f"   🔄 Using fallback grading result")
+                # The review depends on nothing but the model and the exact prompt
+                if reusable("llm", fingerprint("llm", self.model, prompt["prefix"], prompt["suffix"]), None if fresh else previous) is not None:
+                    prompt = None
+                model_used = self.model
             
-            # Calculate processing time
-            processing_time = time.time() - start_time
+            if previous is not None:
+                print(f"   🔁 Stages rerun: {', '.join(rerun) if rerun else 'none'}")
             
-            # Create GradingResult with tool analysis data
-            print(f"   💾 Creating GradingResult in database...")
-            try:
-                grading_result = GradingResult.objects.create(
-                    submission=submission,
-                    total_score=grading_data['total_score'],
-                    max_score=grading_data['max_score'],
-                    percentage=Decimal(str(grading_data['percentage'])),
-                    
-                    correctness_score=grading_data['correctness']['score'],
-                    correctness_max=grading_data['correctness']['max_score'],
-                    correctness_feedback=grading_data['correctness']['feedback'][:5000],  # Limit length
-                    
-                    code_style_score=grading_data['code_style']['score'],
-                    code_style_max=grading_data['code_style']['max_score'],
-                    code_style_feedback=grading_data['code_style']['feedback'][:5000],
-                    
-                    efficiency_score=grading_data['efficiency']['score'],
-                    efficiency_max=grading_data['efficiency']['max_score'],
-                    efficiency_feedback=grading_data['efficiency']['feedback'][:5000],
-                    
-                    documentation_score=grading_data['documentation']['score'],
-                    documentation_max=grading_data['documentation']['max_score'],
-                    documentation_feedback=grading_data['documentation']['feedback'][:5000],
-                    
-                    overall_feedback=grading_data['overall_feedback'][:10000],  # Limit length
-                    suggestions=grading_data['suggestions'][:5000],
-                    ai_model_used=self.model,
-                    processing_time=processing_time,
-                    
-                    # Store tool analysis results for transparency
-                    compilation_result=compilation_result,
-                    test_results=test_results,
-                    style_analysis=style_analysis,
-                    custom_rubric=rubric_data  # Store the extracted custom rubric
-                )
-                print(f"   ✅ GradingResult created successfully with ID: {grading_result.id}")
-            except Exception as db_error:
-                print(f"   ❌ Database error creating GradingResult: {str(db_error)}")
-                print(f"   📊 Grading data structure: {grading_data}")
-                raise db_error
-            
-            print(f"\n🎯 FINAL GRADING SUMMARY:")
-            print(f"   👤 Student: {student_name}")
-            print(f"   📝 Assignment: {submission.assignment.name}")
-            print(f"   🏆 Final Score: {grading_data['total_score']}/{grading_data['max_score']} ({grading_data['percentage']}%)")
-            print(f"   🔨 Compilation: {'✅ Success' if compilation_result['success'] else '❌ Failed'}")
-            if test_results.get('test_results'):
-                print(f"   🧪 Tests: {test_results['tests_passed']}/{test_results['total_tests']} passed")
-            print(f"   🎨 Style Score: {style_analysis['style_score']}/25")
-            print(f"   ⏱️ Processing Time: {processing_time:.2f}s")
-            print("=" * 60)
-            print(f"✅ GRADING COMPLETE - Results saved to database")
-            print("=" * 60)
-            
-            return grading_result
+            return {
+                "submission": submission,
+                "previous": previous,
+                "student_name": student_name,
+                "local_time": time.time() - start_time,
+                "prompt": prompt,
+                "model_used": model_used,
+                "grading_data": grading_data,  # Set when the grade needs no review
+                "rubric_data": rubric_data,
+                "compilation_result": compilation_result,
+                "test_results": test_results,
+                "complexity_profile": complexity_profile,
+                "style_analysis": style_analysis,
+                "fingerprints": fingerprints,
+                "fresh": fresh,
+            }
             
         except Exception as e:
             raise Exception(f"Grading failed: {str(e)}")
         finally:
             # Always clean up temporary files
-            if tools:
-                tools.cleanup()
+            if session:
+                session.close()
     
-    def _read_file_content(self, file_path: str) -> str:
-        """Read content from a file with multiple encoding support"""
-        encodings_to_try = ['utf-8', 'latin-1', 'cp1252', 'ascii', 'utf-16']
+    def finalize_grading(self, prepared: dict, grading_data: dict = None, llm_usage: dict = None, llm_time: float = 0.0) -> GradingResult:
+        """Save the GradingResult for a prepare_grading() state and the parsed Claude review (if one was needed)"""
+        submission = prepared["submission"]
+        previous = prepared["previous"]
+        compilation_result = prepared["compilation_result"]
+        test_results = prepared["test_results"]
+        style_analysis = prepared["style_analysis"]
+        fingerprints = dict(prepared["fingerprints"])
         
-        for encoding in encodings_to_try:
-            try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    content = file.read()
-                    # Validate that it's readable C++ code
-                    if content.strip():
-                        print(f"   ✅ File read successfully with {encoding} encoding")
-                        return content
-                    else:
-                        print(f"   ⚠️ File appears empty with {encoding} encoding")
-                        continue
-            except UnicodeDecodeError:
-                print(f"   ❌ Failed to read with {encoding} encoding, trying next...")
-                continue
-            except FileNotFoundError:
-                raise Exception(f"File not found: {file_path}")
-            except Exception as e:
-                print(f"   ❌ Error with {encoding}: {str(e)}")
-                continue
-        
-        # If all encodings fail, try reading as binary and cleaning
+        if prepared["grading_data"] is not None:
+            grading_data = prepared["grading_data"]
+        elif prepared["prompt"] is not None and (grading_data is None or grading_data.get("fallback")):
+            fingerprints["llm"] = None  # Not the model's grading - a regrade should ask again
+        if grading_data is None and previous is None:
+            raise Exception("No grading review for a submission that has never been graded")
+        
+        # Calculate processing time
+        processing_time = prepared["local_time"] + llm_time
+        
+        # Save GradingResult with tool analysis data
+        print(f"   💾 Saving GradingResult in database...")
+        fields = {
+            "ai_model_used": prepared["model_used"],
+            "processing_time": processing_time,
+            
+            # Store tool analysis results for transparency
+            "compilation_result": compilation_result,
+            "test_results": test_results,
+            "complexity_profile": prepared["complexity_profile"],
+            "style_analysis": style_analysis,
+            "custom_rubric": prepared["rubric_data"],  # Store the extracted custom rubric
+            "stage_fingerprints": fingerprints,
+        }
+        if grading_data is not None:
+            fields.update(self._score_fields(grading_data))
+            if llm_usage is not None and prepared["prompt"] is not None:
+                llm_usage = {**llm_usage, "prompt_sections": prepared["prompt"]["sections"]}
+            fields["llm_usage"] = llm_usage
         try:
-            with open(file_path, 'rb') as file:
-                raw_content = file.read()
-                # Try to decode and clean non-printable characters
-                content = raw_content.decode('utf-8', errors='replace')
-                # Remove or replace problematic characters
-                content = ''.join(char if ord(char) < 127 else ' ' for char in content)
-                if content.strip():
-                    print(f"   ⚠️ File read as binary and cleaned")
-                    return content
-        except Exception:
-            pass
+            if previous is not None:
+                for name, value in fields.items():
+                    setattr(previous, name, value)
+                previous.save()
+                grading_result = previous
+            else:
+                grading_result = GradingResult.objects.create(submission=submission, **fields)
+            print(f"   ✅ GradingResult saved successfully with ID: {grading_result.id}")
+        except Exception as db_error:
+            print(f"   ❌ Database error saving GradingResult: {str(db_error)}")
+            print(f"   📊 Grading data structure: {grading_data}")
+            raise db_error
+        
+        print(f"\n🎯 FINAL GRADING SUMMARY:")
+        print(f"   👤 Student: {prepared['student_name']}")
+        print(f"   📝 Assignment: {submission.assignment.name}")
+        print(f"   🏆 Final Score: {grading_result.total_score}/{grading_result.max_score} ({grading_result.percentage}%)")
+        print(f"   🔨 Compilation: {'✅ Success' if compilation_result['success'] else '❌ Failed'}")
+        if test_results.get('test_results'):
+            print(f"   🧪 Tests: {test_results['tests_passed']}/{test_results['total_tests']} passed")
+        print(f"   🎨 Style Score: {style_analysis['style_score']}/25")
+        print(f"   ⏱️ Processing Time: {processing_time:.2f}s")
+        print("=" * 60)
+        print(f"✅ GRADING COMPLETE - Results saved to database")
+        print("=" * 60)
+        
+        return grading_result
+    
+    def regrade_submission(self, submission: StudentSubmission, fresh: bool = False) -> GradingResult:
+        """Regrade a submission, rerunning only the stages whose inputs changed since it was graded"""
+        previous = GradingResult.objects.filter(submission=submission).first()
+        return self.grade_submission(submission, previous=previous, fresh=fresh)
+    
+    def _score_fields(self, grading_data: dict) -> dict:
+        """GradingResult score and feedback fields from parsed grading data"""
+        return {
+            "total_score": grading_data['total_score'],
+            "max_score": grading_data['max_score'],
+            "percentage": Decimal(str(grading_data['percentage'])),
+            
+            "correctness_score": grading_data['correctness']['score'],
+            "correctness_max": grading_data['correctness']['max_score'],
+            "correctness_feedback": grading_data['correctness']['feedback'][:5000],  # Limit length
+            
+            "code_style_score": grading_data['code_style']['score'],
+            "code_style_max": grading_data['code_style']['max_score'],
+            "code_style_feedback": grading_data['code_style']['feedback'][:5000],
+            
+            "efficiency_score": grading_data['efficiency']['score'],
+            "efficiency_max": grading_data['efficiency']['max_score'],
+            "efficiency_feedback": grading_data['efficiency']['feedback'][:5000],
+            
+            "documentation_score": grading_data['documentation']['score'],
+            "documentation_max": grading_data['documentation']['max_score'],
+            "documentation_feedback": grading_data['documentation']['feedback'][:5000],
+            
+            "overall_feedback": grading_data['overall_feedback'][:10000],  # Limit length
+            "suggestions": grading_data['suggestions'][:5000],
+        }
+    
+    def _grade_with_claude(self, prepared: dict) -> tuple:
+        """
+        The Claude review: send the grading prompt to the model and parse its grading
+        
+        Returns (grading data, token usage of the call)
+        """
+        rubric_data = prepared["rubric_data"]
+        if rubric_data["has_custom_rubric"]:
+            print(f"   📋 Using CUSTOM rubric with {len(rubric_data['criteria'])} criteria")
+        else:
+            print(f"   📋 Using DEFAULT rubric (no custom rubric found)")
+        print(f"   🧠 Prompt includes tool analysis data from all 4 tools")
+        
+        print(f"\n🧠 SENDING TO CLAUDE AI...")
+        print(f"   🤖 Model: {self.model}")
+        print(f"   📨 Sending enhanced prompt with tool data...")
+        
+        # Call Claude API (or reuse its answer to the identical prompt)
+        response, from_cache = create_message(self.client, self.review_request(prepared), fresh=prepared.get("fresh", False))
+        
+        grading_data, llm_usage = self.parse_review(prepared, response)
+        if from_cache:
+            llm_usage = self.response_cache_usage()
+        return grading_data, llm_usage
+    
+    def review_request(self, prepared: dict) -> dict:
+        """
+        Messages API parameters of the review for a prepare_grading() state
+        (the assignment prefix goes in the system prompt, behind a cache breakpoint)
+        """
+        prompt = prepared["prompt"]
+        return {
+            "model": self.model,
+            "max_tokens": 4000,
+            "system": [self._cached_block(prompt["prefix"])],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt["suffix"]
+                }
+            ]
+        }
+    
+    def parse_review(self, prepared: dict, response) -> tuple:
+        """Grading data and token usage from Claude's review message"""
+        rubric_data = prepared["rubric_data"]
+        compilation_result = prepared["compilation_result"]
+        style_analysis = prepared["style_analysis"]
+        test_results = prepared["test_results"]
+        
+        llm_usage = self._usage_record(response.usage)
+        print(f"   ✅ Claude AI Response received")
+        print(f"   🪙 Tokens: {llm_usage['input_tokens']} input + {llm_usage['cache_read_input_tokens']} cache read "
+              f"+ {llm_usage['cache_creation_input_tokens']} cache write, {llm_usage['output_tokens']} output")
+        print(f"   📄 Response length: {len(response.content[0].text)} characters")
+        
+        # Parse Claude's response (with custom rubric support) with error handling
+        try:
+            grading_data = self._parse_claude_response_with_rubric(response.content[0].text, rubric_data)
+            print(f"   ✅ Response parsed successfully")
+            print(f"   🔍 Parsed grading data keys: {list(grading_data.keys())}")
+        except json.JSONDecodeError as e:
+            print(f"   ❌ JSON parsing failed: {str(e)}")
+            print(f"   🔧 Attempting response cleanup and retry...")
             
-        raise Exception(f"Could not read file {file_path} with any supported encoding")
+            # Try to clean and parse the response
+            cleaned_response = self._clean_claude_response(response.content[0].text)
+            try:
+                grading_data = self._parse_claude_response_with_rubric(cleaned_response, rubric_data)
+                print(f"   ✅ Response parsed after cleanup")
+                print(f"   🔍 Parsed grading data keys: {list(grading_data.keys())}")
+            except Exception as cleanup_error:
+                print(f"   ❌ Cleanup failed: {str(cleanup_error)}")
+                # Create a fallback grading result
+                grading_data = self._create_fallback_grading(compilation_result, style_analysis, test_results)
+                print(f"   🔄 Using fallback grading result")
+        except Exception as e:
+            print(f"   ❌ Response parsing error: {str(e)}")
+            grading_data = self._create_fallback_grading(compilation_result, style_analysis, test_results)
+            print(f"   🔄 Using fallback grading result")
+        
+        return grading_data, llm_usage
+    
+    def _cached_block(self, text: str) -> dict:
+        """A text content block marked as a prompt cache breakpoint (unless caching is disabled)"""
+        block = {"type": "text", "text": text}
+        if settings.GRADING_SETTINGS.get('PROMPT_CACHE_ENABLED', True):
+            block["cache_control"] = {"type": "ephemeral", "ttl": settings.GRADING_SETTINGS.get('PROMPT_CACHE_TTL', '5m')}
+        return block
+    
+    def response_cache_usage(self) -> dict:
+        """llm_usage of a review answered from the LLM response cache (nothing was billed)"""
+        return {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_hit": False,
+            "response_cache_hit": True,
+        }
+    
+    def _usage_record(self, usage) -> dict:
+        """Token counts of one Claude call, as stored in GradingResult.llm_usage"""
+        record = {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_creation_input_tokens": usage.cache_creation_input_tokens or 0,
+            "cache_read_input_tokens": usage.cache_read_input_tokens or 0,
+        }
+        record["cache_hit"] = record["cache_read_input_tokens"] > 0
+        return record
+    
+    def _read_file_content(self, file_path: str) -> SourceText:
+        """Read, decode and normalize a source file in one pass (see grading/ingest.py)"""
+        source = ingest_file(file_path)
+        print(f"   ✅ File read successfully with {source.encoding} encoding (sha256 {source.sha256[:12]})")
+        return source
     
     def _create_enhanced_grading_prompt(self, student_code: str, reference_code: str, assignment_name: str, compilation_result: dict, style_analysis: dict, test_results: dict) -> str:
         """Create enhanced grading prompt with tool analysis results"""
@@ -364,31 +579,36 @@ Please provide your response in the following JSON format:
 Be thorough but constructive in your feedback. Reference the automated tool results in your analysis.
 """
     
-    def _create_enhanced_grading_prompt_with_rubric(self, student_code: str, reference_code: str, assignment_name: str, compilation_result: dict, style_analysis: dict, test_results: dict, rubric_data: dict) -> str:
-        """Create enhanced grading prompt with tool analysis results AND custom rubric criteria"""
-        
-        # Format compilation results
-        compilation_status = "✅ Compiles successfully" if compilation_result["success"] else f"❌ Compilation failed: {compilation_result['errors']}"
-        if compilation_result["success"] and compilation_result["warnings"]:
-            compilation_status += f"\n⚠️ Compiler warnings: {compilation_result['warnings']}"
+    def _create_enhanced_grading_prompt_with_rubric(self, student_code: str, reference_code: str, assignment_name: str, compilation_result: dict, style_analysis: dict, test_results: dict, rubric_data: dict, complexity_profile: dict = None) -> dict:
+        """
+        Create enhanced grading prompt with tool analysis results AND custom rubric criteria
         
-        # Format test results
-        test_summary = ""
-        if test_results.get("test_results"):
-            passed = test_results["tests_passed"]
-            total = test_results["total_tests"]
-            test_summary = f"🧪 Test Results: {passed}/{total} tests passed\n"
-            
-            for test in test_results["test_results"][:3]:  # Show first 3 tests
-                status = "✅" if test["passed"] else "❌"
-                test_summary += f"  {status} {test['test_name']}: {test.get('description', 'Test case')}\n"
+        Returns {"prefix": ..., "suffix": ..., "sections": ..., "budget": ...}: the prefix
+        (instructions, rubric and reference solution) is identical for every student on the
+        assignment and is sent as a cached system prompt; the suffix carries this student's
+        code and tool results. Both are compacted to fit PROMPT_TOKEN_BUDGET (see
+        grading/prompt_budget.py); sections holds the estimated tokens of each part.
+        """
+        budget = PromptBudget(settings.GRADING_SETTINGS.get('PROMPT_TOKEN_BUDGET', 12000))
+        prefix = self._create_grading_prompt_prefix(reference_code, assignment_name, rubric_data, budget)
+        suffix = self._create_grading_prompt_suffix(
+            student_code, compilation_result, style_analysis, test_results, complexity_profile, budget
+        )
+        return {
+            "prefix": prefix,
+            "suffix": suffix,
+            "sections": dict(budget.sections),
+            "budget": budget.summary(),
+        }
+    
+    def _create_grading_prompt_prefix(self, reference_code: str, assignment_name: str, rubric_data: dict, budget: PromptBudget) -> str:
+        """Per-assignment part of the grading prompt - must not depend on the submission"""
         
-        # Format style analysis
-        style_summary = f"🎨 Style Analysis: {style_analysis['style_score']}/25 points\n"
-        if style_analysis["style_issues"]:
-            style_summary += "Style Issues:\n"
-            for issue in style_analysis["style_issues"][:3]:  # Show first 3 issues
-                style_summary += f"  • {issue}\n"
+        # The rubric has been extracted from the reference's comments already
+        reference_code, _ = budget.compact_code(
+            "reference", reference_code, int(budget.budget_tokens * REFERENCE_SHARE),
+            strip=settings.GRADING_SETTINGS.get('PROMPT_STRIP_REFERENCE_COMMENTS', True)
+        )
         
         # Format custom rubric or use default
         grading_criteria_section = ""
@@ -442,7 +662,7 @@ Be thorough but constructive in your feedback. Reference the automated tool resu
             grading_criteria_section = """**Grading Criteria (Total: 100 points):**
 1. **Correctness (40 points)** - Use the automated test results and your analysis
 2. **Code Style (25 points)** - Consider automated style analysis and your review  
-3. **Efficiency (20 points)** - Analyze algorithm efficiency and approach
+3. **Efficiency (20 points)** - Analyze algorithm efficiency and approach, using the measured complexity profile when present
 4. **Documentation (15 points)** - Comments, code clarity, readability"""
             
             json_format_section = '''
@@ -476,34 +696,23 @@ Be thorough but constructive in your feedback. Reference the automated tool resu
 }
 ```'''
 
-        return f"""
-You are an expert C++ programming instructor with access to automated analysis tools. Please grade this student's C++ code submission based on both your expert analysis AND the automated tool results below.
+        prefix = f"""
+You are an expert C++ programming instructor with access to automated analysis tools. You grade student C++ code submissions for one assignment, based on both your expert analysis AND the automated tool results supplied with each submission.
 
 **Assignment:** {assignment_name}
 
-**AUTOMATED TOOL ANALYSIS:**
-{compilation_status}
-
-{test_summary}
-
-{style_summary}
-
 **Reference Solution:**
 ```cpp
 {reference_code}
 ```
 
-**Student Submission:**
-```cpp
-{student_code}
-```
-
 {grading_criteria_section}
 
 **CRITICAL INSTRUCTIONS:** 
 - Use the automated compilation and test results as primary evidence for correctness scoring
 - If code doesn't compile, apply severe point deductions as specified in the rubric
-- If tests fail, explain why based on the test case outputs shown above
+- If tests fail, explain why based on the test case outputs supplied with the submission
+- Base efficiency on the empirical complexity profile when one is shown: a growth order worse than the reference's is strong evidence of an inefficient algorithm
 - Combine automated style analysis with your expert judgment
 - The automated tools provide objective data - use this to support your grading decisions
 - Follow the specific point allocations in the grading criteria exactly
@@ -513,6 +722,124 @@ Please provide your response in the following JSON format:
 
 Be thorough but constructive in your feedback. Reference the automated tool results and apply the grading criteria consistently.
 """
+        return budget.count("instructions", prefix, excluding=["reference"])
+    
+    def _create_grading_prompt_suffix(self, student_code: str, compilation_result: dict, style_analysis: dict, test_results: dict, complexity_profile: dict = None, budget: PromptBudget = None) -> str:
+        """Per-student part of the grading prompt: the submission and its tool results"""
+        budget = budget or PromptBudget(settings.GRADING_SETTINGS.get('PROMPT_TOKEN_BUDGET', 12000))
+        max_diagnostics = settings.GRADING_SETTINGS.get('PROMPT_MAX_DIAGNOSTICS', 10)
+        
+        # Format compilation results (template errors repeat for every instantiation)
+        compilation_status = "✅ Compiles successfully" if compilation_result["success"] else f"❌ Compilation failed:\n{compact_diagnostics(compilation_result['errors'], max_diagnostics)}"
+        if compilation_result["success"] and compilation_result["warnings"]:
+            compilation_status += f"\n⚠️ Compiler warnings:\n{compact_diagnostics(compilation_result['warnings'], max_diagnostics)}"
+        budget.count("compilation", compilation_status)
+        
+        # Format test results
+        test_summary = ""
+        if test_results.get("test_results"):
+            test_summary = budget.count("tests", self._format_test_results(test_results))
+        
+        # Format the measured growth of time and memory with input size
+        complexity_summary = ""
+        if complexity_profile and complexity_profile.get("profiles"):
+            complexity_summary = "📈 Empirical Complexity Profile (measured CPU time and memory vs input size n):\n"
+            complexity_summary += format_profile(complexity_profile) + "\n"
+            budget.count("complexity", complexity_summary)
+        
+        # Format style analysis
+        style_summary = f"🎨 Style Analysis: {style_analysis['style_score']}/25 points\n"
+        if style_analysis["style_issues"]:
+            style_summary += "Style Issues:\n"
+            for issue in style_analysis["style_issues"][:3]:  # Show first 3 issues
+                style_summary += f"  • {issue}\n"
+        budget.count("style", style_summary)
+        
+        header = f"""
+Please grade this student's C++ code submission.
+
+**AUTOMATED TOOL ANALYSIS:**
+{compilation_status}
+
+{test_summary}
+
+{complexity_summary}
+
+{style_summary}
+
+**Student Submission:**
+"""
+        budget.count("instructions", header, excluding=["compilation", "tests", "complexity", "style"])
+        
+        # The code gets what the tool results leave, but never less than its minimum share
+        student_code, notes = budget.compact_code(
+            "student_code", student_code,
+            budget.available(minimum=int(budget.budget_tokens * STUDENT_MIN_SHARE)) - 50,
+            strip=False
+        )
+        if notes:
+            header += budget.count("instructions", f"ℹ️ Listing shortened to fit the prompt ({', '.join(notes)}) - do not deduct for what is not shown.\n")
+        return header + budget.count("instructions", "```cpp\n") + f"{student_code}\n" + budget.count("instructions", "```\n")
+    
+    def _format_test_results(self, test_results: dict) -> str:
+        """
+        Test results for the prompt: the counts, where the first failing tests went wrong
+        and the measured resources (passing tests are only named)
+        """
+        tests = test_results["test_results"]
+        summary = f"🧪 Test Results: {test_results['tests_passed']}/{test_results['total_tests']} tests passed\n"
+        
+        failed = [t for t in tests if not t["passed"]]
+        max_failed = settings.GRADING_SETTINGS.get('PROMPT_MAX_FAILED_TESTS', 5)
+        for test in failed[:max_failed]:
+            if not test.get("execution_successful", True):
+                metrics = test.get("metrics") or {}
+                reason = "timed out" if metrics.get("timed_out") else "runtime error"
+                if test.get("student_errors"):
+                    reason += f" - {excerpt(test['student_errors'], 200)}"
+            else:
+                reason = f"wrong output ({first_difference(test.get('expected_output', ''), test.get('actual_output', ''))})"
+            summary += f"  ❌ {test['test_name']}: {reason}\n"
+            summary += f"     Input: {excerpt(test.get('input', ''), 120)}\n"
+        if len(failed) > max_failed:
+            summary += f"  ❌ ... and {len(failed) - max_failed} more failing tests\n"
+        
+        passed = [t["test_name"] for t in tests if t["passed"]]
+        if passed:
+            shown = ', '.join(passed[:10]) + (f" and {len(passed) - 10} more" if len(passed) > 10 else "")
+            summary += f"  ✅ Passed: {shown}\n"
+        
+        return summary + self._format_measurements(tests)
+    
+    def _format_measurements(self, tests: list) -> str:
+        """
+        Summarize measured CPU time and memory of the student vs the reference program.
+        The student's figures are given as power-of-two multiples of the reference's, within
+        2x counting as the same, and the reference's as power-of-two ranges, so run-to-run
+        noise does not change the prompt and identical submissions hit the LLM response cache.
+        """
+        measured = [t for t in tests if t.get("metrics") and t.get("reference_metrics")]
+        if not measured:
+            return ""
+        
+        student_cpu = sum(t["metrics"]["cpu_time"] for t in measured) * 1000
+        reference_cpu = sum(t["reference_metrics"]["cpu_time"] for t in measured) * 1000
+        summary = (f"⏱️ Measured over {len(measured)} tests: student CPU {relative_to_reference(student_cpu, reference_cpu)} "
+                   f"(reference {magnitude(reference_cpu, 'ms')})")
+        
+        student_rss = [t["metrics"]["peak_rss_kb"] for t in measured if t["metrics"].get("peak_rss_kb")]
+        reference_rss = [t["reference_metrics"]["peak_rss_kb"] for t in measured if t["reference_metrics"].get("peak_rss_kb")]
+        if student_rss and reference_rss:
+            summary += (f", peak memory {relative_to_reference(max(student_rss), max(reference_rss))} "
+                        f"(reference {magnitude(max(reference_rss) / 1024, 'MB')})")
+        summary += "\n"
+        
+        killed = [t for t in measured if t["metrics"].get("signal") or t["metrics"].get("timed_out")]
+        for test in killed[:3]:
+            reason = "timed out" if test["metrics"].get("timed_out") else f"killed by {test['metrics']['signal']}"
+            summary += f"  ⚠️ {test['test_name']}: {reason}\n"
+        
+        return summary
     
     def _create_grading_prompt(self, student_code: str, reference_code: str, assignment_name: str) -> str:
         """Create the grading prompt for Claude"""
@@ -661,17 +988,14 @@ Be thorough but constructive in your feedback. Focus on helping the student lear
                 docs_feedback = ""
                 
                 for detail in custom_criteria_details:
-                    name_lower = detail["name"].lower()
-                    if any(term in name_lower for term in ['compil', 'correct', 'algorithm', 'implement', 'major']):
-                        correctness_feedback += f"{detail['name']}: {detail['feedback']}\n"
-                    elif any(term in name_lower for term in ['style', 'format', 'variable', 'minor']):
+                    category = self._rubric_category(detail["name"])
+                    if category == "code_style":
                         style_feedback += f"{detail['name']}: {detail['feedback']}\n"
-                    elif any(term in name_lower for term in ['efficien', 'performance', 'moderate']):
+                    elif category == "efficiency":
                         efficiency_feedback += f"{detail['name']}: {detail['feedback']}\n"
-                    elif any(term in name_lower for term in ['doc', 'comment', 'clarity']):
+                    elif category == "documentation":
                         docs_feedback += f"{detail['name']}: {detail['feedback']}\n"
                     else:
-                        # Default to correctness for unmatched criteria
                         correctness_feedback += f"{detail['name']}: {detail['feedback']}\n"
                 
                 # Set up standard 4-category structure
@@ -714,6 +1038,19 @@ Be thorough but constructive in your feedback. Focus on helping the student lear
         except Exception as e:
             raise Exception(f"Error parsing Claude response with rubric: {str(e)}")
     
+    def _rubric_category(self, criterion_name: str) -> str:
+        """Standard grading section a custom rubric criterion belongs to (correctness when unmatched)"""
+        name_lower = criterion_name.lower()
+        if any(term in name_lower for term in ['compil', 'correct', 'algorithm', 'implement', 'major']):
+            return "correctness"
+        if any(term in name_lower for term in ['style', 'format', 'variable', 'minor']):
+            return "code_style"
+        if any(term in name_lower for term in ['efficien', 'performance', 'moderate']):
+            return "efficiency"
+        if any(term in name_lower for term in ['doc', 'comment', 'clarity']):
+            return "documentation"
+        return "correctness"
+    
     def _clean_claude_response(self, response_text: str) -> str:
         """Clean Claude response to fix common JSON parsing issues"""
         import re
@@ -770,7 +1107,7 @@ Be thorough but constructive in your feedback. Focus on helping the student lear
                 "score": style_score,
                 "max_score": 25, 
                 "feedback": f"Style score: {style_score}/25. " + 
-                          f"Issues found: {len(style_analysis.get('issues', []))}. " +
+                          f"Issues found: {len(style_analysis.get('style_issues', []))}. " +
                           "AI analysis failed, using automated style checker."
             },
             "efficiency": {
@@ -786,5 +1123,84 @@ Be thorough but constructive in your feedback. Focus on helping the student lear
             "overall_feedback": "AI grading analysis encountered an error and fell back to tool-based assessment. " +
                               f"Your code {'compiles successfully' if compilation_result.get('success') else 'has compilation errors'}. " +
                               f"Consider reviewing the compiler messages and fixing any issues.",
-            "suggestions": "Review compilation errors if any, improve code style based on automated checks, and ensure proper documentation."
+            "suggestions": "Review compilation errors if any, improve code style based on automated checks, and ensure proper documentation.",
+            "fallback": True  # Not the model's grading - a regrade should ask again
+        }
+    
+    def _create_syntax_failure_grading(self, compilation_result: dict, style_analysis: dict, rubric_data: dict) -> dict:
+        """
+        Tool-based grading for code that failed the syntax check (no tests or AI review were run)
+        
+        Scored on the assignment's rubric: criteria that need a working program get nothing,
+        style and documentation criteria get the automated checkers' share of their points.
+        """
+        
+        style_score = style_analysis.get("style_score", 15)
+        style_issues = style_analysis.get("style_issues", [])
+        docs_score = 10  # Default middle score
+        compiler_errors = (compilation_result.get("errors") or "").strip()
+        if len(compiler_errors) > 1500:
+            compiler_errors = compiler_errors[:1500] + "\n..."
+        
+        sections = {
+            "correctness": {
+                "score": 0,
+                "max_score": 40,
+                "feedback": "The code does not compile, so no tests could be run. Compiler errors:\n" + compiler_errors
+            },
+            "code_style": {
+                "score": style_score,
+                "max_score": 25,
+                "feedback": f"Style score: {style_score}/25. " +
+                          f"Issues found: {len(style_issues)}. " +
+                          "Assessed by the automated style checker."
+            },
+            "efficiency": {
+                "score": 0,
+                "max_score": 20,
+                "feedback": "Efficiency cannot be assessed until the code compiles."
+            },
+            "documentation": {
+                "score": docs_score,
+                "max_score": 15,
+                "feedback": "Documentation assessment based on basic code structure."
+            },
+        }
+        overall_feedback = "Your code has syntax errors and does not compile, so it was not tested or reviewed in detail. " + \
+                           "Fix the compiler errors listed under correctness and resubmit."
+        
+        max_score = 100
+        total_score = sum(section["score"] for section in sections.values())
+        criteria = rubric_data.get("criteria") or []
+        if rubric_data.get("has_custom_rubric") and criteria:
+            # Each criterion earns its section's share; the total keeps the rubric's own scale
+            notes = {
+                "correctness": "No credit - the code does not compile.",
+                "code_style": f"Automated style checker: {style_score}/25.",
+                "efficiency": "No credit - the code does not compile.",
+                "documentation": "Based on basic code structure.",
+            }
+            criteria_feedback = []
+            earned = 0.0
+            possible = 0
+            for criterion in criteria:
+                category = self._rubric_category(criterion["name"])
+                section = sections[category]
+                score = round(criterion["max_points"] * section["score"] / section["max_score"])
+                earned += score
+                possible += criterion["max_points"]
+                criteria_feedback.append(f"**{criterion['name']}** ({score}/{criterion['max_points']}): {notes[category]}")
+            
+            max_score = rubric_data["total_possible_points"]
+            total_score = round(max_score * earned / possible) if possible else 0
+            overall_feedback = f"Custom Rubric Applied:\n{chr(10).join(criteria_feedback)}\n\n{overall_feedback}"
+        
+        return {
+            "total_score": int(total_score),
+            "max_score": max_score,
+            "percentage": round((total_score / max_score) * 100, 1) if max_score else 0.0,
+            **sections,
+            "overall_feedback": overall_feedback,
+            "suggestions": "Read the first compiler error carefully - later errors are often caused by it. " +
+                         "Check for missing semicolons, unbalanced braces and misspelled names."
         }
@@ -0,0 +1,146 @@
+"""
+Grading Session
+Owns the per-submission workspace and makes sure every source is compiled
+exactly once, so all grading stages read the same build results
+"""
+import threading
+from typing import Dict, List, Any
+from django.conf import settings
+
+from submissions.models import StudentSubmission
+from .tools import CPPAnalysisTools
+from .toolchains import COMPILE_PROFILES, get_toolchain_registry
+from .reference_store import get_reference_store
+from .test_suites import get_test_suite, reference_version
+from .ingest import as_source
+from .fingerprints import fingerprint
+
+
+class GradingSession:
+    """One grading run of one submission"""
+
+    def __init__(self, submission: StudentSubmission, student_code: str, reference_code: str):
+        self.submission = submission
+        self.assignment = submission.assignment
+        self.student_code = student_code
+        self.reference_code = reference_code
+        self.tools = CPPAnalysisTools()
+        self._lock = threading.Lock()
+        self._student_compile = None
+        self._reference_compile = None
+        self._test_cases = None
+
+    def compile_student(self) -> Dict[str, Any]:
+        """Compile the student's code into this session's workspace (once)"""
+        with self._lock:
+            if self._student_compile is None:
+                self._student_compile = self.tools.compile_code(
+                    self.student_code, "student.cpp",
+                    toolchain=self.assignment.toolchain, profile=self.assignment.compile_profile
+                )
+            return self._student_compile
+
+    def reference_build(self) -> Dict[str, Any]:
+        """Shared build of the assignment's reference solution (once per assignment version)"""
+        with self._lock:
+            if self._reference_compile is None:
+                self._reference_compile = get_reference_store().get_build(
+                    self.assignment, self.reference_code, self.tools
+                )
+            return self._reference_compile
+
+    def test_cases(self) -> List[Dict[str, str]]:
+        """The assignment's stored test suite (generated on first use, see grading/test_suites.py)"""
+        if self._test_cases is None:
+            version = self._reference_identity()
+            with self._lock:
+                if self._test_cases is None:
+                    self._test_cases = get_test_suite(
+                        self.assignment, self.reference_code, self.tools, version
+                    ).test_cases
+        return self._test_cases
+
+    def run_tests(self) -> Dict[str, Any]:
+        """Run the test suite against the session's existing builds"""
+        return self.tools.run_comprehensive_tests(
+            self.student_code,
+            self.reference_code,
+            self.assignment.description,
+            student_compile=self.compile_student(),
+            reference_compile=self.reference_build(),
+            test_cases=self.test_cases()
+        )
+
+    def profile_complexity(self) -> Dict[str, Any]:
+        """Time and memory growth of the session's builds over the assignment's input generators"""
+        return self.tools.profile_complexity(
+            self.compile_student(),
+            self.reference_build(),
+            self.assignment.input_generators or []
+        )
+    
+    def rubric_fingerprint(self) -> str:
+        """Inputs of rubric extraction: the reference source"""
+        return fingerprint("rubric", as_source(self.reference_code).sha256)
+
+    def style_fingerprint(self) -> str:
+        """Inputs of style analysis: the student source"""
+        return fingerprint("style", as_source(self.student_code).sha256)
+
+    def compile_fingerprint(self) -> str:
+        """Inputs of the student build: source, compiler version, flags and tiering"""
+        compiler = get_toolchain_registry().get(self.assignment.toolchain)
+        return fingerprint(
+            "compile",
+            as_source(self.student_code).sha256,
+            f"{compiler.command} {compiler.version}" if compiler else None,
+            list(CPPAnalysisTools.COMPILE_FLAGS) + COMPILE_PROFILES.get(self.assignment.compile_profile or 'standard', []),
+            settings.GRADING_SETTINGS.get('COMPILE_SYNTAX_CHECK', True),
+        )
+
+    def tests_fingerprint(self) -> str:
+        """
+        Inputs of the test stage: the student build, the reference executable, the
+        test suite and the run limits. The reference is identified by its binary, so
+        comment-only edits to the reference file (such as rubric changes) keep stored
+        test results valid
+        """
+        return fingerprint(
+            "tests",
+            self.compile_fingerprint(),
+            self._reference_identity(),
+            self.test_cases(),
+            self._run_settings(),
+        )
+
+    def profile_fingerprint(self) -> str:
+        """Inputs of complexity profiling: both builds, the input generators and the run limits"""
+        return fingerprint(
+            "profile",
+            self.compile_fingerprint(),
+            self._reference_identity(),
+            self.assignment.input_generators or [],
+            settings.GRADING_SETTINGS.get('PROFILE_TIMEOUT_SECONDS', 3),
+            self._run_settings(),
+        )
+
+    def _reference_identity(self) -> str:
+        return reference_version(self.reference_code, self.reference_build())
+
+    @staticmethod
+    def _run_settings() -> Dict[str, Any]:
+        return {
+            key: value for key, value in settings.GRADING_SETTINGS.items()
+            if key.startswith('RUN_')
+        }
+
+    def close(self) -> None:
+        """Release the session workspace"""
+        self.tools.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,115 @@
+"""
+Spawn Helper
+A small long-lived process, forked from each web or batch worker before Django
+and the Anthropic SDK are imported, that launches every compiler and student
+program on the worker's behalf. Forking from the helper copies a tiny process
+image instead of the full Django worker.
+
+The helper is an ExecutorServer (see grading/executor.py) on a private Unix
+socket; the worker finds it through the GRADING_SPAWN_SOCKET environment
+variable. Like executor.py, this module must stay free of Django imports.
+"""
+import os
+import sys
+import time
+import signal
+import tempfile
+import threading
+from typing import Optional
+
+from .executor import ExecutorServer
+
+SOCKET_ENV = 'GRADING_SPAWN_SOCKET'
+ENABLED_ENV = 'SPAWN_HELPER_ENABLED'
+SERVING_ENV = 'GRADING_SERVING_PROCESS'
+STARTUP_TIMEOUT = 5.0
+PARENT_POLL_SECONDS = 0.5
+
+
+def is_serving_process() -> bool:
+    """True in web workers (wsgi/asgi/runserver), which call start_spawn_helper at startup"""
+    return os.environ.get(SERVING_ENV) == '1'
+
+
+def spawn_helper_socket() -> Optional[str]:
+    """Socket of this process's spawn helper, if one was started"""
+    return os.environ.get(SOCKET_ENV) or None
+
+
+def start_spawn_helper() -> Optional[str]:
+    """
+    Fork the spawn helper and return its socket path. Call this before heavy
+    imports. A process that inherited a helper (e.g. the runserver autoreload
+    child) reuses it. Returns None when disabled or when the helper failed to start.
+    Only serving processes call this, so it also marks the process as one.
+    """
+    os.environ[SERVING_ENV] = '1'
+    _load_env_file()
+    if os.environ.get(ENABLED_ENV, 'True').lower() != 'true':
+        return None
+
+    existing = spawn_helper_socket()
+    if existing and os.path.exists(existing):
+        return existing
+
+    socket_path = os.path.join(tempfile.gettempdir(), f'gradingai-spawn-{os.getpid()}.sock')
+    parent_pid = os.getpid()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve(socket_path, parent_pid=parent_pid)
+        finally:
+            os._exit(0)
+
+    # Wait for the helper to bind; fall back to in-process spawning if it does not
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while not os.path.exists(socket_path):
+        if time.monotonic() > deadline or os.waitpid(pid, os.WNOHANG) != (0, 0):
+            print("⚠️ Spawn helper did not start - programs will be launched in-process", file=sys.stderr)
+            return None
+        time.sleep(0.005)
+
+    os.environ[SOCKET_ENV] = socket_path
+    return socket_path
+
+
+def serve(socket_path: str, parent_pid: int = None, workers: int = None) -> None:
+    """Run the helper until the parent process exits (or until SIGTERM)"""
+    # Ctrl-C goes to the whole process group; the helper outlives the parent's shutdown
+    # by at most PARENT_POLL_SECONDS and must not die first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    workers = workers or int(os.environ.get('EXECUTOR_WORKERS', '0') or 0) or None
+    server = ExecutorServer(socket_path, workers=workers)
+
+    def shutdown(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    if parent_pid:
+        def watch_parent():
+            while os.getppid() == parent_pid:
+                time.sleep(PARENT_POLL_SECONDS)
+            server.shutdown()
+        threading.Thread(target=watch_parent, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _load_env_file() -> None:
+    """Read backend/.env (settings.py has not run yet), without overriding the environment"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+
+if __name__ == '__main__':
+    # python -m grading.spawner SOCKET: run a helper in a fresh interpreter
+    serve(sys.argv[1])
@@ -0,0 +1,202 @@
+"""
+Grading Progress Streaming
+Grades one submission on the event loop of an ASGI server and reports its
+progress as Server-Sent Events: every local stage as soon as it finishes,
+then Claude's review text as it is generated, then the saved result.
+
+Events (each data field is a JSON object):
+  started  {"submission_id", "student_name", "regrade"}
+  stage    {"stage", "result", "reused"}   rubric, compile, style, tests, profile
+  review   {"model", "cached"}             the review starts (or comes from the response cache)
+  token    {"text"}                        review text as it streams in
+  result   {"grading_result_id", "total_score", "max_score", "percentage", "model_used", "processing_time"}
+  error    {"error"}
+  done     {}
+
+A grading is started once (start_grading_stream, which refuses a submission
+that is already being graded) and runs as its own task; any number of clients
+can then follow it with events(), each receiving every event from the start.
+A client that disconnects stops receiving events, not the grading.
+"""
+import json
+import time
+import asyncio
+from typing import AsyncIterator, Dict, Any, Optional
+
+from submissions.models import StudentSubmission
+from .models import GradingResult
+from .llm import get_llm_provider
+from .llm_scheduler import get_llm_scheduler
+from .response_cache import get_response_cache
+from .async_engine import run_with_db
+
+# Gradings by submission id, running or finished within RESULT_SECONDS; also the strong
+# references that keep their tasks alive (the event loop only keeps weak ones)
+_streams: Dict[str, 'GradingProgressStream'] = {}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def start_grading_stream(submission: StudentSubmission, fresh: bool = False) -> Optional['GradingProgressStream']:
+    """
+    Mark the submission as grading and start grading it on the running event loop;
+    None when it is already being graded (here, by the grade endpoint or by a batch)
+    """
+    claimed = await StudentSubmission.objects.filter(id=submission.id).exclude(status='grading').aupdate(status='grading')
+    if not claimed:
+        return None
+    submission.status = 'grading'
+
+    stream = GradingProgressStream(submission, fresh=fresh)
+    stream.start()
+    return stream
+
+
+def get_grading_stream(submission_id) -> Optional['GradingProgressStream']:
+    """The grading of a submission started in this process, while running and shortly after"""
+    return _streams.get(str(submission_id))
+
+
+class GradingProgressStream:
+    """Grades a submission (a regrade if it has a result already) and yields its progress events"""
+
+    HEARTBEAT_SECONDS = 15  # Comment lines keep proxies from closing an idle stream
+    RESULT_SECONDS = 60     # A finished grading can still be followed this long
+
+    def __init__(self, submission: StudentSubmission, fresh: bool = False, grading_service=None):
+        from .services import GradingService
+
+        self.submission = submission
+        self.fresh = fresh
+        self.grading_service = grading_service or GradingService()
+        self._history = []
+        self._followers = set()
+        self._loop = None
+
+    def start(self) -> None:
+        """Run the grading as a task of the running loop (the submission must be claimed already)"""
+        self._loop = asyncio.get_running_loop()
+        key = str(self.submission.id)
+        _streams[key] = self
+
+        def forget(_task):
+            def drop():
+                if _streams.get(key) is self:
+                    del _streams[key]
+            self._loop.call_later(self.RESULT_SECONDS, drop)
+
+        self._loop.create_task(self._grade(self._emit)).add_done_callback(forget)
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        # Called from worker threads as well as from the loop
+        self._loop.call_soon_threadsafe(self._publish, event, data)
+
+    def _publish(self, event: str, data: Dict[str, Any]) -> None:
+        self._history.append((event, data))
+        for queue in self._followers:
+            queue.put_nowait((event, data))
+
+    async def events(self) -> AsyncIterator[str]:
+        """Every event of the grading so far, then the rest as they happen"""
+        queue = asyncio.Queue()
+        for item in self._history:
+            queue.put_nowait(item)
+        self._followers.add(queue)
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), self.HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event, data)
+                if event in ("done", "error"):
+                    return
+        finally:
+            self._followers.discard(queue)
+
+    async def _grade(self, emit) -> None:
+        service = self.grading_service
+        submission = self.submission
+        try:
+            previous = await asyncio.to_thread(run_with_db, self._start)
+            emit("started", {
+                "submission_id": str(submission.id),
+                "student_name": submission.legacy_student_name,
+                "regrade": previous is not None,
+            })
+
+            prepared = await asyncio.to_thread(
+                run_with_db, service.prepare_grading, submission, previous, self.fresh,
+                lambda stage, data: emit("stage", {"stage": stage, **data})
+            )
+
+            grading_data, llm_usage, llm_time = None, None, 0.0
+            if prepared["prompt"] is not None:
+                grading_data, llm_usage, llm_time = await self._review(prepared, emit)
+
+            grading_result = await asyncio.to_thread(
+                run_with_db, self._finish, prepared, grading_data, llm_usage, llm_time
+            )
+            emit("result", {
+                "grading_result_id": str(grading_result.id),
+                "total_score": grading_result.total_score,
+                "max_score": grading_result.max_score,
+                "percentage": float(grading_result.percentage),
+                "model_used": grading_result.ai_model_used,
+                "processing_time": grading_result.processing_time,
+            })
+            emit("done", {})
+        except Exception as e:
+            print(f"   ❌ Streamed grading failed: {str(e)}")
+            try:
+                await asyncio.to_thread(run_with_db, self._fail)
+            finally:
+                emit("error", {"error": f"Grading failed: {str(e)}"})
+
+    async def _review(self, prepared: dict, emit) -> tuple:
+        """The Claude review, streamed token by token: (grading data, llm_usage, seconds spent)"""
+        service = self.grading_service
+        params = service.review_request(prepared)
+        cache = get_response_cache()
+        if cache is not None and self.fresh:
+            cache.count_bypass()
+        elif cache is not None:
+            message = await asyncio.to_thread(run_with_db, cache.lookup, params)
+            if message is not None:
+                emit("review", {"model": params["model"], "cached": True})
+                emit("token", {"text": message.content[0].text})
+                grading_data, _ = service.parse_review(prepared, message)
+                return grading_data, service.response_cache_usage(), 0.0
+
+        emit("review", {"model": params["model"], "cached": False})
+        review_start = time.monotonic()
+        message = await get_llm_scheduler().astream(
+            get_llm_provider().get_async_client(), params, lambda text: emit("token", {"text": text})
+        )
+        llm_time = time.monotonic() - review_start
+        if cache is not None:
+            await asyncio.to_thread(run_with_db, cache.store, params, message)
+        grading_data, llm_usage = service.parse_review(prepared, message)
+        return grading_data, llm_usage, llm_time
+
+    def _start(self) -> GradingResult:
+        self.submission.status = 'grading'
+        self.submission.save()
+        return GradingResult.objects.filter(submission=self.submission).first()
+
+    def _finish(self, prepared: dict, grading_data, llm_usage, llm_time: float) -> GradingResult:
+        grading_result = self.grading_service.finalize_grading(prepared, grading_data, llm_usage, llm_time=llm_time)
+        self.submission.status = 'graded'
+        self.submission.total_score = grading_result.total_score
+        self.submission.percentage = grading_result.percentage
+        self.submission.graded_at = grading_result.graded_at
+        self.submission.save()
+        return grading_result
+
+    def _fail(self) -> None:
+        self.submission.status = 'error'
+        self.submission.save()
@@ -0,0 +1,149 @@
+"""
+Assignment Test Suites
+Test cases are generated from the reference solution once per reference
+version and stored as the assignment's TestSuite, so every submission is
+graded against the same cases and no LLM call sits on the per-submission path.
+A reference version is identified by its executable, so comment-only edits
+(such as rubric changes) keep the suite. Instructors may edit a suite; edited
+suites are only replaced by an explicit regeneration.
+"""
+import threading
+from typing import Dict, List, Any
+
+from submissions.models import Assignment
+from .models import TestSuite
+from .ingest import as_source, ingest_file
+from .expected_outputs import get_expected_output_store, hash_file
+from .reference_store import get_reference_store
+
+MAX_TEST_CASES = 50
+MAX_INPUT_CHARS = 64 * 1024
+
+_generation_locks = {}
+_generation_locks_lock = threading.Lock()
+
+
+def validate_test_cases(test_cases: Any) -> List[Dict[str, str]]:
+    """Check a list of test cases; raises ValueError describing the first problem"""
+    if not isinstance(test_cases, list) or not 1 <= len(test_cases) <= MAX_TEST_CASES:
+        raise ValueError(f"Test cases must be a list of 1 to {MAX_TEST_CASES} cases")
+
+    names = set()
+    for index, case in enumerate(test_cases):
+        if not isinstance(case, dict):
+            raise ValueError(f"Test case {index + 1} must be an object")
+        name = case.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"Test case {index + 1}: name is required")
+        if name in names:
+            raise ValueError(f"Test case {index + 1}: duplicate name '{name}'")
+        names.add(name)
+        if not isinstance(case.get('input'), str):
+            raise ValueError(f"Test case {index + 1}: input must be a string")
+        if len(case['input']) > MAX_INPUT_CHARS:
+            raise ValueError(f"Test case {index + 1}: input exceeds {MAX_INPUT_CHARS} characters")
+        if not isinstance(case.get('description', ''), str):
+            raise ValueError(f"Test case {index + 1}: description must be a string")
+    return [
+        {"name": case["name"], "input": case["input"], "description": case.get("description", "")}
+        for case in test_cases
+    ]
+
+
+def reference_version(reference_code: str, reference_build: Dict[str, Any]) -> str:
+    """Version of the reference a suite is generated from: its executable hash, else its source hash"""
+    if reference_build.get("success") and reference_build.get("artifact_hash"):
+        return reference_build["artifact_hash"]
+    return as_source(reference_code).sha256
+
+
+def get_test_suite(assignment: Assignment, reference_code: str, tools, version: str) -> TestSuite:
+    """
+    The assignment's test suite, generating it first if there is none yet or it was
+    generated from another reference version (edited suites are always kept)
+    """
+    suite = TestSuite.objects.filter(assignment=assignment).first()
+    if suite and _is_current(suite, version):
+        return suite
+
+    # One generation per assignment at a time in this process; the others wait and reuse it
+    with _generation_lock(str(assignment.id)):
+        suite = TestSuite.objects.filter(assignment=assignment).first()
+        if suite and _is_current(suite, version):
+            return suite
+        return generate_test_suite(assignment, reference_code, tools, version)
+
+
+def generate_test_suite(assignment: Assignment, reference_code: str, tools, version: str, fresh: bool = False) -> TestSuite:
+    """
+    Generate test cases from the reference solution and store them as the assignment's suite
+    (fresh: bypass the LLM response cache, for new cases from an unchanged reference)
+    """
+    print(f"   🧬 Generating test suite for {assignment.name}")
+    try:
+        test_cases = validate_test_cases(tools._generate_ai_test_cases(reference_code, assignment.description, fresh=fresh))
+        source, generated_by = 'generated', tools.TEST_GENERATION_MODEL
+        print(f"   ✅ Stored {len(test_cases)} generated test cases")
+    except Exception as e:
+        # Stored like any suite, so an API outage does not put an LLM call on every submission;
+        # regenerate on demand once the API is back
+        print(f"   ⚠️ AI test generation failed: {str(e)} - storing fallback test cases")
+        test_cases, source, generated_by = tools._get_fallback_test_cases(), 'fallback', ''
+
+    suite, _ = TestSuite.objects.update_or_create(
+        assignment=assignment,
+        defaults={
+            "test_cases": test_cases,
+            "source": source,
+            "reference_version": version,
+            "generated_by": generated_by,
+        }
+    )
+    return suite
+
+
+def prepare_test_suite(assignment: Assignment, regenerate: bool = False) -> Dict[str, Any]:
+    """
+    Make the assignment's suite ready before grading starts: generate it if needed
+    (with regenerate: always, replacing even an edited suite) and run the reference
+    on every case so submissions only read stored expected outputs
+    """
+    from .tools import CPPAnalysisTools
+
+    reference_code = ingest_file(assignment.reference_file.path)
+    tools = CPPAnalysisTools()
+    try:
+        reference_build = get_reference_store().get_build(assignment, reference_code, tools)
+        version = reference_version(reference_code, reference_build)
+        if regenerate:
+            with _generation_lock(str(assignment.id)):
+                suite = generate_test_suite(assignment, reference_code, tools, version, fresh=True)
+        else:
+            suite = get_test_suite(assignment, reference_code, tools, version)
+
+        primed = 0
+        if reference_build.get("success"):
+            executable = reference_build["executable_path"]
+            primed = get_expected_output_store().prime(
+                reference_build.get("artifact_hash") or hash_file(executable),
+                [case["input"] for case in suite.test_cases],
+                lambda test_input: tools.run_with_input(executable, test_input)
+            )
+        return {"suite": suite, "reference_runs": primed, "reference_compiled": bool(reference_build.get("success"))}
+    finally:
+        tools.cleanup()
+
+
+def _is_current(suite: TestSuite, version: str) -> bool:
+    if suite.source == 'edited':
+        if suite.reference_version != version:
+            print(f"   ⚠️ Reference changed since the test suite was edited - keeping the instructor's cases")
+        return True
+    return suite.reference_version == version
+
+
+def _generation_lock(assignment_id: str) -> threading.Lock:
+    with _generation_locks_lock:
+        if assignment_id not in _generation_locks:
+            _generation_locks[assignment_id] = threading.Lock()
+        return _generation_locks[assignment_id]
@@ -1,3 +1,357 @@
-from django.test import TestCase
+import os
+import json
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from submissions.models import Assignment, StudentSubmission
+from .batch_service import BatchGradingService
+from .compile_cache import CompileCache
+from .fingerprints import changed_stages, fingerprint
+from .ingest import ingest_bytes, normalize_source
+from .llm_scheduler import TokenBucket
+from .message_batches import StubBatchBackend
+from .models import BatchGradingJob, GradingResult
+from .prompt_budget import CHARS_PER_TOKEN, PromptBudget, estimate_tokens
+
+
+def usage(output_tokens=0):
+    return {"input_tokens": 10, "output_tokens": output_tokens, "cache_hit": False, "cache_read_input_tokens": 0}
+
+
+def review(score):
+    return {
+        "total_score": score,
+        "max_score": 100,
+        "percentage": float(score),
+        "correctness": {"score": 0, "max_score": 40, "feedback": ""},
+        "code_style": {"score": 0, "max_score": 25, "feedback": ""},
+        "efficiency": {"score": 0, "max_score": 20, "feedback": ""},
+        "documentation": {"score": 0, "max_score": 15, "feedback": ""},
+        "overall_feedback": "",
+        "suggestions": "",
+    }
+
+
+class FakeGradingService:
+    """The GradingService calls batch_service makes, without compiling or calling Claude"""
+
+    def __init__(self):
+        self.prepared = []
+        self.synchronous = []
+        self.finalized = {}  # submission id -> (grading data, llm usage, model used)
+
+    def prepare_grading(self, submission):
+        self.prepared.append(str(submission.id))
+        return {"submission": submission, "prompt": f"review {submission.id}", "model_used": "claude-test"}
+
+    def review_request(self, prepared):
+        return {
+            "model": prepared["model_used"],
+            "max_tokens": 100,
+            "messages": [{"role": "user", "content": prepared["prompt"]}],
+        }
+
+    def parse_review(self, prepared, message):
+        return json.loads(message.content[0].text), usage(message.usage.output_tokens)
+
+    def _grade_with_claude(self, prepared):
+        self.synchronous.append(str(prepared["submission"].id))
+        return review(90), usage(50)
+
+    def response_cache_usage(self):
+        return usage()
+
+    def finalize_grading(self, prepared, grading_data=None, llm_usage=None, llm_time=0.0):
+        submission = prepared["submission"]
+        data = grading_data or review(0)
+        self.finalized[str(submission.id)] = (data, llm_usage, prepared["model_used"])
+        return GradingResult.objects.create(
+            submission=submission,
+            total_score=data["total_score"],
+            max_score=data["max_score"],
+            percentage=data["percentage"],
+            correctness_score=data["correctness"]["score"],
+            correctness_feedback=data["correctness"]["feedback"],
+            code_style_score=data["code_style"]["score"],
+            code_style_feedback=data["code_style"]["feedback"],
+            efficiency_score=data["efficiency"]["score"],
+            efficiency_feedback=data["efficiency"]["feedback"],
+            documentation_score=data["documentation"]["score"],
+            documentation_feedback=data["documentation"]["feedback"],
+            overall_feedback=data["overall_feedback"],
+            ai_model_used=prepared["model_used"],
+            processing_time=llm_time,
+            llm_usage=llm_usage,
+        )
+
+
+class RecordingResponseCache:
+    """A response cache that never hits and records what it is asked to store"""
+
+    def __init__(self):
+        self.stored = []
+
+    def lookup(self, params):
+        return None
+
+    def store(self, params, message):
+        self.stored.append(params)
+
+    def stats(self):
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0, "bypassed": 0}
+
+
+class BillingStubBackend(StubBatchBackend):
+    """The stub standing in for the real service, whose answers are reviews"""
+
+    is_stub = False
+
+
+class MessageBatchesTests(TestCase):
+    def setUp(self):
+        override = self.settings(GRADING_SETTINGS={
+            **settings.GRADING_SETTINGS,
+            'LLM_BATCH_POLL_SECONDS': 0,
+            'LLM_BATCH_CANCEL_WAIT_SECONDS': 0,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.assignment = Assignment.objects.create(
+            name="Lab 1", description="Hello", reference_file="reference_answers/lab1.cpp"
+        )
+        self.job = BatchGradingJob.objects.create(
+            assignment=self.assignment, assignment_name=self.assignment.name, total_files=3, mode='message_batches'
+        )
+        self.submissions = [
+            StudentSubmission.objects.create(
+                assignment=self.assignment,
+                batch_job=self.job,
+                code_file=f"submissions/student{i}lab1.cpp",
+                file_name=f"student{i}lab1.cpp",
+                file_size=100,
+                legacy_student_name=f"Student {i}"
+            )
+            for i in range(3)
+        ]
+
+        self.service = BatchGradingService()
+        self.fake = FakeGradingService()
+        self.service.grading_service = self.fake
+        self.cache = RecordingResponseCache()
+        self.backend = StubBatchBackend(polls_until_ended=2)
+        for target, value in (
+            ('grading.batch_service.get_batch_backend', lambda: self.backend),
+            ('grading.batch_service.get_response_cache', lambda: self.cache),
+            ('grading.batch_service.prepare_test_suite', mock.Mock(side_effect=Exception("no reference"))),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_job(self):
+        self.service._process_batch_job(str(self.job.id))
+        self.job.refresh_from_db()
+
+    def test_submits_polls_and_saves_every_review(self):
+        with mock.patch.object(self.backend, 'status', wraps=self.backend.status) as status:
+            self.run_job()
+
+        self.assertEqual(self.job.status, 'completed')
+        self.assertEqual(len(self.job.llm_batch_ids), 1)
+        self.assertEqual(status.call_count, 2)
+        self.assertEqual((self.job.processed_files, self.job.successful_grades, self.job.failed_grades), (3, 3, 0))
+        self.assertEqual(self.fake.synchronous, [])
+        for submission in self.submissions:
+            submission.refresh_from_db()
+            self.assertEqual(submission.status, 'graded')
+
+    def test_stub_reviews_are_labelled_and_never_cached(self):
+        self.run_job()
+
+        self.assertEqual(self.cache.stored, [])
+        for grading_data, llm_usage, model_used in self.fake.finalized.values():
+            self.assertTrue(grading_data["fallback"])
+            self.assertTrue(llm_usage["stub"])
+            self.assertEqual(llm_usage["message_batch"], self.job.llm_batch_ids[0])
+            self.assertEqual(model_used, "stub (claude-test)")
+
+    def test_real_reviews_are_cached(self):
+        self.backend = BillingStubBackend()
+        self.run_job()
+
+        self.assertEqual(len(self.cache.stored), 3)
+        for grading_data, llm_usage, model_used in self.fake.finalized.values():
+            self.assertNotIn("fallback", grading_data)
+            self.assertEqual(model_used, "claude-test")
+
+    def test_undelivered_reviews_are_retried_synchronously(self):
+        failing = f"review {self.submissions[1].id}"
+
+        def responder(params):
+            if params["messages"][0]["content"] == failing:
+                raise RuntimeError("overloaded")
+            return json.dumps(review(70))
+
+        self.backend.responder = responder
+        self.run_job()
+
+        self.assertEqual(self.fake.synchronous, [str(self.submissions[1].id)])
+        self.assertEqual(self.fake.finalized[str(self.submissions[1].id)][2], "claude-test")
+        self.assertEqual(self.cache.stored, [])
+        self.assertEqual(self.job.successful_grades, 3)
+
+    def test_late_batches_are_canceled_before_retrying(self):
+        self.backend.polls_until_ended = 100
+        override = self.settings(GRADING_SETTINGS={**settings.GRADING_SETTINGS, 'LLM_BATCH_MAX_WAIT_HOURS': 0})
+        with override, mock.patch.object(self.backend, 'cancel', wraps=self.backend.cancel) as cancel:
+            self.run_job()
+
+        cancel.assert_called_once_with(self.job.llm_batch_ids[0])
+        self.assertEqual(sorted(self.fake.synchronous), sorted(str(s.id) for s in self.submissions))
+        self.assertEqual(self.job.successful_grades, 3)
+
+    def test_resume_reads_reviews_from_saved_batches(self):
+        done, remaining = self.submissions[0], self.submissions[1:]
+        self.fake.finalize_grading({"submission": done, "model_used": "claude-test"}, review(80), usage())
+        StudentSubmission.objects.filter(id=done.id).update(status='graded')
+        batch_id = self.backend.submit([
+            {"custom_id": str(submission.id), "params": self.fake.review_request(self.fake.prepare_grading(submission))}
+            for submission in remaining
+        ])
+        BatchGradingJob.objects.filter(id=self.job.id).update(
+            status='processing', llm_batch_ids=[batch_id], processed_files=1, successful_grades=1
+        )
+        self.fake.prepared.clear()
+
+        with mock.patch.object(self.backend, 'submit', wraps=self.backend.submit) as submit:
+            self.service.resume_batch_job(str(self.job.id))
+        self.job.refresh_from_db()
+
+        submit.assert_not_called()
+        self.assertNotIn(str(done.id), self.fake.prepared)
+        self.assertEqual(self.fake.synchronous, [])
+        self.assertEqual(self.job.status, 'completed')
+        self.assertEqual(self.job.processed_files, 3)
+        self.assertEqual(self.cache.stored, [])
+
+    def test_resume_after_restart_retries_unknown_batches_synchronously(self):
+        BatchGradingJob.objects.filter(id=self.job.id).update(status='processing', llm_batch_ids=["msgbatch_stub_lost"])
+
+        self.service.resume_batch_job(str(self.job.id))
+        self.job.refresh_from_db()
+
+        self.assertEqual(sorted(self.fake.synchronous), sorted(str(s.id) for s in self.submissions))
+        self.assertEqual(self.job.successful_grades, 3)
+
+    def test_only_unfinished_message_batches_jobs_resume(self):
+        with self.assertRaises(ValueError):
+            self.service.resume_batch_job(str(self.job.id))  # Still pending
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.executable = os.path.join(self.directory.name, "a.out")
+        with open(self.executable, 'wb') as f:
+            f.write(b"\0" * 100)
+
+    def test_key_covers_every_compiler_input(self):
+        key = CompileCache.make_key("sha", "g++ 13", ["-O2"], "main.cpp")
+        self.assertNotEqual(key, CompileCache.make_key("sha", "g++ 14", ["-O2"], "main.cpp"))
+        self.assertNotEqual(key, CompileCache.make_key("sha", "g++ 13", ["-O0"], "main.cpp"))
+        self.assertNotEqual(key, CompileCache.make_key("other", "g++ 13", ["-O2"], "main.cpp"))
+
+    def test_store_then_lookup_materializes_the_executable(self):
+        cache = CompileCache(os.path.join(self.directory.name, "cache"), max_bytes=10 ** 6)
+        cache.store("ab" * 32, 0, "warning", self.executable, stage="build")
+
+        target = os.path.join(self.directory.name, "program")
+        meta = cache.lookup("ab" * 32, target)
+        self.assertEqual((meta["returncode"], meta["stderr"], meta["stage"]), (0, "warning", "build"))
+        self.assertTrue(os.path.exists(target))
+        self.assertIsNone(cache.lookup("cd" * 32, target))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = CompileCache(os.path.join(self.directory.name, "cache"), max_bytes=250)
+        for key in ("aa" * 32, "bb" * 32, "cc" * 32):
+            cache.store(key, 0, "", self.executable)
+        self.assertGreater(cache.evictions, 0)
+        self.assertLessEqual(cache.stats()["size_bytes"], 250)
+        self.assertIsNone(cache.lookup("aa" * 32, os.path.join(self.directory.name, "program")))
+
+
+class IngestTests(SimpleTestCase):
+    def test_decodes_boms_utf8_and_latin1(self):
+        self.assertEqual(ingest_bytes(b"\xef\xbb\xbfint x;\n").encoding, 'utf-8-sig')
+        self.assertEqual(ingest_bytes("// café\n".encode('utf-16')).encoding, 'utf-16')
+        self.assertEqual(ingest_bytes("// café\n".encode('utf-8')), "// café\n")
+        latin1 = ingest_bytes(b"// caf\xe9\n")
+        self.assertEqual((latin1, latin1.encoding), ("// café\n", 'latin-1'))
+
+    def test_normalizes_line_endings_and_control_characters(self):
+        self.assertEqual(normalize_source("a\r\nb\rc\x00d☃"), "a\nb\nc d \n")
+
+    def test_same_text_hashes_the_same_whatever_the_encoding(self):
+        self.assertEqual(ingest_bytes(b"int x;\r\n").sha256, ingest_bytes(b"\xef\xbb\xbfint x;\n").sha256)
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def test_estimates_tokens_from_length(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("x" * 35), int(35 / CHARS_PER_TOKEN))
+
+    def test_compact_code_fits_the_budget(self):
+        code = "".join(f"int line{i} = {i};  // comment {i}\n\n\n" for i in range(400))
+        budget = PromptBudget(1000)
+        compacted, notes = budget.compact_code("student", code, 300, strip=False)
+
+        self.assertLessEqual(estimate_tokens(compacted), 300)
+        self.assertIn("400 comments removed", notes)
+        self.assertTrue(any("omitted from the middle" in note for note in notes))
+        self.assertEqual(budget.used, budget.sections["student"])
+
+    def test_excluded_sections_are_not_counted_twice(self):
+        budget = PromptBudget(1000)
+        inner = budget.count("code", "x" * 70)
+        budget.count("prompt", f"header {inner}", excluding=["code"])
+        self.assertEqual(budget.used, estimate_tokens(f"header {inner}"))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_waits_for_the_refill(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.wait_time(60, now=bucket.updated), 0.0)
+        bucket.adjust(-60, now=bucket.updated)
+        self.assertAlmostEqual(bucket.wait_time(30, now=bucket.updated), 30.0)
+        self.assertEqual(bucket.wait_time(30, now=bucket.updated + 30), 0.0)
+
+    def test_charges_can_leave_debt_and_refunds_are_capped(self):
+        bucket = TokenBucket(60)
+        bucket.adjust(-90, now=bucket.updated)
+        self.assertAlmostEqual(bucket.wait_time(10, now=bucket.updated), 40.0)
+        bucket.adjust(1000, now=bucket.updated)
+        self.assertEqual(bucket.level, 60)
+
+    def test_adopts_reported_limits(self):
+        bucket = TokenBucket(60)
+        bucket.observe(120, 30, now=bucket.updated)
+        self.assertEqual((bucket.limit, bucket.level), (120, 30))
+        self.assertEqual(TokenBucket(0).wait_time(10 ** 9, now=0), 0.0)
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_canonical_over_key_order(self):
+        self.assertEqual(fingerprint({"a": 1, "b": 2}), fingerprint({"b": 2, "a": 1}))
+        self.assertNotEqual(fingerprint("code", ["-O2"]), fingerprint("code", ["-O0"]))
+
+    def test_changed_stages(self):
+        previous = {"rubric": "r", "compile": "c", "tests": "t"}
+        self.assertEqual(changed_stages(previous, {"rubric": "r", "compile": "c2", "tests": "t"}), ["compile"])
+        self.assertEqual(changed_stages(previous, {"rubric": "r", "tests": None}), ["tests"])
+        self.assertEqual(changed_stages(None, {"rubric": "r"}), ["rubric"])
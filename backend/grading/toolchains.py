@@ -0,0 +1,115 @@
+"""
+Toolchain Registry
+Probes the C++ compilers available on this host once per process and caches
+their versions and supported language standards
+"""
+import threading
+import subprocess
+from typing import Dict, List, Any, Optional
+from django.conf import settings
+
+TOOLCHAIN_CHOICES = [
+    ('g++', 'GCC (g++)'),
+    ('clang++', 'Clang (clang++)'),
+]
+
+CPP_STANDARDS = ['c++11', 'c++14', 'c++17', 'c++20', 'c++23']
+
+# Extra compiler flags per assignment compile profile
+COMPILE_PROFILES = {
+    'standard': [],
+    'optimized': ['-O2'],
+    'debug': ['-O0', '-g'],
+}
+
+COMPILE_PROFILE_CHOICES = [
+    ('standard', 'Standard'),
+    ('optimized', 'Optimized (-O2)'),
+    ('debug', 'Debug (-O0 -g)'),
+]
+
+
+class Toolchain:
+    """A C++ compiler found on this host"""
+
+    def __init__(self, name: str, command: str, version: str, standards: List[str]):
+        self.name = name
+        self.command = command
+        self.version = version
+        self.standards = standards
+
+    def supports(self, standard: str) -> bool:
+        return standard in self.standards
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "command": self.command,
+            "version": self.version,
+            "standards": self.standards,
+        }
+
+
+class ToolchainRegistry:
+    """Compilers available to the grading pipeline, probed on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._toolchains = None
+
+    def available(self) -> Dict[str, Toolchain]:
+        """All working compilers, keyed by toolchain name"""
+        with self._lock:
+            if self._toolchains is None:
+                self._toolchains = self._probe_all()
+            return self._toolchains
+
+    def get(self, name: str = None) -> Optional[Toolchain]:
+        """A toolchain by name (the configured default when name is empty), or None if missing"""
+        name = name or settings.GRADING_SETTINGS.get('DEFAULT_TOOLCHAIN', 'g++')
+        return self.available().get(name)
+
+    def _probe_all(self) -> Dict[str, Toolchain]:
+        toolchains = {}
+        for name, _ in TOOLCHAIN_CHOICES:
+            toolchain = self._probe(name)
+            if toolchain:
+                toolchains[name] = toolchain
+                print(f"   🔧 Toolchain {name}: {toolchain.version} ({', '.join(toolchain.standards)})")
+        return toolchains
+
+    def _probe(self, command: str) -> Optional[Toolchain]:
+        try:
+            version_check = subprocess.run([command, '--version'], capture_output=True, text=True, check=True, timeout=5)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            return None
+
+        standards = []
+        for standard in CPP_STANDARDS:
+            try:
+                check = subprocess.run(
+                    [command, f'-std={standard}', '-fsyntax-only', '-x', 'c++', '-'],
+                    input='',
+                    capture_output=True,
+                    text=True,
+                    timeout=10
+                )
+            except (subprocess.TimeoutExpired, OSError):
+                continue
+            if check.returncode == 0:
+                standards.append(standard)
+
+        return Toolchain(
+            name=command,
+            command=command,
+            version=version_check.stdout.split('\n', 1)[0].strip(),
+            standards=standards
+        )
+
+
+_toolchain_registry = ToolchainRegistry()
+
+
+def get_toolchain_registry() -> ToolchainRegistry:
+    """Process-wide toolchain registry"""
+    return _toolchain_registry
@@ -4,23 +4,56 @@ These tools give the AI agent the ability to compile, test, and analyze C++ code
 """
 import os
 import subprocess
-import tempfile
+import threading
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 import anthropic
 import re
 
+from .compile_cache import get_compile_cache
+from .pch import get_pch_bundle
+from .toolchains import COMPILE_PROFILES, get_toolchain_registry
+from .expected_outputs import get_expected_output_store, hash_file
+from .runner import AUTO_CGROUP_DIR, ResourceLimits, describe_signal, prepare_cgroup_dir, stripped_sha256
+from .executor import EXECUTOR_ERRORS, ExecutorUnavailable, execute_job, get_executor_client
+from .workspace import get_workspace_pool
+from .ingest import as_source
+from .profiling import ComplexityProfiler
+from .llm import get_llm_client
+from .response_cache import create_message
+
 class CPPAnalysisTools:
     """Tools that the AI agent can use to analyze C++ code"""
     
+    COMPILE_FLAGS = [
+        '-std=c++17',  # Use modern C++ standard
+        '-Wall',       # Enable warnings
+        '-Wextra',     # Extra warnings
+        '-pedantic',   # Strict standard compliance
+    ]
+    
+    TEST_GENERATION_MODEL = "claude-3-5-sonnet-20241022"
+    
     def __init__(self):
-        self.temp_dir = tempfile.mkdtemp(prefix='cpp_grading_')
-        self.claude_client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY)
+        # Leased from the process-wide pool and handed back, scrubbed, by cleanup()
+        self.temp_dir = get_workspace_pool().lease()
     
-    def compile_code(self, code: str, filename: str = "student_code.cpp") -> Dict[str, Any]:
+    @property
+    def claude_client(self) -> anthropic.Anthropic:
+        """Process-wide Anthropic client (see grading/llm.py)"""
+        return get_llm_client()
+    
+    def compile_code(self, code: str, filename: str = "student_code.cpp", use_cache: bool = True, use_pch: bool = True, toolchain: str = None, profile: str = None, syntax_check: bool = None) -> Dict[str, Any]:
         """
         Tool: Compile C++ code and return compilation results
+        
+        toolchain names a compiler from the ToolchainRegistry (the configured default when empty),
+        profile one of COMPILE_PROFILES. With syntax_check (default: COMPILE_SYNTAX_CHECK) a fast
+        -fsyntax-only pass runs first and the full build only happens if it succeeds; the
+        result's "stage" says which pass decided the outcome ("syntax" or "build").
         """
         try:
             # Validate input code
@@ -31,60 +64,75 @@ class CPPAnalysisTools:
                     "compiler_output": "No code to compile"
                 }
             
-            # Clean and validate the code
-            cleaned_code = self._clean_cpp_code(code)
+            # Normalize the code (a no-op for text that already went through ingestion)
+            source = as_source(code)
             
-            # Write code to temporary file
+            # Write code to temporary file (each source gets its own executable name)
             cpp_file = os.path.join(self.temp_dir, filename)
-            executable = os.path.join(self.temp_dir, "program")
+            executable = os.path.join(self.temp_dir, os.path.splitext(filename)[0] + ".out")
             
             # Ensure temp directory exists
             os.makedirs(self.temp_dir, exist_ok=True)
             
-            with open(cpp_file, 'w', encoding='utf-8', errors='replace') as f:
-                f.write(cleaned_code)
-            
-            # Check if g++ is available
-            try:
-                subprocess.run(['g++', '--version'], capture_output=True, check=True, timeout=5)
-            except (subprocess.CalledProcessError, FileNotFoundError):
+            # Check if the compiler is available (probed once per process by the registry)
+            compiler = get_toolchain_registry().get(toolchain)
+            if compiler is None:
                 return {
                     "success": False,
-                    "errors": "C++ compiler (g++) not available on this system",
+                    "errors": f"C++ compiler ({toolchain or 'default'}) not available on this system",
                     "compiler_output": "Missing compiler"
                 }
             
-            # Compile with g++
-            compile_cmd = [
-                'g++', 
-                '-std=c++17',  # Use modern C++ standard
-                '-Wall',       # Enable warnings
-                '-Wextra',     # Extra warnings
-                '-pedantic',   # Strict standard compliance
-                '-o', executable,
-                cpp_file
-            ]
+            compile_flags = list(self.COMPILE_FLAGS) + COMPILE_PROFILES.get(profile or 'standard', [])
+            if syntax_check is None:
+                syntax_check = settings.GRADING_SETTINGS.get('COMPILE_SYNTAX_CHECK', True)
             
-            result = subprocess.run(
-                compile_cmd,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=self.temp_dir  # Set working directory
-            )
+            # Never let a stale binary from an earlier build pass for this one
+            if os.path.lexists(executable):
+                os.remove(executable)
+            
+            # Serve regrades and byte-identical submissions from the artifact cache
+            cache = get_compile_cache() if use_cache else None
+            cache_key = None
+            if cache:
+                cache_key = cache.make_key(source.sha256, f"{compiler.command} {compiler.version}", compile_flags, filename)
+                cached = cache.lookup(cache_key, executable)
+                if cached is not None:
+                    print(f"   ♻️ Compile cache hit for {filename}")
+                    return self._compilation_result(
+                        cached["returncode"], cached["stderr"], executable, compiler,
+                        cache_hit=True, stage=cached.get("stage", "build")
+                    )
             
-            # Check if executable was created
-            executable_exists = os.path.exists(executable)
+            with open(cpp_file, 'w', encoding='utf-8', errors='replace') as f:
+                f.write(source)
             
-            return {
-                "success": result.returncode == 0 and executable_exists,
-                "executable_path": executable if executable_exists else None,
-                "warnings": result.stderr if result.returncode == 0 and result.stderr else "",
-                "errors": result.stderr if result.returncode != 0 else "",
-                "compiler_output": result.stderr,
-                "compiled_successfully": executable_exists
-            }
+            # Use a precompiled bundle of exactly the standard headers this source includes
+            pch_bundle = get_pch_bundle(compiler.command, compiler.version, compile_flags, source) if use_pch else None
+            
+            # Compile (relative paths keep diagnostics independent of the workspace)
+            base_cmd = [compiler.command] + compile_flags
+            stage = "build"
+            result = None
+            if syntax_check:
+                # Tier 1: parse and type-check only - no code generation, no link
+                result = self._compile_pass(base_cmd + ['-fsyntax-only'], filename, pch_bundle)
+                if result["returncode"] != 0:
+                    stage = "syntax"
+                else:
+                    result = None
             
+            if result is None:
+                # Tier 2: full build
+                result = self._compile_pass(base_cmd + ['-o', os.path.basename(executable)], filename, pch_bundle)
+            
+            if cache:
+                cache.store(cache_key, result["returncode"], result["stderr"], executable, stage=stage)
+            
+            return self._compilation_result(result["returncode"], result["stderr"], executable, compiler, stage=stage)
+            
+        except EXECUTOR_ERRORS:
+            raise  # The executor failed, not the code - never grade it as a compile error
         except subprocess.TimeoutExpired:
             return {
                 "success": False,
@@ -104,45 +152,67 @@ class CPPAnalysisTools:
                 "compiler_output": str(e)
             }
     
-    def _clean_cpp_code(self, code: str) -> str:
-        """Clean and validate C++ code before compilation"""
-        try:
-            # Remove BOM if present
-            if code.startswith('\ufeff'):
-                code = code[1:]
-            
-            # Normalize line endings
-            code = code.replace('\r\n', '\n').replace('\r', '\n')
-            
-            # Remove or replace problematic characters
-            cleaned = ''
-            for char in code:
-                if ord(char) < 32:  # Control characters
-                    if char in ['\n', '\t']:  # Keep newlines and tabs
-                        cleaned += char
-                    else:
-                        cleaned += ' '  # Replace other control chars with space
-                elif ord(char) > 126:  # Non-ASCII characters
-                    if ord(char) < 256:  # Extended ASCII
-                        cleaned += char
-                    else:
-                        cleaned += ' '  # Replace with space
-                else:
-                    cleaned += char
-            
-            # Ensure code ends with newline
-            if not cleaned.endswith('\n'):
-                cleaned += '\n'
-                
-            return cleaned
-            
-        except Exception:
-            # If cleaning fails, return original code
-            return code
+    def _compile_pass(self, compile_cmd: List[str], filename: str, pch_bundle) -> Dict[str, Any]:
+        """Run one compiler pass over filename, through the precompiled headers when given"""
+        if pch_bundle and pch_bundle.build():
+            # The bundle holds only the student's own includes, so its verdict stands
+            return self._run_compiler(compile_cmd + pch_bundle.compile_args() + [filename])
+        return self._run_compiler(compile_cmd + [filename])
+    
+    def _run_compiler(self, compile_cmd: List[str], timeout: int = 30) -> Dict[str, Any]:
+        """Run the compiler in the workspace (via the executor daemon when configured)"""
+        result = self._execute({
+            "type": "compile",
+            "args": compile_cmd,
+            "cwd": self.temp_dir,
+            "timeout": timeout
+        })
+        if result["timed_out"]:
+            raise subprocess.TimeoutExpired(compile_cmd, timeout)
+        return result
+    
+    def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Hand a compile/run job to the executor daemon, or run it here if none is configured or reachable
+
+        ExecutorTimeout propagates (through compile_code, run_with_input and the test and profile
+        runs, so the grading fails instead of scoring it): the daemon may still run the job, and
+        running it here as well would bypass its concurrency cap.
+        """
+        client = get_executor_client()
+        if client is not None:
+            try:
+                return client.submit(job)
+            except ExecutorUnavailable as e:
+                print(f"   ⚠️ {str(e)} - running {job['type']} job in-process")
+        return execute_job(job)
+    
+    def _compilation_result(self, returncode: int, stderr: str, executable: str, compiler, cache_hit: bool = False, stage: str = "build") -> Dict[str, Any]:
+        """Build the compile_code result dict from the compiler's exit status and diagnostics"""
+        # Check if executable was created
+        executable_exists = os.path.exists(executable)
+        
+        return {
+            "success": returncode == 0 and executable_exists,
+            "executable_path": executable if executable_exists else None,
+            "warnings": stderr if returncode == 0 and stderr else "",
+            "errors": stderr if returncode != 0 else "",
+            "compiler_output": stderr,
+            "compiled_successfully": executable_exists,
+            "cache_hit": cache_hit,
+            "stage": stage,
+            "toolchain": compiler.to_dict()
+        }
     
     def run_with_input(self, executable_path: str, test_input: str, timeout: int = 10) -> Dict[str, Any]:
         """
         Tool: Run compiled program with given input
+        
+        The program runs under CPU, memory and file-size limits (and a process-count limit
+        when RUN_CGROUP_DIR is set), and the
+        result carries measured wall time, CPU time, peak RSS and the terminating signal.
+        Output is streamed: "output" is a head/tail excerpt, "output_sha256" identifies the
+        full (whitespace-stripped) output, and runaway printers are killed at the byte cap.
         """
         try:
             if not os.path.exists(executable_path):
@@ -151,29 +221,53 @@ class CPPAnalysisTools:
                     "error": "Executable not found"
                 }
             
-            result = subprocess.run(
-                [executable_path],
-                input=test_input,
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
+            result = self._execute({
+                "type": "run",
+                "args": [executable_path],
+                "input": test_input,
+                "timeout": timeout,
+                "limits": self._resource_limits().to_dict(),
+                "cwd": self.temp_dir,
+                "max_output_bytes": settings.GRADING_SETTINGS.get('RUN_OUTPUT_LIMIT_KB', 1024) * 1024,
+                "excerpt_bytes": settings.GRADING_SETTINGS.get('RUN_OUTPUT_EXCERPT_KB', 4) * 1024
+            })
             
-            return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "errors": result.stderr,
-                "return_code": result.returncode,
-                "execution_time": "< 10s"  # Could add actual timing
+            metrics = {
+                "wall_time": result["wall_time"],
+                "cpu_time": result["cpu_time"],
+                "peak_rss_kb": result["peak_rss_kb"],
+                "signal": result["signal"],
+                "timed_out": result["timed_out"]
             }
             
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "error": f"Program execution timed out (>{timeout} seconds)",
-                "output": "",
-                "execution_time": f"> {timeout}s"
+            if result["timed_out"]:
+                return {
+                    "success": False,
+                    "error": f"Program execution timed out (>{timeout} seconds)",
+                    "output": "",
+                    "execution_time": f"> {timeout}s",
+                    "metrics": metrics
+                }
+            
+            run_result = {
+                "success": result["returncode"] == 0 and not result["output_limit_exceeded"],
+                "output": result["stdout"],
+                "output_sha256": result["stdout_sha256"],
+                "output_bytes": result["stdout_bytes"],
+                "output_truncated": result["stdout_truncated"],
+                "errors": result["stderr"],
+                "return_code": result["returncode"],
+                "execution_time": f"{result['wall_time']:.3f}s",
+                "metrics": metrics
             }
+            if result["output_limit_exceeded"]:
+                run_result["error"] = f"Output limit exceeded (>{settings.GRADING_SETTINGS.get('RUN_OUTPUT_LIMIT_KB', 1024)} KB) - program stopped"
+            elif result["signal"]:
+                run_result["error"] = describe_signal(result["signal"])
+            return run_result
+            
+        except EXECUTOR_ERRORS:
+            raise  # The executor failed, not the program - never grade it as a runtime error
         except Exception as e:
             return {
                 "success": False,
@@ -181,6 +275,21 @@ class CPPAnalysisTools:
                 "output": ""
             }
     
+    def _output_digest(self, run_result: Dict[str, Any]) -> str:
+        """Digest of a run's whitespace-stripped output (computed for results stored before streaming capture)"""
+        return run_result.get("output_sha256") or stripped_sha256(run_result.get("output", ""))
+    
+    def _resource_limits(self) -> ResourceLimits:
+        """Per-run resource limits from GRADING_SETTINGS"""
+        grading_settings = settings.GRADING_SETTINGS
+        return ResourceLimits(
+            cpu_seconds=grading_settings.get('RUN_CPU_SECONDS', 10),
+            memory_mb=grading_settings.get('RUN_MEMORY_MB', 512),
+            file_size_mb=grading_settings.get('RUN_FILE_SIZE_MB', 16),
+            max_processes=grading_settings.get('RUN_MAX_PROCESSES', 64),
+            cgroup_dir=get_run_cgroup_dir()
+        )
+    
     def extract_rubric_from_code(self, reference_code: str) -> Dict[str, Any]:
         """
         Tool: Extract grading rubric from reference code comments
@@ -362,9 +471,10 @@ class CPPAnalysisTools:
             # Fallback to basic tests if AI generation fails
             return self._get_fallback_test_cases()
     
-    def _generate_ai_test_cases(self, reference_code: str, assignment_description: str) -> List[Dict[str, str]]:
+    def _generate_ai_test_cases(self, reference_code: str, assignment_description: str, fresh: bool = False) -> List[Dict[str, str]]:
         """
         Use Claude AI to generate contextual test cases for the assignment
+        (fresh: ask again instead of reusing a cached answer to the same prompt)
         """
         prompt = f"""You are a C++ programming instructor creating comprehensive test cases for student code assessment.
 
@@ -403,16 +513,16 @@ Important:
 
         print(f"   📨 Sending test generation request to Claude...")
         
-        response = self.claude_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2000,
-            messages=[
+        response, _ = create_message(self.claude_client, {
+            "model": self.TEST_GENERATION_MODEL,
+            "max_tokens": 2000,
+            "messages": [
                 {
                     "role": "user", 
                     "content": prompt
                 }
             ]
-        )
+        }, fresh=fresh)
         
         response_text = response.content[0].text.strip()
         print(f"   📄 Received AI response: {len(response_text)} characters")
@@ -456,9 +566,14 @@ Important:
             }
         ]
     
-    def run_comprehensive_tests(self, student_code: str, reference_code: str, assignment_description: str) -> Dict[str, Any]:
+    def run_comprehensive_tests(self, student_code: str, reference_code: str, assignment_description: str, student_compile: Dict[str, Any] = None, reference_compile: Dict[str, Any] = None, test_cases: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Tool: Run comprehensive testing of student code against reference
+        
+        student_compile / reference_compile may carry existing builds (see GradingSession
+        and ReferenceArtifactStore) so neither source is compiled a second time.
+        test_cases is normally the assignment's stored TestSuite (see grading/test_suites.py);
+        only when it is None are cases generated on the spot.
         """
         results = {
             "compilation": None,
@@ -468,12 +583,14 @@ Important:
             "detailed_feedback": []
         }
         
-        # Compile student code
-        student_compile = self.compile_code(student_code, "student.cpp")
+        # Compile student code (unless the caller already did)
+        if student_compile is None:
+            student_compile = self.compile_code(student_code, "student.cpp")
         results["compilation"] = student_compile
         
-        # Compile reference code
-        reference_compile = self.compile_code(reference_code, "reference.cpp")
+        # Compile reference code (unless a shared build was provided)
+        if reference_compile is None:
+            reference_compile = self.compile_code(reference_code, "reference.cpp")
         results["reference_compilation"] = reference_compile
         
         if not student_compile["success"]:
@@ -484,28 +601,48 @@ Important:
             results["detailed_feedback"].append("⚠️ Reference code compilation failed - cannot run comparison tests")
             return results
         
-        # Generate and run test cases
-        test_cases = self.create_test_cases(reference_code, assignment_description)
+        # Generate (unless the caller passed the assignment's suite) and run test cases
+        if test_cases is None:
+            test_cases = self.create_test_cases(reference_code, assignment_description)
+        if not test_cases:
+            results["detailed_feedback"].append("⚠️ The assignment's test suite is empty - no tests were run")
+            results["tests_passed"] = 0
+            results["total_tests"] = 0
+            return results
         passed_tests = 0
         
-        for i, test_case in enumerate(test_cases):
-            # Run student code
-            student_result = self.run_with_input(
-                student_compile["executable_path"], 
-                test_case["input"]
+        # Reference outputs are memoized per reference artifact, so the reference
+        # program only runs for inputs no earlier submission has used
+        expected_outputs = get_expected_output_store()
+        reference_executable = reference_compile["executable_path"]
+        artifact_hash = reference_compile.get("artifact_hash") or hash_file(reference_executable)
+        
+        def expected_output(test_input: str) -> Dict[str, Any]:
+            return expected_outputs.get_or_run(
+                artifact_hash, test_input,
+                lambda: self.run_with_input(reference_executable, test_input)
             )
-            
-            # Run reference code
-            reference_result = self.run_with_input(
-                reference_compile["executable_path"],
-                test_case["input"]
+        
+        # Launch the student and reference runs of every test case together on the shared pool;
+        # results are still collected in test-case order so the output stays deterministic
+        executor = get_test_executor()
+        runs = [
+            (
+                executor.submit(self.run_with_input, student_compile["executable_path"], test_case["input"]),
+                executor.submit(expected_output, test_case["input"])
             )
+            for test_case in test_cases
+        ]
+        
+        for test_case, (student_run, reference_run) in zip(test_cases, runs):
+            student_result = student_run.result()
+            reference_result = reference_run.result()
             
-            # Compare outputs
+            # Compare outputs (by digest of the full output - the stored text is only an excerpt)
             test_passed = (
                 student_result["success"] and 
                 reference_result["success"] and
-                student_result["output"].strip() == reference_result["output"].strip()
+                self._output_digest(student_result) == self._output_digest(reference_result)
             )
             
             if test_passed:
@@ -518,7 +655,10 @@ Important:
                 "actual_output": student_result.get("output", "").strip(),
                 "passed": test_passed,
                 "student_errors": student_result.get("errors", ""),
-                "execution_successful": student_result["success"]
+                "execution_successful": student_result["success"],
+                # Measured resource usage, so efficiency grading rests on data
+                "metrics": student_result.get("metrics"),
+                "reference_metrics": reference_result.get("metrics")
             }
             
             results["test_results"].append(test_result)
@@ -547,14 +687,114 @@ Important:
         
         return results
     
+    def profile_complexity(self, student_compile: Dict[str, Any], reference_compile: Dict[str, Any], generators: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Tool: Measure how the student's CPU time and memory grow with input size, next to the reference
+        
+        generators are the assignment's input generator specs (see grading/profiling.py).
+        All sizes of both programs run concurrently on the shared test pool.
+        """
+        if not generators:
+            return {"profiles": [], "skipped": "No input generators declared for this assignment"}
+        if not student_compile.get("success") or not reference_compile.get("success"):
+            return {"profiles": [], "skipped": "Student or reference program did not compile"}
+        
+        reference_executable = reference_compile["executable_path"]
+        profiler = ComplexityProfiler(
+            self.run_with_input,
+            get_test_executor(),
+            timeout=settings.GRADING_SETTINGS.get('PROFILE_TIMEOUT_SECONDS', 3)
+        )
+        return profiler.profile(
+            student_compile["executable_path"],
+            reference_executable,
+            reference_compile.get("artifact_hash") or hash_file(reference_executable),
+            generators
+        )
+    
     def cleanup(self):
-        """Clean up temporary files"""
-        try:
-            import shutil
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        """Return the workspace to the pool (safe to call more than once)"""
+        temp_dir, self.temp_dir = getattr(self, 'temp_dir', None), None
+        if temp_dir:
+            try:
+                get_workspace_pool().release(temp_dir)
+            except Exception:
+                pass
     
     def __del__(self):
         """Ensure cleanup on object destruction"""
         self.cleanup()
+
+
+_test_executor = None
+_test_executor_lock = threading.Lock()
+
+
+def get_test_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for test-case runs, bounded by TEST_WORKERS (default: CPU count)"""
+    global _test_executor
+    
+    with _test_executor_lock:
+        if _test_executor is None:
+            workers = settings.GRADING_SETTINGS.get('TEST_WORKERS') or os.cpu_count() or 1
+            _test_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='grading-test')
+        return _test_executor
+
+
+_run_cgroup_dir = None
+_run_cgroup_checked = False
+_run_cgroup_lock = threading.Lock()
+
+
+def get_run_cgroup_dir():
+    """
+    The cgroup directory for pids-limited program runs (RUN_CGROUP_DIR, 'auto' meaning
+    runner.AUTO_CGROUP_DIR), resolved once per process. Raises ImproperlyConfigured
+    when no process cap is possible, unless RUN_ALLOW_UNCAPPED_PROCESSES is set
+    """
+    global _run_cgroup_dir, _run_cgroup_checked
+    
+    with _run_cgroup_lock:
+        if _run_cgroup_checked:
+            return _run_cgroup_dir
+        
+        grading_settings = settings.GRADING_SETTINGS
+        configured = str(grading_settings.get('RUN_CGROUP_DIR') or '')
+        path = AUTO_CGROUP_DIR if configured == 'auto' else configured
+        cgroup_dir = prepare_cgroup_dir(path) if path else None
+        
+        if cgroup_dir is None and grading_settings.get('RUN_MAX_PROCESSES', 64):
+            if configured not in ('', 'auto'):
+                raise ImproperlyConfigured(
+                    f"RUN_CGROUP_DIR {configured} is not a cgroup v2 directory with the pids controller delegated to it"
+                )
+            if not grading_settings.get('RUN_ALLOW_UNCAPPED_PROCESSES', False):
+                raise ImproperlyConfigured(
+                    "Student programs would run without a process cap: run as root (RUN_CGROUP_DIR=auto) or point "
+                    "RUN_CGROUP_DIR at a delegated cgroup v2 directory, or set RUN_ALLOW_UNCAPPED_PROCESSES=True"
+                )
+            print("⚠️ No pids cgroup available - student programs run WITHOUT a process cap "
+                  "(RUN_ALLOW_UNCAPPED_PROCESSES is set)")
+        
+        _run_cgroup_dir = cgroup_dir
+        _run_cgroup_checked = True
+        return _run_cgroup_dir
+
+
+def warm_up_precompiled_headers() -> None:
+    """
+    Build the bundles for the include sets in PCH_WARM_SETS (the combinations typical
+    submissions use, most common first) and then for all of PCH_HEADERS, for the default
+    compiler and flags. Bundles match include sets exactly, so a set that is not warmed
+    here is built by the first submission that needs it.
+    """
+    compiler = get_toolchain_registry().get()
+    if compiler is None:
+        return
+    
+    compile_flags = list(CPPAnalysisTools.COMPILE_FLAGS) + COMPILE_PROFILES['standard']
+    warm_sets = [header_set.split(',') for header_set in settings.GRADING_SETTINGS.get('PCH_WARM_SETS', [])]
+    for headers in warm_sets + [None]:
+        pch_bundle = get_pch_bundle(compiler.command, compiler.version, compile_flags, headers=headers)
+        if pch_bundle:
+            pch_bundle.build()
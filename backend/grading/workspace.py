@@ -0,0 +1,156 @@
+"""
+Workspace Pool
+Pre-created grading workspaces, placed on a RAM-backed filesystem when one is
+available, that are leased to grading sessions and scrubbed for reuse instead
+of being created and deleted for every submission
+"""
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+from django.conf import settings
+
+RAM_BACKED_ROOTS = ['/dev/shm']
+
+
+def is_usable_root(path: str) -> bool:
+    """Whether workspaces can live under path: writable, and programs may be executed from it"""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        if not os.access(path, os.W_OK | os.X_OK):
+            return False
+        return not (os.statvfs(path).f_flag & os.ST_NOEXEC)
+    except OSError:
+        return False
+
+
+def choose_workspace_root(configured: str = '') -> str:
+    """The configured root, else a RAM-backed directory, else the system temp directory"""
+    if configured:
+        return str(configured)
+    for base in RAM_BACKED_ROOTS:
+        candidate = os.path.join(base, 'gradingai')
+        if os.path.isdir(base) and is_usable_root(candidate):
+            return candidate
+    return os.path.join(tempfile.gettempdir(), 'gradingai')
+
+
+class WorkspacePool:
+    """Reusable per-session working directories, at most `size` of them kept idle"""
+
+    def __init__(self, root: str, size: int):
+        self.root = root
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List[str] = []
+        self._pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        self._sweep_orphans()
+
+    def lease(self) -> str:
+        """An empty workspace directory for exclusive use until release()"""
+        with self._lock:
+            self._check_fork()
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            self.created += 1
+        return tempfile.mkdtemp(prefix=f'ws-{os.getpid()}-', dir=self.root)
+
+    def release(self, path: str) -> None:
+        """Scrub a leased workspace and keep it for the next lease (or delete it if the pool is full)"""
+        if not path or not os.path.isdir(path):
+            return
+
+        reusable = self._scrub(path)
+        with self._lock:
+            self._check_fork()
+            if reusable and len(self._idle) < self.size and path not in self._idle:
+                self._idle.append(path)
+                return
+            self.discarded += 1
+        shutil.rmtree(path, ignore_errors=True)
+
+    def prefill(self) -> None:
+        """Create idle workspaces up to the pool size"""
+        with self._lock:
+            missing = self.size - len(self._idle)
+        for _ in range(max(missing, 0)):
+            path = tempfile.mkdtemp(prefix=f'ws-{os.getpid()}-', dir=self.root)
+            with self._lock:
+                self.created += 1
+                self._idle.append(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "root": self.root,
+                "idle": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+            }
+
+    def _scrub(self, path: str) -> bool:
+        """Remove everything inside path; returns False if the workspace could not be emptied"""
+        try:
+            os.chmod(path, 0o700)
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.unlink(entry.path)
+            return not os.listdir(path)
+        except OSError:
+            return False
+
+    def _check_fork(self) -> None:
+        # Idle workspaces inherited from a parent process are shared with it; forget them
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = []
+
+    def _sweep_orphans(self) -> None:
+        """Delete workspaces left behind by processes that no longer exist"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            parts = name.split('-')
+            if len(parts) < 3 or parts[0] != 'ws' or not parts[1].isdigit():
+                continue
+            pid = int(parts[1])
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            except OSError:
+                pass  # Alive, but owned by someone else
+
+
+_workspace_pool = None
+_workspace_pool_lock = threading.Lock()
+
+
+def get_workspace_pool() -> WorkspacePool:
+    """Process-wide workspace pool"""
+    global _workspace_pool
+
+    with _workspace_pool_lock:
+        if _workspace_pool is None:
+            grading_settings = settings.GRADING_SETTINGS
+            _workspace_pool = WorkspacePool(
+                root=choose_workspace_root(grading_settings.get('WORKSPACE_ROOT', '')),
+                size=grading_settings.get('WORKSPACE_POOL_SIZE', 8)
+            )
+            print(f"   🗂️ Workspace pool at {_workspace_pool.root}")
+        return _workspace_pool
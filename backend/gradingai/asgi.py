@@ -9,7 +9,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+# Fork the compile/run helper before Django is imported (see grading/spawner.py)
+from grading.spawner import start_spawn_helper
+
+start_spawn_helper()
+
+from django.core.asgi import get_asgi_application  # noqa: E402
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gradingai.settings")
 
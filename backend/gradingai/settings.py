@@ -204,4 +204,123 @@ GRADING_SETTINGS = {
     'DEFAULT_TIMEOUT_SECONDS': int(os.getenv('DEFAULT_TIMEOUT_SECONDS', '30')),
     'REFERENCE_ANSWERS_PATH': BASE_DIR / 'reference_answers',
     'STUDENT_UPLOADS_PATH': BASE_DIR / 'media' / 'submissions',
+    
+    # Compiler used when an assignment does not pick one (see grading/toolchains.py)
+    'DEFAULT_TOOLCHAIN': os.getenv('DEFAULT_TOOLCHAIN', 'g++'),
+    
+    # Concurrent test-case runs per process (0 = one per CPU core)
+    'TEST_WORKERS': int(os.getenv('TEST_WORKERS', '0')),
+    
+    # Resource limits for every student/reference program run (see grading/runner.py)
+    'RUN_CPU_SECONDS': int(os.getenv('RUN_CPU_SECONDS', '10')),
+    'RUN_MEMORY_MB': int(os.getenv('RUN_MEMORY_MB', '512')),
+    'RUN_FILE_SIZE_MB': int(os.getenv('RUN_FILE_SIZE_MB', '16')),
+    'RUN_MAX_PROCESSES': int(os.getenv('RUN_MAX_PROCESSES', '64')),  # Tasks (processes + threads) per run
+    # cgroup v2 directory where each run gets a child with pids.max = RUN_MAX_PROCESSES. 'auto' uses
+    # /sys/fs/cgroup/gradingai-runs (needs root); otherwise a directory delegated to the grading user,
+    # with the grading processes running inside it. Startup fails when no cgroup is usable unless
+    # RUN_ALLOW_UNCAPPED_PROCESSES (default: DEBUG) lets programs run without a process cap
+    'RUN_CGROUP_DIR': os.getenv('RUN_CGROUP_DIR', 'auto'),
+    'RUN_ALLOW_UNCAPPED_PROCESSES': os.getenv('RUN_ALLOW_UNCAPPED_PROCESSES', str(DEBUG)).lower() == 'true',
+    'RUN_OUTPUT_LIMIT_KB': int(os.getenv('RUN_OUTPUT_LIMIT_KB', '1024')),   # Program killed beyond this
+    'RUN_OUTPUT_EXCERPT_KB': int(os.getenv('RUN_OUTPUT_EXCERPT_KB', '4')),  # Head/tail kept for storage and prompts
+    
+    # Local executor daemon for compiles and program runs (see grading/executor.py;
+    # start it with `python manage.py run_executor`). Empty = use this worker's spawn helper
+    # (grading/spawner.py, toggled by the SPAWN_HELPER_ENABLED environment variable) or run in-process.
+    'EXECUTOR_SOCKET': os.getenv('EXECUTOR_SOCKET', ''),
+    'EXECUTOR_WORKERS': int(os.getenv('EXECUTOR_WORKERS', '0')),  # 0 = one per CPU core
+    
+    # Shared Anthropic client and its HTTP connection pool (see grading/llm.py)
+    'LLM_TIMEOUT_SECONDS': int(os.getenv('LLM_TIMEOUT_SECONDS', '120')),            # Read/write per request
+    'LLM_CONNECT_TIMEOUT_SECONDS': int(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '10')),
+    'LLM_MAX_CONNECTIONS': int(os.getenv('LLM_MAX_CONNECTIONS', '20')),
+    'LLM_KEEPALIVE_CONNECTIONS': int(os.getenv('LLM_KEEPALIVE_CONNECTIONS', '10')),  # Idle connections kept open
+    'LLM_KEEPALIVE_EXPIRY_SECONDS': int(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '60')),
+    'LLM_MAX_RETRIES': int(os.getenv('LLM_MAX_RETRIES', '2')),                        # SDK retries of unscheduled calls
+    
+    # Rate limits Claude calls are paced to (see grading/llm_scheduler.py; 0 = unlimited). The
+    # limits in the API's rate-limit headers replace these once known. Scheduled calls retry
+    # 429/529 and transient failures themselves, with jittered exponential backoff
+    'LLM_REQUESTS_PER_MINUTE': int(os.getenv('LLM_REQUESTS_PER_MINUTE', '50')),
+    'LLM_INPUT_TOKENS_PER_MINUTE': int(os.getenv('LLM_INPUT_TOKENS_PER_MINUTE', '30000')),
+    'LLM_OUTPUT_TOKENS_PER_MINUTE': int(os.getenv('LLM_OUTPUT_TOKENS_PER_MINUTE', '8000')),
+    # Output tokens charged per call before its usage is known (0 = max_tokens). Reserving max_tokens
+    # (4000) against 8000 output tokens per minute would keep only 2 reviews in flight, whatever
+    # LLM_CONCURRENCY says; 1000 lets 8 start and settles the difference when each response arrives
+    'LLM_OUTPUT_RESERVE_TOKENS': int(os.getenv('LLM_OUTPUT_RESERVE_TOKENS', '1000')),
+    'LLM_RETRY_ATTEMPTS': int(os.getenv('LLM_RETRY_ATTEMPTS', '6')),
+    'LLM_RETRY_BASE_SECONDS': float(os.getenv('LLM_RETRY_BASE_SECONDS', '1.0')),
+    'LLM_RETRY_MAX_SECONDS': float(os.getenv('LLM_RETRY_MAX_SECONDS', '60')),
+    
+    # Claude responses stored by model, max_tokens and prompt hash (see grading/response_cache.py);
+    # backend 'disk' or 'db'. A regrade with fresh=True bypasses it
+    'LLM_RESPONSE_CACHE_ENABLED': os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'True').lower() == 'true',
+    'LLM_RESPONSE_CACHE_BACKEND': os.getenv('LLM_RESPONSE_CACHE_BACKEND', 'disk'),
+    'LLM_RESPONSE_CACHE_DIR': Path(os.getenv('LLM_RESPONSE_CACHE_DIR', BASE_DIR / 'cache' / 'llm')),
+    'LLM_RESPONSE_CACHE_TTL_HOURS': int(os.getenv('LLM_RESPONSE_CACHE_TTL_HOURS', '720')),  # 0 = never expire
+    'LLM_RESPONSE_CACHE_MAX_ENTRIES': int(os.getenv('LLM_RESPONSE_CACHE_MAX_ENTRIES', '10000')),
+    
+    # 'async' batch mode (see grading/async_engine.py): Claude reviews in flight at once, and
+    # threads for the local compile/run stages (0 = one per CPU)
+    'LLM_CONCURRENCY': int(os.getenv('LLM_CONCURRENCY', '8')),
+    'GRADING_LOCAL_WORKERS': int(os.getenv('GRADING_LOCAL_WORKERS', '0')),
+    
+    # Prompt caching of the per-assignment part of the grading prompt (instructions, rubric,
+    # reference solution). TTL '5m' or '1h'; longer suits slow batches at a higher write price
+    'PROMPT_CACHE_ENABLED': os.getenv('PROMPT_CACHE_ENABLED', 'True').lower() == 'true',
+    'PROMPT_CACHE_TTL': os.getenv('PROMPT_CACHE_TTL', '5m'),
+    
+    # Estimated input tokens the grading prompt is compacted to (see grading/prompt_budget.py):
+    # compiler output cut to its first unique diagnostics, failing tests summarized, and the
+    # reference (up to 35% of the budget) and student code shortened when they do not fit
+    'PROMPT_TOKEN_BUDGET': int(os.getenv('PROMPT_TOKEN_BUDGET', '12000')),
+    'PROMPT_MAX_DIAGNOSTICS': int(os.getenv('PROMPT_MAX_DIAGNOSTICS', '10')),    # Unique compiler errors/warnings shown
+    'PROMPT_MAX_FAILED_TESTS': int(os.getenv('PROMPT_MAX_FAILED_TESTS', '5')),   # Failing tests shown with their first difference
+    'PROMPT_STRIP_REFERENCE_COMMENTS': os.getenv('PROMPT_STRIP_REFERENCE_COMMENTS', 'True').lower() == 'true',
+    
+    # Message Batches mode for batch jobs (see grading/message_batches.py); backend 'stub'
+    # answers locally for development and tests (its placeholder grades are never cached)
+    'LLM_BATCH_BACKEND': os.getenv('LLM_BATCH_BACKEND', 'anthropic'),
+    'LLM_BATCH_POLL_SECONDS': int(os.getenv('LLM_BATCH_POLL_SECONDS', '30')),
+    'LLM_BATCH_MAX_WAIT_HOURS': int(os.getenv('LLM_BATCH_MAX_WAIT_HOURS', '24')),  # Then reviews run synchronously
+    'LLM_BATCH_CANCEL_WAIT_SECONDS': int(os.getenv('LLM_BATCH_CANCEL_WAIT_SECONDS', '600')),  # For a late batch to wind down
+    'LLM_BATCH_MAX_REQUESTS': int(os.getenv('LLM_BATCH_MAX_REQUESTS', '10000')),   # Per submitted batch
+    
+    # Run a -fsyntax-only pass before the full build; syntax errors skip tests and the AI review
+    'COMPILE_SYNTAX_CHECK': os.getenv('COMPILE_SYNTAX_CHECK', 'True').lower() == 'true',
+    
+    # Reusable grading workspaces (see grading/workspace.py). Empty root = /dev/shm when
+    # usable, else the system temp directory.
+    'WORKSPACE_ROOT': os.getenv('WORKSPACE_ROOT', ''),
+    'WORKSPACE_POOL_SIZE': int(os.getenv('WORKSPACE_POOL_SIZE', '8')),  # Idle workspaces kept per process
+    
+    # Empirical complexity profiling over each assignment's input generators (see grading/profiling.py)
+    'PROFILE_ENABLED': os.getenv('PROFILE_ENABLED', 'True').lower() == 'true',
+    'PROFILE_TIMEOUT_SECONDS': int(os.getenv('PROFILE_TIMEOUT_SECONDS', '3')),  # Per run
+    
+    # Content-addressed cache of compiled submissions (see grading/compile_cache.py)
+    'COMPILE_CACHE_ENABLED': os.getenv('COMPILE_CACHE_ENABLED', 'True').lower() == 'true',
+    'COMPILE_CACHE_DIR': Path(os.getenv('COMPILE_CACHE_DIR', BASE_DIR / 'cache' / 'compile')),
+    'COMPILE_CACHE_MAX_MB': int(os.getenv('COMPILE_CACHE_MAX_MB', '512')),
+    
+    # Shared reference solution builds, one per assignment version (see grading/reference_store.py)
+    'REFERENCE_ARTIFACTS_DIR': Path(os.getenv('REFERENCE_ARTIFACTS_DIR', BASE_DIR / 'cache' / 'reference')),
+    # Superseded reference builds are kept this long for gradings still running them
+    'REFERENCE_PRUNE_GRACE_HOURS': float(os.getenv('REFERENCE_PRUNE_GRACE_HOURS', '24')),
+    
+    # Memoized reference outputs per reference artifact and test input (see grading/expected_outputs.py)
+    'EXPECTED_OUTPUTS_DIR': Path(os.getenv('EXPECTED_OUTPUTS_DIR', BASE_DIR / 'cache' / 'expected')),
+    
+    # Precompiled standard headers for common student includes (see grading/pch.py)
+    'PCH_ENABLED': os.getenv('PCH_ENABLED', 'True').lower() == 'true',
+    'PCH_WARM_ON_STARTUP': os.getenv('PCH_WARM_ON_STARTUP', 'True').lower() == 'true',
+    'PCH_HEADERS': os.getenv('PCH_HEADERS', 'iostream,vector,string,algorithm,iomanip').split(','),
+    # Include sets prebuilt at startup (';' between sets, ',' within one); bundles match a submission's includes exactly
+    'PCH_WARM_SETS': [header_set for header_set in os.getenv(
+        'PCH_WARM_SETS',
+        'iostream;iostream,string;iostream,vector;iostream,string,vector;iostream,iomanip;iostream,vector,algorithm;'
+        'iostream,string,vector,algorithm'
+    ).split(';') if header_set.strip()],
+    'PCH_DIR': Path(os.getenv('PCH_DIR', BASE_DIR / 'cache' / 'pch')),
 }
@@ -7,6 +7,10 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gradingai.settings")
+    if len(sys.argv) > 1 and sys.argv[1] == "runserver":
+        # Fork the compile/run helper while this process is still small
+        from grading.spawner import start_spawn_helper
+        start_spawn_helper()
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
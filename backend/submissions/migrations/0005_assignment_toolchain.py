@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("submissions", "0004_studentsubmission_batch_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="toolchain",
+            field=models.CharField(
+                choices=[("g++", "GCC (g++)"), ("clang++", "Clang (clang++)")],
+                default="g++",
+                max_length=20,
+            ),
+        ),
+    ]
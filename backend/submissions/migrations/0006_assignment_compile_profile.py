@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("submissions", "0005_assignment_toolchain"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="compile_profile",
+            field=models.CharField(
+                choices=[
+                    ("standard", "Standard"),
+                    ("optimized", "Optimized (-O2)"),
+                    ("debug", "Debug (-O0 -g)"),
+                ],
+                default="standard",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("submissions", "0006_assignment_compile_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="input_generators",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
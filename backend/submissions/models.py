@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import FileExtensionValidator
 import uuid
 
+from grading.toolchains import TOOLCHAIN_CHOICES, COMPILE_PROFILE_CHOICES
+
 class Course(models.Model):
     """Represents a CS course/class like CSCI-1470-03-Fall 2025"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -51,6 +53,9 @@ class Assignment(models.Model):
         validators=[FileExtensionValidator(allowed_extensions=['cpp', 'cc', 'cxx'])]
     )
     max_score = models.IntegerField(default=100)
+    toolchain = models.CharField(max_length=20, choices=TOOLCHAIN_CHOICES, default='g++')  # Compiler used for grading
+    compile_profile = models.CharField(max_length=20, choices=COMPILE_PROFILE_CHOICES, default='standard')  # Extra optimization/debug flags
+    input_generators = models.JSONField(null=True, blank=True)  # Complexity profiling inputs (see grading/profiling.py)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
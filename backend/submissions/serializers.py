@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import Assignment, StudentSubmission, Course, Student
-from grading.models import GradingResult
+from grading.models import GradingResult, TestSuite
+from grading.profiling import validate_generators
+from grading.test_suites import validate_test_cases
 import csv
 from io import StringIO
 
@@ -120,7 +122,7 @@ class AssignmentSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Assignment
-        fields = ['id', 'name', 'description', 'reference_file', 'max_score', 'created_at']
+        fields = ['id', 'name', 'description', 'reference_file', 'max_score', 'toolchain', 'compile_profile', 'input_generators', 'created_at']
     
     def validate_reference_file(self, value):
         if not value.name.lower().endswith('.cpp'):
@@ -130,6 +132,14 @@ class AssignmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Reference file size must be less than 5MB.")
         
         return value
+    
+    def validate_input_generators(self, value):
+        if value is None:
+            return value
+        try:
+            return validate_generators(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
 
 class StudentSubmissionSerializer(serializers.ModelSerializer):
     assignment_name = serializers.CharField(source='assignment.name', read_only=True)
@@ -213,3 +223,28 @@ class GradingResultSerializer(serializers.ModelSerializer):
             'overall_feedback', 'suggestions', 'ai_model_used', 
             'processing_time', 'graded_at'
         ]
+
+class TestSuiteSerializer(serializers.ModelSerializer):
+    assignment_name = serializers.CharField(source='assignment.name', read_only=True)
+    
+    class Meta:
+        model = TestSuite
+        fields = [
+            'id', 'assignment', 'assignment_name', 'test_cases', 'source',
+            'reference_version', 'generated_by', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'assignment', 'source', 'reference_version', 'generated_by',
+            'created_at', 'updated_at'
+        ]
+    
+    def validate_test_cases(self, value):
+        try:
+            return validate_test_cases(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
+    def update(self, instance, validated_data):
+        # Hand-edited suites belong to the instructor and are never regenerated implicitly
+        validated_data['source'] = 'edited'
+        return super().update(instance, validated_data)
@@ -6,12 +6,17 @@ app_name = 'submissions'
 urlpatterns = [
     # Assignment URLs
     path('assignments/', views.AssignmentListCreateView.as_view(), name='assignment-list-create'),
+    path('assignments/<uuid:assignment_id>/regrade/', views.regrade_assignment, name='assignment-regrade'),
+    path('assignments/<uuid:assignment_id>/test-suite/', views.assignment_test_suite, name='assignment-test-suite'),
+    path('assignments/<uuid:assignment_id>/test-suite/generate/', views.generate_test_suite, name='assignment-test-suite-generate'),
+    path('toolchains/', views.toolchain_list, name='toolchain-list'),
     
     # Submission URLs
     path('', views.StudentSubmissionListView.as_view(), name='submission-list'),
     path('upload/', views.upload_submission, name='upload-submission'),
     path('<uuid:submission_id>/', views.submission_detail, name='submission-detail'),
     path('<uuid:submission_id>/grade/', views.grade_submission, name='grade-submission'),
+    path('<uuid:submission_id>/grade/stream/', views.grade_submission_stream, name='grade-submission-stream'),
     
     # Course Management URLs
     path('courses/', views.CourseListCreateView.as_view(), name='course-list-create'),
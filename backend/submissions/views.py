@@ -4,6 +4,8 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
 import os
 import time
 import uuid
@@ -14,12 +16,17 @@ from .serializers import (
     StudentSubmissionSerializer, 
     FileUploadSerializer,
     GradingResultSerializer,
+    TestSuiteSerializer,
     CourseSerializer,
     StudentSerializer,
     StudentBulkUploadSerializer
 )
 from grading.services import GradingService
 from grading.batch_service import BatchGradingService
+from grading.toolchains import get_toolchain_registry
+from grading.test_suites import prepare_test_suite
+from grading.models import TestSuite, BatchGradingJob
+from grading.streaming import get_grading_stream, start_grading_stream
 
 class AssignmentListCreateView(generics.ListCreateAPIView):
     queryset = Assignment.objects.all()
@@ -108,9 +115,14 @@ def grade_submission(request, submission_id):
                 'grading_result': GradingResultSerializer(submission.grading_result).data
             })
         
-        # Update status to grading
+        # Claim the submission atomically, so two requests cannot grade it at once
+        claimed = StudentSubmission.objects.filter(id=submission.id).exclude(status='grading').update(status='grading')
+        if not claimed:
+            return Response(
+                {'error': 'Submission is already being graded'},
+                status=status.HTTP_409_CONFLICT
+            )
         submission.status = 'grading'
-        submission.save()
         
         # Initialize grading service
         grading_service = GradingService()
@@ -145,6 +157,43 @@ def grade_submission(request, submission_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@require_http_methods(['GET', 'POST'])
+async def grade_submission_stream(request, submission_id):
+    """
+    POST grades a submission (regrades it if it was graded before) and answers 202 at once;
+    GET streams that grading's progress as Server-Sent Events: each tool stage as it
+    finishes, then Claude's feedback as it is written (see grading/streaming.py). Every
+    GET replays the events so far, so several viewers can follow one grading.
+    POST ?fresh=true asks Claude for a new review. A submission that is already being
+    graded is refused with 409. GET so that browsers can consume the stream with
+    EventSource; serve through gradingai/asgi.py, since a WSGI server buffers the whole
+    stream, with the POST and its GETs reaching the same worker process.
+    """
+    submission = await StudentSubmission.objects.select_related('assignment', 'student').filter(id=submission_id).afirst()
+    if submission is None:
+        raise Http404('Submission not found')
+    
+    if request.method == 'POST':
+        fresh = request.GET.get('fresh', '').lower() in ('1', 'true', 'yes')
+        stream = await start_grading_stream(submission, fresh=fresh)
+        if stream is None:
+            return JsonResponse({'error': 'Submission is already being graded'}, status=409)
+        return JsonResponse({
+            'message': 'Grading started',
+            'stream_url': request.path
+        }, status=202)
+    
+    stream = get_grading_stream(submission.id)
+    if stream is None:
+        if submission.status == 'grading':
+            return JsonResponse({'error': 'Submission is being graded by another process'}, status=409)
+        return JsonResponse({'error': 'No grading in progress - POST to this URL to start one'}, status=404)
+    
+    response = StreamingHttpResponse(stream.events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
 @api_view(['GET'])
 def submission_detail(request, submission_id):
     """
@@ -166,6 +215,96 @@ def submission_detail(request, submission_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
+@api_view(['GET', 'PUT'])
+def assignment_test_suite(request, assignment_id):
+    """
+    Get or edit the test cases every submission of an assignment is graded against
+    """
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    
+    if request.method == 'GET':
+        try:
+            suite = assignment.test_suite
+        except TestSuite.DoesNotExist:
+            return Response(
+                {'error': 'No test suite yet - it is generated on first grading or via generate/'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(TestSuiteSerializer(suite).data)
+    
+    suite = TestSuite.objects.filter(assignment=assignment).first() or TestSuite(assignment=assignment)
+    serializer = TestSuiteSerializer(suite, data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    suite = serializer.save()
+    
+    return Response({
+        'message': 'Test suite saved - regrade the assignment to apply it to graded submissions',
+        'test_suite': TestSuiteSerializer(suite).data
+    })
+
+@api_view(['POST'])
+def generate_test_suite(request, assignment_id):
+    """
+    (Re)generate an assignment's test suite from its reference solution and
+    precompute the expected outputs. Replaces instructor edits.
+    """
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    
+    try:
+        prepared = prepare_test_suite(assignment, regenerate=True)
+        
+        return Response({
+            'message': f'Generated {len(prepared["suite"].test_cases)} test cases',
+            'reference_runs': prepared['reference_runs'],
+            'reference_compiled': prepared['reference_compiled'],
+            'test_suite': TestSuiteSerializer(prepared['suite']).data
+        }, status=status.HTTP_201_CREATED)
+        
+    except Exception as e:
+        return Response(
+            {'error': 'Test suite generation failed', 'details': str(e)}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+def regrade_assignment(request, assignment_id):
+    """
+    Regrade all graded submissions of an assignment, rerunning only the grading
+    stages whose inputs changed (e.g. after editing the reference rubric).
+    With {"fresh": true} every submission gets a new Claude review.
+    """
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    fresh = str(request.data.get('fresh', '')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        batch_service = BatchGradingService()
+        queued = batch_service.start_assignment_regrade(str(assignment.id), fresh=fresh)
+        
+        return Response({
+            'message': f'Regrade started for {queued} submissions',
+            'assignment_id': str(assignment.id),
+            'submissions': queued,
+            'fresh': fresh
+        }, status=status.HTTP_202_ACCEPTED)
+        
+    except Exception as e:
+        return Response(
+            {'error': 'Regrade failed to start', 'details': str(e)}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def toolchain_list(request):
+    """
+    List the C++ toolchains available for grading on this server
+    """
+    toolchains = get_toolchain_registry().available()
+    return Response({
+        'default': settings.GRADING_SETTINGS.get('DEFAULT_TOOLCHAIN', 'g++'),
+        'toolchains': [toolchain.to_dict() for toolchain in toolchains.values()]
+    })
+
 # Course Management Views
 class CourseListCreateView(generics.ListCreateAPIView):
     queryset = Course.objects.all()
@@ -305,6 +444,7 @@ def batch_upload_submissions(request):
     try:
         assignment_id = request.data.get('assignment_id')
         files = request.FILES.getlist('files')
+        mode = request.data.get('mode') or 'sync'
         
         if not assignment_id:
             return Response(
@@ -318,6 +458,12 @@ def batch_upload_submissions(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if mode not in dict(BatchGradingJob.MODE_CHOICES):
+            return Response(
+                {'error': f"Unknown grading mode '{mode}'", 'valid_modes': list(dict(BatchGradingJob.MODE_CHOICES))}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         # Validate file types
         valid_files = []
         invalid_files = []
@@ -336,7 +482,7 @@ def batch_upload_submissions(request):
         
         # Create batch job
         batch_service = BatchGradingService()
-        batch_job = batch_service.create_batch_job(assignment_id, valid_files)
+        batch_job = batch_service.create_batch_job(assignment_id, valid_files, mode=mode)
         
         # Start processing in background
         batch_service.start_batch_grading(str(batch_job.id))
@@ -344,6 +490,7 @@ def batch_upload_submissions(request):
         return Response({
             'message': f'Batch job created with {len(valid_files)} files',
             'batch_job_id': str(batch_job.id),
+            'mode': batch_job.mode,
             'valid_files': len(valid_files),
             'invalid_files': invalid_files if invalid_files else None
         }, status=status.HTTP_201_CREATED)